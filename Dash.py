@@ -3,12 +3,22 @@ from dash import dcc, html, Input, Output, dash_table, State
 import dash_bootstrap_components as dbc
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
 import networkx as nx
 from dash.exceptions import PreventUpdate
 import plotly.io as pio
 import io
+import os
+import sqlite3
+import time
 import base64
 
+import dashboard_queries
+import vessel_search
+from data_loader import get_data_version
+from encounters import encounter_adjacency, read_encounters
+from result_cache import ResultCache
+
 # Example DataFrame with potential missing values fixed for the 3rd record
 data = {
     "MMSI": ["211331640", "636091308", "311000072"],
@@ -32,17 +42,40 @@ data = {
 df = pd.DataFrame(data)
 df["Timestamp"] = pd.to_datetime(df["Timestamp"])
 
-# Example adjacency matrix for SNA (linkages at sea)
-adj_matrix = pd.DataFrame(
+# Linkages at sea for SNA: encounter edges written by encounters.py when ENCOUNTER_DB_URL
+# points at the positions database, otherwise an example adjacency matrix. Edges are read
+# for the sidebar's date range, or the last ENCOUNTER_WINDOW_DAYS days when it is cleared.
+ENCOUNTER_DB_URL = os.environ.get("ENCOUNTER_DB_URL")
+ENCOUNTER_WINDOW_DAYS = int(os.environ.get("ENCOUNTER_WINDOW_DAYS", "30"))
+EXAMPLE_ADJ_MATRIX = pd.DataFrame(
     [[0, 1, 0],
      [1, 0, 1],
      [0, 1, 0]],
     index=["Sea Queen", "Ocean Explorer", "Atlantic Star"],
     columns=["Sea Queen", "Ocean Explorer", "Atlantic Star"]
 )
+# Node layouts use a fixed seed, so nodes keep their places across restarts
+NETWORK_LAYOUT_SEED = 42
+# Encounter graphs and their layouts, keyed by date window; encounters.py appends new
+# edges as positions arrive, so entries expire rather than follow the vessel database
+network_cache = ResultCache(maxsize=16, ttl=300.0)
+
+# The database table pages, sorts and filters in SQL against the vessel database. Nothing
+# is read at import: connections open on first use, and while the database is missing the
+# app still starts, with empty results and a notice naming the file.
+VESSEL_DB = os.environ.get("VESSEL_DB", "maritime_data.db")
+# Vessel names offered under the search box as it is typed
+SEARCH_SUGGESTIONS = 10
+
+# Memoized table pages, filtered vessels and rendered tab content, keyed by filter state
+# and dropped whenever the loader writes new data
+dash_cache = ResultCache(maxsize=256, ttl=300.0)
+DATA_VERSION_CHECK_INTERVAL = 1.0
+_next_version_check = 0.0
 
 # Initialize Dash app
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.LUX])
+# The map graph only exists while its tab is shown, so its callback targets a dynamic component
+app = dash.Dash(__name__, external_stylesheets=[dbc.themes.LUX], suppress_callback_exceptions=True)
 
 # Layout
 app.layout = dbc.Container([
@@ -50,6 +83,9 @@ app.layout = dbc.Container([
     dbc.Row([
         dbc.Col(html.H2("Maritime Data Command Center", className="text-center text-primary font-weight-bold"), width=12)
     ], className="mb-4"),
+    # Fires the dropdown options callback on every page load
+    dcc.Location(id="page-location"),
+    html.Div(id="database-status"),
 
     # Main Dashboard Layout with Sidebar and Content
     dbc.Row([
@@ -57,14 +93,16 @@ app.layout = dbc.Container([
         dbc.Col([
             html.Div([
                 html.H4("Filters", className="text-info"),
-                dbc.Input(id="search-input", placeholder="Search MMSI or Vessel Name", type="text", className="mb-3"),
+                dbc.Input(id="search-input", placeholder="Search MMSI or Vessel Name", type="text",
+                          list="search-suggestions", debounce=300, className="mb-3"),
+                html.Datalist(id="search-suggestions"),
                 
                 # Vessel Type Filter
                 dbc.Row([
                     dbc.Col(dbc.Label("Vessel Type", html_for="type-filter"), width=12),
                     dbc.Col(dcc.Dropdown(
                         id="type-filter",
-                        options=[{"label": t, "value": t} for t in df["Type"].unique()],
+                        options=[],
                         multi=True,
                         placeholder="Select Vessel Type",
                         className="mb-3"
@@ -76,7 +114,7 @@ app.layout = dbc.Container([
                     dbc.Col(dbc.Label("Flag", html_for="flag-filter"), width=12),
                     dbc.Col(dcc.Dropdown(
                         id="flag-filter",
-                        options=[{"label": f, "value": f} for f in df["Flag"].unique()],
+                        options=[],
                         multi=True,
                         placeholder="Select Flag",
                         className="mb-3"
@@ -117,9 +155,21 @@ app.layout = dbc.Container([
             html.H4("Filtered Database", className="text-info mb-3"),
             dash_table.DataTable(
                 id="database-table",
-                columns=[{"name": col, "id": col} for col in df.columns],
-                data=df.to_dict("records"),
-                page_size=5,
+                columns=[
+                    {"name": col, "id": col,
+                     "type": "numeric" if col in dashboard_queries.NUMERIC_COLUMNS else "text"}
+                    for col in dashboard_queries.TABLE_COLUMNS
+                ],
+                data=[],
+                # Paging, sorting and filtering run in SQL; only the current page is sent
+                page_action="custom",
+                page_current=0,
+                page_size=dashboard_queries.PAGE_SIZE,
+                sort_action="custom",
+                sort_mode="single",
+                sort_by=[],
+                filter_action="custom",
+                filter_query="",
                 style_table={"overflowX": "auto"},
                 style_cell={"textAlign": "left", "fontSize": "14px", "padding": "10px"},
                 style_header={"fontWeight": "bold", "backgroundColor": "lightblue"},
@@ -146,118 +196,331 @@ app.layout = dbc.Container([
 ], fluid=True)
 
 # Callbacks
+def vessel_pool():
+    """The shared read-only pool for VESSEL_DB."""
+    return dashboard_queries.get_db_pool(VESSEL_DB)
+
+
+def database_unavailable(error):
+    """Notice shown while VESSEL_DB cannot be read."""
+    return dbc.Alert(
+        f"The vessel database {VESSEL_DB} cannot be read ({error}). Run data_loader.py to create "
+        "it, or point VESSEL_DB at an existing one; the dashboard picks it up on reload.",
+        color="warning"
+    )
+
+
+def refresh_dash_cache():
+    """Drops memoized results once the loader has written new data (checked at most every second)."""
+    global _next_version_check
+    now = time.monotonic()
+    if now < _next_version_check:
+        return
+    _next_version_check = now + DATA_VERSION_CHECK_INTERVAL
+    try:
+        with vessel_pool().connection() as conn:
+            dash_cache.invalidate_if_changed(get_data_version(conn))
+    except sqlite3.Error:
+        # Reported by load_filter_options; the callbacks themselves fall back to empty results
+        pass
+
+
+def memoized(key, compute):
+    """Returns the cached value for key, computing and storing it on a miss."""
+    value = dash_cache.get(key)
+    if value is None:
+        value = compute()
+        dash_cache.put(key, value)
+    return value
+
+
+def filter_state(search, types, flags, start_date, end_date):
+    """Normalized, hashable key for the sidebar filters."""
+    return ((search or "").strip().lower(), tuple(sorted(types or ())), tuple(sorted(flags or ())),
+            start_date, end_date)
+
+
+def selected_names(selected_rows, page_data):
+    """Sorted names of the selected rows, which index into the page currently shown in the table."""
+    if not selected_rows or not page_data:
+        return ()
+    return tuple(sorted(page_data[row]["Vessel Name"] for row in selected_rows if row < len(page_data)))
+
+
+def filter_vessels(state):
+    """
+    Applies the sidebar filters, with the table's search semantics: exact MMSI, name or MMSI
+    substring from three characters, name prefix below that.
+    """
+    search, types, flags, start_date, end_date = state
+    filtered = df
+    if dashboard_queries.MMSI_PATTERN.match(search):
+        filtered = filtered[filtered["MMSI"] == search]
+    elif len(search) >= vessel_search.MIN_INDEXED_LENGTH:
+        filtered = filtered[filtered["MMSI"].str.contains(search, regex=False)
+                            | filtered["Vessel Name"].str.lower().str.contains(search, regex=False)]
+    elif search:
+        filtered = filtered[filtered["Vessel Name"].str.lower().str.startswith(search)]
+    if types:
+        filtered = filtered[filtered["Type"].isin(types)]
+    if flags:
+        filtered = filtered[filtered["Flag"].isin(flags)]
+    if start_date and end_date:
+        filtered = filtered[(filtered["Timestamp"].dt.date >= pd.to_datetime(start_date).date()) &
+                            (filtered["Timestamp"].dt.date <= pd.to_datetime(end_date).date())]
+    return filtered
+
+
+def map_viewport(relayout_data):
+    """Visible (min_lat, min_lon, max_lat, max_lon) from the map's relayoutData, snapped to density cells."""
+    corners = (relayout_data or {}).get("map._derived", {}).get("coordinates")
+    if not corners:
+        return dashboard_queries.WORLD_BOUNDS
+    lons, lats = zip(*corners)
+    return dashboard_queries.snap_viewport((min(lats), min(lons), max(lats), max(lons)))
+
+
+def render_map(viewport, state, selected_vessels):
+    """
+    Map figure for a viewport: individual vessels as WebGL points when few enough are visible,
+    otherwise a density layer aggregated in SQL. The date range does not apply, as the vessel
+    table holds each vessel's latest position only.
+    """
+    search, types, flags, _, _ = state
+    with vessel_pool().connection() as conn:
+        mode, rows = dashboard_queries.map_layer(conn, viewport, search, types, flags, selected_vessels)
+    fig = go.Figure()
+    if mode == "points":
+        by_type = {}
+        for row in rows:
+            by_type.setdefault(row["type"] or "Unknown", []).append(row)
+        for vessel_type, vessels in sorted(by_type.items()):
+            fig.add_trace(go.Scattermap(
+                lat=[v["lat"] for v in vessels],
+                lon=[v["lon"] for v in vessels],
+                text=[v["name"] for v in vessels],
+                customdata=[v["speed"] for v in vessels],
+                hovertemplate="%{text}<br>%{customdata} kn<extra></extra>",
+                mode="markers",
+                marker={"size": 7},
+                name=vessel_type,
+            ))
+    else:
+        fig.add_trace(go.Densitymap(
+            lat=[cell["lat"] for cell in rows],
+            lon=[cell["lon"] for cell in rows],
+            z=[cell["count"] for cell in rows],
+            radius=12,
+            colorscale="Viridis",
+            hovertemplate="%{z} vessels<extra></extra>",
+            name="Vessel density",
+        ))
+    fig.update_layout(
+        title=f"Vessel Locations ({'vessels' if mode == 'points' else 'density'})",
+        map={"style": "carto-positron", "center": {"lat": 0, "lon": 0}, "zoom": 1},
+        # Keep the user's pan and zoom when the figure is replaced for a new viewport
+        uirevision="vessel-map",
+        margin={"r": 0, "t": 30, "l": 0, "b": 0},
+    )
+    return fig
+
+
+def encounter_window(start_date, end_date):
+    """[start, end) of the encounters shown: the sidebar's date range, or the last ENCOUNTER_WINDOW_DAYS days."""
+    if start_date and end_date:
+        return pd.Timestamp(start_date).normalize(), pd.Timestamp(end_date).normalize() + pd.Timedelta(days=1)
+    end = pd.Timestamp.now().normalize() + pd.Timedelta(days=1)
+    return end - pd.Timedelta(days=ENCOUNTER_WINDOW_DAYS), end
+
+
+def encounter_network(window):
+    """(graph, node positions, adjacency text) for the encounters starting in a date window."""
+    network = network_cache.get(window)
+    if network is None:
+        if ENCOUNTER_DB_URL:
+            adj_matrix = encounter_adjacency(read_encounters(ENCOUNTER_DB_URL, *window))
+        else:
+            adj_matrix = EXAMPLE_ADJ_MATRIX
+        graph = nx.Graph()
+        graph.add_edges_from(
+            (row, col) for row in adj_matrix.index for col in adj_matrix.columns if adj_matrix.loc[row, col] > 0
+        )
+        positions = nx.spring_layout(graph, seed=NETWORK_LAYOUT_SEED) if graph else {}
+        network = (graph, positions, adj_matrix.to_string())
+        network_cache.put(window, network)
+    return network
+
+
+def render_network(window, selected_vessels):
+    # Node positions come from the window's one precomputed layout, so selections never re-run it
+    network_graph, network_positions, adjacency_text = encounter_network(window)
+    nodes = [node for node in network_graph.nodes() if not selected_vessels or node in selected_vessels]
+    if not nodes:
+        # Table selections come from the whole fleet and may have no recorded encounters
+        return html.P("No encounters recorded for the selected vessels in this date range.")
+    fig = px.scatter(
+        x=[network_positions[node][0] for node in nodes],
+        y=[network_positions[node][1] for node in nodes],
+        text=nodes,
+        title="Social Network of Vessels"
+    )
+    return html.Div([
+        html.H4("Adjacency Matrix"),
+        html.Pre(adjacency_text),
+        dcc.Graph(figure=fig)
+    ])
+
+
+def render_images(filtered, selected_vessels):
+    if filtered.empty:
+        return html.P("No vessels matching the filters.")
+    images = [
+        html.Div([
+            html.Img(src=row["Image URL"], style={"width": "100%", "border-radius": "8px"}),
+            html.P(row["Vessel Name"], className="text-center")
+        ]) for row in filtered.to_dict("records")
+        if row["Vessel Name"] in selected_vessels or not selected_vessels
+    ]
+    return html.Div(images, style={"display": "grid", "grid-template-columns": "repeat(auto-fill, minmax(300px, 1fr))"})
+
+
 @app.callback(
-    [Output("analytics-content", "children"),
-     Output("database-table", "data")],
+    [Output("type-filter", "options"),
+     Output("flag-filter", "options"),
+     Output("database-status", "children")],
+    Input("page-location", "pathname")
+)
+def load_filter_options(_):
+    # Dropdown values come from the database on each page load, so they follow new data
+    refresh_dash_cache()
+
+    def options():
+        with vessel_pool().connection() as conn:
+            return tuple(
+                [{"label": value, "value": value} for value in dashboard_queries.distinct_values(conn, column)]
+                for column in ("Type", "Flag")
+            )
+    try:
+        type_options, flag_options = memoized(("filter-options",), options)
+    except sqlite3.Error as error:
+        return [], [], database_unavailable(error)
+    return type_options, flag_options, None
+
+
+@app.callback(
+    Output("search-suggestions", "children"),
+    Input("search-input", "value")
+)
+def update_search_suggestions(search):
+    # Ranked vessel names for the search box: prefixes, substrings, then near misspellings
+    search = " ".join((search or "").split()).lower()
+    if not search:
+        return []
+    refresh_dash_cache()
+
+    def suggest():
+        with vessel_pool().connection() as conn:
+            results = vessel_search.search_vessels(conn, search, limit=SEARCH_SUGGESTIONS)
+        names = dict.fromkeys(result["name"] for result in results if result["name"])
+        return [html.Option(value=name) for name in names]
+    try:
+        return memoized(("suggestions", search), suggest)
+    except sqlite3.Error:
+        return []
+
+
+@app.callback(
+    [Output("database-table", "data"),
+     Output("database-table", "page_count"),
+     Output("database-table", "selected_rows")],
+    [Input("search-input", "value"),
+     Input("type-filter", "value"),
+     Input("flag-filter", "value"),
+     Input("database-table", "page_current"),
+     Input("database-table", "page_size"),
+     Input("database-table", "sort_by"),
+     Input("database-table", "filter_query")]
+)
+def update_table(search, types, flags, page_current, page_size, sort_by, filter_query):
+    # Current page of the database table, filtered, sorted and paged in SQL. Each memoized page
+    # keeps its last row, so paging forward from a cached page reads the next one by keyset
+    # instead of OFFSET; both pages come from the same cache, so from the same data version.
+    # Selections index into the page shown, so every change of page clears them.
+    refresh_dash_cache()
+    page_current = page_current or 0
+    query_key = ("table", (search or "").strip(), tuple(sorted(types or ())), tuple(sorted(flags or ())),
+                 filter_query or "", tuple((s.get("column_id"), s.get("direction")) for s in sort_by or ()),
+                 page_size)
+
+    def fetch():
+        previous = dash_cache.get((*query_key, page_current - 1)) if page_current else None
+        with vessel_pool().connection() as conn:
+            return dashboard_queries.fetch_page(
+                conn, search, types, flags, filter_query, sort_by, page_current, page_size,
+                after=previous[2] if previous else None
+            )
+    try:
+        table_data, page_count, _ = memoized((*query_key, page_current), fetch)
+    except sqlite3.Error:
+        return [], 1, []
+    return table_data, page_count, []
+
+
+@app.callback(
+    Output("analytics-content", "children"),
     [Input("analytics-tabs", "value"),
      Input("search-input", "value"),
      Input("type-filter", "value"),
      Input("flag-filter", "value"),
      Input("date-filter", "start_date"),
      Input("date-filter", "end_date"),
-     Input("database-table", "selected_rows")]
+     Input("database-table", "selected_rows")],
+    [State("database-table", "data")]
 )
-def update_analytics_and_table(tab, search, types, flags, start_date, end_date, selected_rows):
-    # Filter Data
-    filtered = df.copy()
-    if search:
-        filtered = filtered[filtered["MMSI"].str.contains(search) | filtered["Vessel Name"].str.contains(search, case=False)]
-    if types:
-        filtered = filtered[filtered["Type"].isin(types)]
-    if flags:
-        filtered = filtered[filtered["Flag"].isin(flags)]
-    if start_date and end_date:
-        filtered = filtered[(filtered["Timestamp"].dt.date >= pd.to_datetime(start_date).date()) & 
-                             (filtered["Timestamp"].dt.date <= pd.to_datetime(end_date).date())]
-
-    # Handle selected rows for visuals (only update visual content)
-    selected_vessels = []
-    if selected_rows:
-        try:
-            selected_vessels = [filtered.iloc[row]["Vessel Name"] for row in selected_rows]
-        except IndexError:
-            selected_vessels = []  # Ensure it doesn't break the code if the index is out of bounds
-
-    # Prepare Analytics Content
-    analytics_content = html.P("Select a tab to view content.")
-    
+def update_analytics(tab, search, types, flags, start_date, end_date, selected_rows, page_data):
+    # Only the active tab is rendered; filtering and rendering are memoized separately, so a
+    # tab switch or a new selection reuses the filtered vessels
+    refresh_dash_cache()
+    state = filter_state(search, types, flags, start_date, end_date)
+    selected_vessels = selected_names(selected_rows, page_data)
+
     if tab == "map-tab":
-        if not filtered.empty:
-            fig = px.scatter_geo(
-                filtered, 
-                lat="Latitude", 
-                lon="Longitude", 
-                hover_name="Vessel Name",
-                title="Vessel Locations", 
-                color="Type", 
-                size="Speed",
-                size_max=10  # Reducing size of points on the map
-            )
-            fig.update_layout(
-                geo=dict(
-                    showland=True,
-                    landcolor="rgb(243, 243, 243)",
-                    subunitcolor="rgb(217, 217, 217)",
-                    showocean=True,
-                    oceancolor="rgb(204, 230, 255)"
-                ),
-                margin={"r": 0, "t": 30, "l": 0, "b": 0},
-                dragmode="zoom"
-            )
-            # Filter map data to selected vessels only
-            filtered_map = filtered[filtered["Vessel Name"].isin(selected_vessels)] if selected_vessels else filtered
-            fig = px.scatter_geo(
-                filtered_map, 
-                lat="Latitude", 
-                lon="Longitude", 
-                hover_name="Vessel Name",
-                title="Vessel Locations", 
-                color="Type", 
-                size="Speed",
-                size_max=10
-            )
-            analytics_content = dcc.Graph(figure=fig)
-        else:
-            analytics_content = html.P("No vessels matching the filters.")
-
-    elif tab == "network-tab":
-        if not filtered.empty:
-            G = nx.Graph()
-            for row in adj_matrix.index:
-                for col in adj_matrix.columns:
-                    if adj_matrix.loc[row, col] == 1:
-                        G.add_edge(row, col)
-
-            subgraph = G.subgraph(selected_vessels) if selected_vessels else G
-            pos = nx.spring_layout(subgraph)
-            fig = px.scatter(
-                x=[pos[node][0] for node in subgraph.nodes()],
-                y=[pos[node][1] for node in subgraph.nodes()],
-                text=list(subgraph.nodes()),
-                title="Social Network of Vessels"
-            )
-            analytics_content = html.Div([
-                html.H4("Adjacency Matrix"),
-                html.Pre(adj_matrix.to_string()),
-                dcc.Graph(figure=fig)
-            ])
-        else:
-            analytics_content = html.P("No vessels selected or matching filters.")
-
-    elif tab == "images-tab":
-        if not filtered.empty:
-            images = [
-                html.Div([
-                    html.Img(src=row["Image URL"], style={"width": "100%", "border-radius": "8px"}),
-                    html.P(row["Vessel Name"], className="text-center")
-                ]) for _, row in filtered.iterrows() if row["Vessel Name"] in selected_vessels or not selected_vessels
-            ]
-            analytics_content = html.Div(images, style={"display": "grid", "grid-template-columns": "repeat(auto-fill, minmax(300px, 1fr))"})
-        else:
-            analytics_content = html.P("No vessels matching the filters.")
+        # The map graph follows filters and selection itself; replacing it would reset the view
+        if dash.ctx.triggered_id not in (None, "analytics-tabs"):
+            return dash.no_update
+        return dcc.Graph(id="vessel-map", style={"height": "600px"})
+    if tab == "network-tab":
+        window = encounter_window(start_date, end_date)
+        return memoized(("network", window, selected_vessels), lambda: render_network(window, selected_vessels))
+    if tab != "images-tab":
+        return html.P("Select a tab to view content.")
+    filtered = memoized(("filtered", state), lambda: filter_vessels(state))
+    return memoized(("images", state, selected_vessels), lambda: render_images(filtered, selected_vessels))
 
-    # Update table data with filtered content (this remains static)
-    return analytics_content, df.to_dict("records")
+
+@app.callback(
+    Output("vessel-map", "figure"),
+    [Input("vessel-map", "relayoutData"),
+     Input("search-input", "value"),
+     Input("type-filter", "value"),
+     Input("flag-filter", "value"),
+     Input("database-table", "selected_rows")],
+    [State("database-table", "data")]
+)
+def update_map(relayout_data, search, types, flags, selected_rows, page_data):
+    # Re-queried per viewport, so the payload is bounded by the screen rather than the fleet
+    viewport = map_viewport(relayout_data)
+    if relayout_data and dash.ctx.triggered_id == "vessel-map" and "map._derived" not in relayout_data:
+        # Hover, legend and other relayouts that do not move the map
+        raise PreventUpdate
+    refresh_dash_cache()
+    state = filter_state(search, types, flags, None, None)
+    selected_vessels = selected_names(selected_rows, page_data)
+    try:
+        return memoized(("map", viewport, state, selected_vessels),
+                        lambda: render_map(viewport, state, selected_vessels))
+    except sqlite3.Error:
+        return go.Figure(layout={"title": "Vessel Locations (vessel database unavailable)"})
 
 # Download CSV callback
 @app.callback(
@@ -272,7 +535,7 @@ def download_csv(n_clicks, selected_rows, table_data):
             # Only include selected rows
             selected_data = [table_data[i] for i in selected_rows]
         else:
-            # If no rows selected, return all data
+            # If no rows selected, return the page currently shown
             selected_data = table_data
         
         return dict(content=pd.DataFrame(selected_data).to_csv(), filename="filtered_vessels.csv")
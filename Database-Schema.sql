@@ -1,8 +1,23 @@
+-- Positions are range-partitioned by month on timestamp. Monthly partitions are
+-- created at ingest and dropped for retention by position_store.py
+-- (ensure_partitions / drop_partitions_before).
 CREATE TABLE vessel_positions (
     vessel_id TEXT NOT NULL,
     vessel_name TEXT,
     latitude FLOAT NOT NULL,
     longitude FLOAT NOT NULL,
     timestamp TIMESTAMP NOT NULL,
+    -- Ingest time, so incremental jobs also pick up pings that arrive late
+    loaded_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'UTC'),
     PRIMARY KEY (vessel_id, timestamp)
-);
+) PARTITION BY RANGE (timestamp);
+
+-- Time-range scans across the whole fleet. Rows arrive roughly in time order, so a
+-- BRIN index stays tiny; it is created on every partition, including future ones.
+CREATE INDEX idx_vessel_positions_timestamp_brin ON vessel_positions USING BRIN (timestamp);
+
+-- Track lookups by vessel name; lookups by vessel_id are served by the primary key
+CREATE INDEX idx_vessel_positions_vessel_name_timestamp ON vessel_positions (vessel_name, timestamp);
+
+-- Pings loaded since an incremental job's watermark (risk_scoring.py)
+CREATE INDEX idx_vessel_positions_loaded_at ON vessel_positions (loaded_at);
@@ -1,57 +1,99 @@
-# install packages - pip install requests beautifulsoup4 pandas
+# install packages - pip install requests beautifulsoup4 lxml pandas aiohttp
+
+import asyncio
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
 
 import requests
-from bs4 import BeautifulSoup
 import pandas as pd
 
+from crawl_engine import crawl
+from http_cache import DEFAULT_CACHE_DIR, ResponseCache, cached_get
+from vessel_extractors import extract_page
+
+SEARCH_URL = "https://www.vesselfinder.com/vessels?name={mmsi}"  # Example site
+RESULT_FIELDS = ["MMSI", "Name", "Flag", "Type", "Position"]
+
 # Step 1: Define the crawler
-def search_vessel_by_mmsi(mmsi):
+def parse_vessel_page(mmsi, html, extractor="auto"):
+    """
+    Extract vessel information from a fetched search page.
+    Uses the fastest available extractor from vessel_extractors (lxml when installed).
+    """
+    return extract_page(mmsi, html, extractor)
+
+def search_vessel_by_mmsi(mmsi, cache=None):
     """
     Search vessel information by MMSI on a target website.
+    With an http_cache.ResponseCache the page is only downloaded again if it changed.
     """
-    base_url = f"https://www.vesselfinder.com/vessels?name={mmsi}"  # Example site
-    response = requests.get(base_url)
-    
-    if response.status_code != 200:
+    url = SEARCH_URL.format(mmsi=mmsi)
+    if cache is not None:
+        status, entry = cached_get(url, cache)
+        content = entry.read() if entry is not None else None
+    else:
+        response = requests.get(url)
+        status, content = response.status_code, response.content
+
+    if status != 200:
         print(f"Failed to fetch data for MMSI {mmsi}")
         return None
 
-    soup = BeautifulSoup(response.content, 'html.parser')
-    
-    # Extract vessel information (update selectors based on target website)
-    try:
-        name = soup.find('h1', class_='vessel-name').text.strip()
-        flag = soup.find('span', class_='flag').text.strip()
-        type_ = soup.find('div', text='Type:').find_next('div').text.strip()
-        position = soup.find('div', text='Current Position:').find_next('div').text.strip()
-        
-        return {
-            "MMSI": mmsi,
-            "Name": name,
-            "Flag": flag,
-            "Type": type_,
-            "Position": position
-        }
-    except Exception as e:
-        print(f"Error parsing data for MMSI {mmsi}: {e}")
-        return None
+    return parse_vessel_page(mmsi, content)
 
 # Step 2: Crawl for multiple MMSI
-def crawl_vessels(mmsi_list):
+def crawl_vessels(mmsi_list, output_file="vessel_data.csv", checkpoint_file="vessel_data.checkpoint",
+                  concurrency=16, rate_per_host=5.0, retries=3, cache_dir=DEFAULT_CACHE_DIR,
+                  extractor="auto", parse_processes=None):
     """
-    Crawl multiple vessels and save the data.
+    Crawl multiple vessels concurrently and save the data.
+
+    Results are written to output_file as pages finish, and finished MMSIs are
+    recorded in checkpoint_file, so re-running after an interruption resumes, appending to
+    output_file; the checkpoint is removed once a run finishes without failures, so the next
+    run starts over and rewrites output_file.
+    Responses are kept in an on-disk cache under cache_dir (None disables it), so later
+    runs only download pages that changed. Pages are parsed in a pool of parse_processes
+    worker processes (default: one per core) so parsing keeps up with the network.
     """
-    data = []
-    for mmsi in mmsi_list:
-        print(f"Searching for MMSI: {mmsi}")
-        result = search_vessel_by_mmsi(mmsi)
-        if result:
-            data.append(result)
-    
-    # Convert to DataFrame and save
-    df = pd.DataFrame(data)
-    df.to_csv("vessel_data.csv", index=False)
-    print("Crawling complete. Data saved to vessel_data.csv.")
+    cache = ResponseCache(cache_dir) if cache_dir else None
+    # Only a resumed run keeps the earlier rows; the checkpoint says which MMSIs they cover
+    resuming = bool(checkpoint_file) and os.path.exists(checkpoint_file) and os.path.exists(output_file)
+    with open(output_file, "a" if resuming else "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+        if not resuming:
+            writer.writeheader()
+
+        parse_pool = ProcessPoolExecutor(max_workers=parse_processes)
+
+        async def handle_page(mmsi, status, body):
+            if status != 200:
+                print(f"Failed to fetch data for MMSI {mmsi} (HTTP {status})")
+                return None
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(parse_pool, extract_page, mmsi, body, extractor)
+            if result:
+                writer.writerow(result)
+            return result
+
+        urls = ((mmsi, SEARCH_URL.format(mmsi=mmsi)) for mmsi in mmsi_list)
+        try:
+            results, stats = asyncio.run(crawl(
+                urls, handle_page, concurrency=concurrency, rate_per_host=rate_per_host,
+                retries=retries, checkpoint_path=checkpoint_file, cache=cache
+            ))
+        finally:
+            parse_pool.shutdown()
+    if cache is not None:
+        cache.close()
+
+    print(f"Crawling complete. {len(results)} new records saved to {output_file}.")
+    print(f"{stats['pages']} pages at {stats['pages_per_sec']:.1f} pages/sec "
+          f"(p50 {stats['p50_ms']:.0f} ms, p95 {stats['p95_ms']:.0f} ms, p99 {stats['p99_ms']:.0f} ms), "
+          f"{stats['retries']} retries, {stats['failures']} failures, {stats['skipped']} already done, "
+          f"{stats['cache_hits']} served from cache, {stats['revalidated']} revalidated")
+    return pd.DataFrame(results, columns=RESULT_FIELDS)
 
 # Step 3: Example usage
 if __name__ == "__main__":
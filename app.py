@@ -1,32 +1,127 @@
-from flask import Flask, request, jsonify, render_template, url_for, make_response
-import sqlite3
-import pandas as pd
+from flask import Flask, Response, abort, request, jsonify, render_template, url_for
+import csv
+import zlib
 import folium
+from folium.plugins import FastMarkerCluster
 import os
 import re
 import io
-import networkx as nx
-import matplotlib.pyplot as plt
+import time
+import diagram_worker
+import map_tiles
+import risk_scoring
+import vessel_network
+import vessel_search
+from data_loader import get_data_version
+from db_pool import get_pool
+from position_store import get_engine
+from result_cache import ResultCache
 
 app = Flask(__name__)
 app.secret_key = "supersecretkey"
 
+# SQL issued by process_query; query_plan_check.py verifies each one uses an index
+SPEED_RANGE_QUERY = "SELECT vessel_name, speed_knots FROM vessels WHERE speed_knots BETWEEN ? AND ?"
+OWNER_QUERY = "SELECT * FROM vessels WHERE LOWER(owner) = ?"
+VESSEL_NAME_QUERY = '''SELECT vessel_name, vessel_type, owner, flag, speed_knots, dimensions,
+                   visited_ports, last_known_position, status, mmsi
+                   FROM vessels
+                   WHERE LOWER(vessel_name) = ?'''
+STATUS_QUERY = "SELECT * FROM vessels WHERE LOWER(status) = ?"
+FLAG_QUERY = "SELECT * FROM vessels WHERE LOWER(flag) = ?"
+
+# Filters accepted by /download, each a parameterized WHERE clause and its number of values
+DOWNLOAD_FILTERS = {
+    "speed": ("speed_knots BETWEEN ? AND ?", 2),
+    "owner": ("LOWER(owner) = ?", 1),
+    "vessel_name": ("LOWER(vessel_name) = ?", 1),
+    "status": ("LOWER(status) = ?", 1),
+    "flag": ("LOWER(flag) = ?", 1),
+}
+
+# Columns written by /download; internal bookkeeping columns such as content_hash are left out
+EXPORT_COLUMNS = ("vessel_name, vessel_type, owner, flag, speed_knots, dimensions, "
+                  "visited_ports, last_known_position, status, mmsi, lat, lon")
+
+# Rows fetched from the cursor per streamed chunk of the CSV export
+EXPORT_BATCH_SIZE = 5000
+
+# Input for generate_network_diagram: one row per port visit (port is NULL for vessels with none)
+VESSEL_PORT_VISITS_QUERY = '''SELECT v.vessel_name, v.owner, p.name AS port
+                   FROM vessels v
+                   LEFT JOIN vessel_port_visits vp ON vp.vessel_id = v.id
+                   LEFT JOIN ports p ON p.id = vp.port_id'''
+
+
+# Answers to chat queries, keyed by (intent, params) and dropped whenever the loader writes
+query_cache = ResultCache(maxsize=1024, ttl=300.0)
+
+# Seconds between checks of the ingest watermark for new data
+DATA_VERSION_CHECK_INTERVAL = 1.0
+_next_version_check = 0.0
+
+
+# Map tiles: density from the vessels database, risk from the positions database that
+# risk_scoring.py writes to (RISK_DB_URL). Rendered tiles are kept per layer in memory and
+# on disk until that layer's data version changes.
+TILE_CACHE_DIR = os.environ.get("TILE_CACHE_DIR", map_tiles.DEFAULT_TILE_CACHE_DIR)
+RISK_DB_URL = os.environ.get("RISK_DB_URL")
+TILE_MAX_AGE = 60
+tile_caches = {layer: map_tiles.TileCache(os.path.join(TILE_CACHE_DIR, layer)) for layer in map_tiles.LAYERS}
+# Layer versions are re-read at most every DATA_VERSION_CHECK_INTERVAL seconds
+tile_versions = ResultCache(maxsize=len(map_tiles.LAYERS), ttl=DATA_VERSION_CHECK_INTERVAL)
+# Scored vessel positions for the risk layer, keyed by the scoring version
+risk_points_cache = ResultCache(maxsize=1, ttl=86400.0)
+# /risk rankings, keyed by (scoring version, limit)
+top_risk_cache = ResultCache(maxsize=64, ttl=86400.0)
+MAX_RISK_RESULTS = 1000
+_risk_schema_ready = False
 
-# Database connection function
-def connect_to_database(db_name="maritime_data.db"):
-    return sqlite3.connect(db_name)
+
+# Vessel–owner–port network written by vessel_network.py, reloaded after each analysis run
+network_cache = ResultCache(maxsize=1, ttl=86400.0)
+MAX_NETWORK_HOPS = 3
+
+
+# Network diagrams are drawn by worker processes and cached by graph content
+diagram_renderer = diagram_worker.DiagramRenderer(
+    os.environ.get("DIAGRAM_CACHE_DIR", diagram_worker.DEFAULT_DIAGRAM_CACHE_DIR)
+)
+
+
+# Ranked name search (/search and chat suggestions)
+MAX_SEARCH_RESULTS = 50
+VESSEL_SUGGESTIONS = 5
+
+
+# Shared read-only connection pool for request handlers
+def get_db_pool():
+    return get_pool("maritime_data.db")
+
+
+# Punctuation stripped from chat input; a dot between digits is kept so "10.5 knots" survives
+PUNCTUATION_PATTERN = re.compile(r"(?!(?<=\d)\.(?=\d))[^\w\s]")
+NUMBER_PATTERN = re.compile(r"^\d+(?:\.\d+)?$")
+FLAG_FILLER_PATTERN = re.compile(r"\b(the|under|registered|sail|sails|that|which|are)\b")
+STATUS_PATTERN = re.compile(r"in transit|docked|active")
+
+# Phrases that introduce a vessel name, in priority order
+VESSEL_NAME_PATTERNS = [
+    re.compile(re.escape(phrase) + r"(.*)")
+    for phrase in ["named", "called", "find vessel", "search for", "tell me about", "look for", "find"]
+]
 
 
 # Function to clean user input
 def clean_input(text):
     """Removes punctuation and extra spaces from user input."""
-    return re.sub(r"[^\w\s]", "", text).strip()
+    return PUNCTUATION_PATTERN.sub("", text).strip()
 
 
 # Function to extract speed range from the query
 def extract_speed_range(user_query):
     """Extracts the speed range (min and max) from a query if present."""
-    speeds = [float(s) for s in user_query.split() if s.replace('.', '', 1).isdigit()]
+    speeds = [float(s) for s in user_query.split() if NUMBER_PATTERN.match(s)]
     if len(speeds) == 2:
         return speeds[0], speeds[1]
     return None, None
@@ -35,209 +130,319 @@ def extract_speed_range(user_query):
 # Function to extract flag name from the query
 def extract_flag(user_query):
     """Extracts the flag from a flag-related query."""
-    flag_query = user_query.split("flag")[-1].strip()
-    flag_query = re.sub(r"the|under|registered", "", flag_query).strip()
-    return flag_query
+    before, _, after = user_query.partition("flag")
+    # "vessels under the panama flag" names the flag before the keyword
+    flag_query = after.strip() or before.split("vessels")[-1]
+    flag_query = FLAG_FILLER_PATTERN.sub("", flag_query)
+    return " ".join(flag_query.split())
 
 
 # Function to extract vessel name intelligently
 def extract_vessel_name(user_query):
     """Tries to extract the vessel name from the user's query."""
-    phrases = ["named", "called", "find vessel", "search for", "tell me about", "look for", "find"]
-    for phrase in phrases:
-        if phrase in user_query:
-            return user_query.split(phrase, 1)[1].strip()
+    for pattern in VESSEL_NAME_PATTERNS:
+        match = pattern.search(user_query)
+        if match:
+            return match.group(1).strip()
     return None
 
 
 # Function to export data to CSV
-def export_data_to_csv(query, params=()):
-    """Generates a CSV file from a SQL query."""
-    conn = connect_to_database()
-    try:
-        data = pd.read_sql_query(query, conn, params=params)
-        output = io.StringIO()
-        data.to_csv(output, index=False)
-        output.seek(0)
-        return output
-    finally:
-        conn.close()
+def export_data_to_csv(query, params=(), batch_size=EXPORT_BATCH_SIZE, compress=False):
+    """Streams a SQL query's result as CSV text (or gzip bytes) in fixed-size row batches."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    gzip_stream = zlib.compressobj(wbits=31) if compress else None
+
+    def flush():
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return gzip_stream.compress(text.encode("utf-8")) if compress else text
+
+    with get_db_pool().connection() as conn:
+        cursor = conn.execute(query, params)
+        writer.writerow([column[0] for column in cursor.description])
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            writer.writerows(rows)
+            chunk = flush()
+            if chunk:
+                yield chunk
+    chunk = flush()
+    if compress:
+        chunk += gzip_stream.flush()
+    if chunk:
+        yield chunk
+
+
+# Builds each clustered marker from a [lat, lon, vessel_name] row
+MARKER_CALLBACK = """
+function (row) {
+    var marker = L.marker(new L.LatLng(row[0], row[1]));
+    marker.bindPopup(String(row[2]));
+    return marker;
+}
+"""
 
 
 # Function to generate geospatial maps
 def generate_map(data):
-    """Generate an interactive map from vessel data."""
-    m = folium.Map(location=[0, 0], zoom_start=2)
-    for _, row in data.iterrows():
-        lat, lon = eval(row['last_known_position'])  # Parse string to tuple
-        folium.Marker([lat, lon], popup=row['vessel_name']).add_to(m)
+    """Generate an interactive map from vessel data with numeric lat/lon columns."""
+    m = folium.Map(location=[0, 0], zoom_start=2, prefer_canvas=True)
+    positioned = data.dropna(subset=['lat', 'lon'])
+    # One JSON array of coordinates clustered in the browser, instead of a Marker element per vessel
+    FastMarkerCluster(
+        positioned[['lat', 'lon', 'vessel_name']].values.tolist(),
+        callback=MARKER_CALLBACK
+    ).add_to(m)
     return m
 
 
+# Function to describe the vessel/owner/port graph of port-visit rows for diagram_worker
+def network_diagram_graph(data):
+    """Expects one row per port visit, as returned by VESSEL_PORT_VISITS_QUERY."""
+    nodes, edges = set(), set()
+    for vessel, owner, port in data[['vessel_name', 'owner', 'port']].itertuples(index=False):
+        nodes.add((f"vessel:{vessel}", vessel, "vessel"))
+        if isinstance(owner, str):
+            nodes.add((f"owner:{owner}", owner, "owner"))
+            edges.add((f"vessel:{vessel}", f"owner:{owner}"))
+        if isinstance(port, str):
+            nodes.add((f"port:{port}", port, "port"))
+            edges.add((f"vessel:{vessel}", f"port:{port}"))
+    return diagram_worker.diagram_graph(nodes, edges)
+
+
 # Function to generate a social network diagram
 def generate_network_diagram(data):
-    """Create a social network diagram of vessels, owners, and visited ports."""
-    G = nx.Graph()
-
-    for _, row in data.iterrows():
-        vessel = row['vessel_name']
-        owner = row['owner']
-        ports = eval(row['visited_ports'])  # Parse string to list
-        G.add_node(vessel, type='vessel')
-        G.add_node(owner, type='owner')
-        G.add_edge(vessel, owner)
-
-        for port in ports:
-            G.add_node(port, type='port')
-            G.add_edge(vessel, port)
-
-    # Generate the diagram
-    plt.figure(figsize=(10, 10))
-    pos = nx.spring_layout(G)
-    nx.draw(G, pos, with_labels=True, node_size=500, node_color='lightblue', font_size=10)
-    plt.title("Social Network Diagram")
-    output = io.BytesIO()
-    plt.savefig(output, format='png')
-    output.seek(0)
-    return output
+    """Create a social network diagram of vessels, owners, and visited ports.
+
+    Renders in the calling thread; request handlers queue diagrams on diagram_renderer instead.
+    """
+    return io.BytesIO(diagram_worker.render_png(network_diagram_graph(data)))
+
+
+# Intent extractors: each returns the intent's query parameters, or None if it does not apply
+def _speed_params(user_query):
+    min_speed, max_speed = extract_speed_range(user_query)
+    return None if min_speed is None else (min_speed, max_speed)
+
+
+def _owner_params(user_query):
+    return (user_query.split("owned by")[-1].strip(),)
+
+
+def _vessel_name_params(user_query):
+    vessel_name = extract_vessel_name(user_query)
+    return (vessel_name,) if vessel_name else None
+
+
+def _status_params(user_query):
+    return (STATUS_PATTERN.search(user_query).group(0),)
+
+
+def _flag_params(user_query):
+    return (extract_flag(user_query),)
+
+
+# Chat intents in priority order: (intent, compiled trigger, parameter extractor)
+INTENT_ROUTES = [
+    ("speed", re.compile(r"speed|knots"), _speed_params),
+    ("owner", re.compile(r"owned by"), _owner_params),
+    ("vessel_name", re.compile(r"vessel"), _vessel_name_params),
+    ("status", STATUS_PATTERN, _status_params),
+    ("flag", re.compile(r"flag|registered under|sail under"), _flag_params),
+]
+
+
+# Function to route a chat query to an intent
+def route_intent(user_query):
+    """Normalizes the query and returns (intent, params), or (None, ()) if nothing matches."""
+    user_query = clean_input(user_query.lower())
+    for intent, trigger, extract_params in INTENT_ROUTES:
+        if trigger.search(user_query):
+            params = extract_params(user_query)
+            if params is not None:
+                return intent, params
+    return None, ()
+
+
+# Intent handlers: each answers one intent with a pooled connection's cursor
+def _answer_speed(cursor, min_speed, max_speed):
+    cursor.execute(SPEED_RANGE_QUERY, (min_speed, max_speed))
+    results = cursor.fetchall()
+    if results:
+        return {
+            "response": "I found these vessels within your speed range:\n" +
+                        "\n".join([f"{row[0]} ({row[1]} knots)" for row in results]),
+            "follow_up": "Would you like to download the data associated with this request?",
+            "download_link": url_for("download_data", filter="speed", value=[min_speed, max_speed])
+        }
+    return {"response": "I couldn’t find any vessels within that speed range."}
+
+
+def _answer_owner(cursor, owner):
+    cursor.execute(OWNER_QUERY, (owner.lower(),))
+    results = cursor.fetchall()
+    if results:
+        return {
+            "response": f"The following vessels are owned by {owner.capitalize()}:\n" +
+                        ", ".join([row[1] for row in results]),
+            "follow_up": "Would you like to download the data associated with this request?",
+            "download_link": url_for("download_data", filter="owner", value=owner.lower())
+        }
+    return {"response": f"I couldn’t find any vessels owned by {owner.capitalize()}."}
+
+
+def _answer_vessel_name(cursor, vessel_name):
+    cursor.execute(VESSEL_NAME_QUERY, (vessel_name.lower(),))
+    result = cursor.fetchone()
+    if not result:
+        # Partial or misspelled names: suggest the closest vessels instead
+        matches = vessel_search.search_vessels(cursor.connection, vessel_name, limit=VESSEL_SUGGESTIONS)
+        suggestions = list(dict.fromkeys(match["name"] for match in matches if match["name"]))
+        if suggestions:
+            return {"response": f"I couldn’t find a vessel named exactly '{vessel_name}'. "
+                                f"Did you mean {', '.join(suggestions)}?"}
+        return {"response": f"I'm sorry, but I couldn’t find any vessel named '{vessel_name}'. Maybe you can check the name and try again?"}
+    vessel_name, vessel_type, owner, flag, speed_knots, dimensions, visited_ports, \
+        last_known_position, status, mmsi = result
+
+    # Natural language response construction
+    response = (
+        f"Sure, here's what I found about the vessel '{vessel_name}':\n"
+        f"'{vessel_name}' is a {vessel_type} vessel owned by {owner}. "
+        f"It sails under the flag of {flag} and has a maximum speed of {speed_knots} knots. "
+        f"Its dimensions are {dimensions}, and its most recent known location was at {last_known_position}. "
+        f"Currently, the vessel is '{status}'.\n"
+        f"Some of the ports it has visited include: {visited_ports}.\n"
+        f"Additionally, its MMSI (Maritime Mobile Service Identity) is {mmsi}."
+    )
+
+    return {
+        "response": response,
+        "follow_up": "Does this help? Would you like to download the detailed data for this vessel?",
+        "download_link": url_for("download_data", filter="vessel_name", value=vessel_name.lower())
+    }
+
+
+def _answer_status(cursor, status):
+    cursor.execute(STATUS_QUERY, (status,))
+    results = cursor.fetchall()
+    if results:
+        return {
+            "response": f"The following vessels are currently '{status.capitalize()}':\n" +
+                        ", ".join([row[1] for row in results]),
+            "follow_up": "Would you like to download the data associated with this request?",
+            "download_link": url_for("download_data", filter="status", value=status)
+        }
+    return {"response": f"I couldn’t find any vessels with the status '{status.capitalize()}'."}
+
+
+def _answer_flag(cursor, flag):
+    cursor.execute(FLAG_QUERY, (flag.lower(),))
+    results = cursor.fetchall()
+    if results:
+        return {
+            "response": f"Under the {flag.capitalize()} flag, I found the following vessels: " +
+                        ", ".join([row[1] for row in results]),
+            "follow_up": "Would you like to download the data associated with this request?",
+            "download_link": url_for("download_data", filter="flag", value=flag.lower())
+        }
+    return {"response": f"I couldn’t find any vessels registered under the {flag.capitalize()} flag."}
+
+
+INTENT_HANDLERS = {
+    "speed": _answer_speed,
+    "owner": _answer_owner,
+    "vessel_name": _answer_vessel_name,
+    "status": _answer_status,
+    "flag": _answer_flag,
+}
+
+
+# Function to drop cached answers once the loader has written new data
+def refresh_query_cache():
+    """Checks the ingest watermark at most every DATA_VERSION_CHECK_INTERVAL seconds."""
+    global _next_version_check
+    now = time.monotonic()
+    if now < _next_version_check:
+        return
+    _next_version_check = now + DATA_VERSION_CHECK_INTERVAL
+    with get_db_pool().connection() as conn:
+        query_cache.invalidate_if_changed(get_data_version(conn))
 
 
 # Main query processing function
 def process_query(user_query):
-    conn = connect_to_database()
-    cursor = conn.cursor()
-
-    try:
-        user_query = clean_input(user_query.lower())
-
-        # Handle Speed-Based Queries
-        if "speed" in user_query or "knots" in user_query:
-            min_speed, max_speed = extract_speed_range(user_query)
-            if min_speed is not None and max_speed is not None:
-                query = "SELECT * FROM vessels WHERE speed_knots BETWEEN ? AND ?"
-                cursor.execute(query, (min_speed, max_speed))
-                results = cursor.fetchall()
-                conn.close()
-                if results:
-                    download_query = f"speed_knots BETWEEN {min_speed} AND {max_speed}"
-                    return {
-                        "response": "I found these vessels within your speed range:\n" +
-                                    "\n".join([f"{row[1]} ({row[5]} knots)" for row in results]),
-                        "follow_up": "Would you like to download the data associated with this request?",
-                        "download_link": url_for("download_data", query=download_query)
-                    }
-                return {"response": "I couldn’t find any vessels within that speed range."}
-
-        # Handle Owner-Based Queries
-        if "owned by" in user_query:
-            owner = user_query.split("owned by")[-1].strip()
-            query = "SELECT * FROM vessels WHERE LOWER(owner) = ?"
-            cursor.execute(query, (owner.lower(),))
-            results = cursor.fetchall()
-            conn.close()
-            if results:
-                download_query = f"LOWER(owner) = '{owner.lower()}'"
-                return {
-                    "response": f"The following vessels are owned by {owner.capitalize()}:\n" +
-                                ", ".join([row[1] for row in results]),
-                    "follow_up": "Would you like to download the data associated with this request?",
-                    "download_link": url_for("download_data", query=download_query)
-                }
-            return {"response": f"I couldn’t find any vessels owned by {owner.capitalize()}."}
-
-       
-        # Handle Vessel Name Queries
-        if "vessel" in user_query:
-            vessel_name = extract_vessel_name(user_query)
-            if vessel_name:
-                query = '''SELECT vessel_name, vessel_type, owner, flag, speed_knots, dimensions,
-                   visited_ports, last_known_position, status, mmsi
-                   FROM vessels
-                   WHERE LOWER(vessel_name) = ?'''
-            cursor.execute(query, (vessel_name.lower(),))
-            result = cursor.fetchone()
-            conn.close()
-            if result:
-                vessel_name, vessel_type, owner, flag, speed_knots, dimensions, visited_ports, \
-                    last_known_position, status, mmsi = result
-
-            # Natural language response construction
-            response = (
-                f"Sure, here's what I found about the vessel '{vessel_name}':\n"
-                f"'{vessel_name}' is a {vessel_type} vessel owned by {owner}. "
-                f"It sails under the flag of {flag} and has a maximum speed of {speed_knots} knots. "
-                f"Its dimensions are {dimensions}, and its most recent known location was at {last_known_position}. "
-                f"Currently, the vessel is '{status}'.\n"
-                f"Some of the ports it has visited include: {visited_ports}.\n"
-                f"Additionally, its MMSI (Maritime Mobile Service Identity) is {mmsi}."
-            )
-
-            return {
-                "response": response,
-                "follow_up": "Does this help? Would you like to download the detailed data for this vessel?",
-                "download_link": url_for("download_data", query=f"LOWER(vessel_name) = '{vessel_name.lower()}'")
-            }
-        return {"response": f"I'm sorry, but I couldn’t find any vessel named '{vessel_name}'. Maybe you can check the name and try again?"}
-
-        # Handle Status Queries
-        if any(status in user_query for status in ["in transit", "docked", "active"]):
-            if "in transit" in user_query:
-                status = "in transit"
-            elif "docked" in user_query:
-                status = "docked"
-            elif "active" in user_query:
-                status = "active"
-
-            query = "SELECT * FROM vessels WHERE LOWER(status) = ?"
-            cursor.execute(query, (status,))
-            results = cursor.fetchall()
-            conn.close()
-            if results:
-                download_query = f"LOWER(status) = '{status}'"
-                return {
-                    "response": f"The following vessels are currently '{status.capitalize()}':\n" +
-                                ", ".join([row[1] for row in results]),
-                    "follow_up": "Would you like to download the data associated with this request?",
-                    "download_link": url_for("download_data", query=download_query)
-                }
-            return {"response": f"I couldn’t find any vessels with the status '{status.capitalize()}'."}
-
-        # Handle Flag Queries
-        if "flag" in user_query or "registered under" in user_query or "sail under" in user_query:
-            flag = extract_flag(user_query)
-            query = "SELECT * FROM vessels WHERE LOWER(flag) LIKE ?"
-            cursor.execute(query, (f"%{flag.lower()}%",))
-            results = cursor.fetchall()
-            conn.close()
-            if results:
-                download_query = f"LOWER(flag) LIKE '%{flag.lower()}%'"
-                return {
-                    "response": f"Under the {flag.capitalize()} flag, I found the following vessels: " +
-                                ", ".join([row[1] for row in results]),
-                    "follow_up": "Would you like to download the data associated with this request?",
-                    "download_link": url_for("download_data", query=download_query)
-                }
-            return {"response": f"I couldn’t find any vessels registered under the {flag.capitalize()} flag."}
-
+    intent, params = route_intent(user_query)
+    if intent is None:
         return {"response": "I'm sorry, I didn’t quite understand your request. Can you try rephrasing it?"}
 
+    try:
+        refresh_query_cache()
+        cache_key = (intent, params)
+        response = query_cache.get(cache_key)
+        if response is None:
+            with get_db_pool().connection() as conn:
+                response = INTENT_HANDLERS[intent](conn.cursor(), *params)
+            query_cache.put(cache_key, response)
+        return response
     except Exception as e:
         return {"response": f"An error occurred: {e}"}
-    finally:
-        conn.close()
+
+
+# Function to build the export query for a /download filter
+def download_query(filter_name):
+    """Returns the parameterized SELECT for one of DOWNLOAD_FILTERS."""
+    where_clause, _ = DOWNLOAD_FILTERS[filter_name]
+    return f"SELECT {EXPORT_COLUMNS} FROM vessels WHERE {where_clause}"
 
 
 @app.route("/download")
 def download_data():
-    query_params = request.args.get("query", "")
-    query = f"SELECT * FROM vessels WHERE {query_params}"  # Dynamically apply the query filters
-    csv_content = export_data_to_csv(query)
-    response = make_response(csv_content.getvalue())
-    response.headers["Content-Disposition"] = "attachment; filename=requested_data.csv"
-    response.headers["Content-Type"] = "text/csv"
+    filter_name = request.args.get("filter", "")
+    values = request.args.getlist("value")
+    if filter_name not in DOWNLOAD_FILTERS:
+        abort(400, description=f"Unknown download filter '{filter_name}'.")
+    _, value_count = DOWNLOAD_FILTERS[filter_name]
+    if len(values) != value_count:
+        abort(400, description=f"Filter '{filter_name}' takes {value_count} value(s).")
+    if filter_name == "speed":
+        try:
+            values = [float(value) for value in values]
+        except ValueError:
+            abort(400, description="Speed values must be numbers.")
+
+    compress = request.args.get("gzip", "").lower() in ("1", "true", "yes")
+    query = download_query(filter_name)
+    filename = "requested_data.csv.gz" if compress else "requested_data.csv"
+    response = Response(export_data_to_csv(query, values, compress=compress),
+                        mimetype="application/gzip" if compress else "text/csv")
+    response.headers["Content-Disposition"] = f"attachment; filename={filename}"
     return response
 
 
+@app.route("/search")
+def search():
+    """Ranked vessels matching ?q= by name, owner or MMSI: exact, prefix, substring, then fuzzy."""
+    text = request.args.get("q", "").strip()
+    if not text:
+        abort(400, description="Pass the text to search for as ?q=.")
+    try:
+        limit = int(request.args.get("limit", 10))
+    except ValueError:
+        abort(400, description="limit must be a whole number.")
+    if not 1 <= limit <= MAX_SEARCH_RESULTS:
+        abort(400, description=f"limit must be between 1 and {MAX_SEARCH_RESULTS}.")
+    with get_db_pool().connection() as conn:
+        results = vessel_search.search_vessels(conn, text, limit)
+    return jsonify({"query": text, "results": results})
+
+
 @app.route("/process", methods=["POST"])
 def process_chat():
     user_query = request.json.get("query", "")
@@ -249,6 +454,165 @@ def process_chat():
     })
 
 
+# Function to return the risk database engine, creating the score tables on first use
+def get_risk_engine():
+    global _risk_schema_ready
+    engine = get_engine(RISK_DB_URL)
+    if not _risk_schema_ready:
+        risk_scoring.ensure_scoring_schema(engine)
+        _risk_schema_ready = True
+    return engine
+
+
+# Function to read the data version a map tile layer is rendered from
+def tile_version(layer):
+    version = tile_versions.get(layer)
+    if version is None:
+        if layer == "risk":
+            version = map_tiles.risk_version(get_risk_engine())
+        else:
+            with get_db_pool().connection() as conn:
+                version = get_data_version(conn)
+        tile_versions.put(layer, version)
+    return version
+
+
+# Function to render one map tile (cache misses only)
+def render_tile(layer, version, z, x, y):
+    if layer == "risk":
+        points = risk_points_cache.get(version)
+        if points is None:
+            points = map_tiles.load_risk_points(get_risk_engine())
+            risk_points_cache.put(version, points)
+        return map_tiles.render_risk_tile(points, z, x, y)
+    with get_db_pool().connection() as conn:
+        return map_tiles.render_density_tile(conn, z, x, y)
+
+
+@app.route("/tiles/<int:z>/<int:x>/<int:y>")
+def map_tile(z, x, y):
+    layer = request.args.get("layer", "density")
+    if layer not in map_tiles.LAYERS:
+        abort(400, description=f"Unknown tile layer '{layer}'.")
+    if not map_tiles.valid_tile(z, x, y):
+        abort(404, description=f"No tile {z}/{x}/{y}.")
+    if layer == "risk" and not RISK_DB_URL:
+        abort(404, description="The risk layer needs RISK_DB_URL.")
+
+    version = tile_version(layer)
+    png = tile_caches[layer].get(version, z, x, y, lambda: render_tile(layer, version, z, x, y))
+    response = Response(png, mimetype="image/png")
+    response.headers["Cache-Control"] = f"public, max-age={TILE_MAX_AGE}"
+    response.set_etag(f"{layer}-{version}-{z}-{x}-{y}")
+    return response.make_conditional(request)
+
+
+@app.route("/risk")
+def top_risk():
+    """Highest-risk vessels from the latest risk_scoring.py run, up to ?limit=."""
+    if not RISK_DB_URL:
+        abort(404, description="Risk scores need RISK_DB_URL.")
+    try:
+        limit = int(request.args.get("limit", 100))
+    except ValueError:
+        abort(400, description="limit must be a whole number.")
+    if not 1 <= limit <= MAX_RISK_RESULTS:
+        abort(400, description=f"limit must be between 1 and {MAX_RISK_RESULTS}.")
+
+    version = tile_version("risk")
+    vessels = top_risk_cache.get((version, limit))
+    if vessels is None:
+        ranked = risk_scoring.top_risk_vessels(RISK_DB_URL, limit)
+        vessels = [
+            {"vessel_id": row.vessel_id, "risk_score": round(row.risk_score, 4),
+             "model_version": row.model_version, "last_ping": row.last_ping.isoformat(),
+             "scored_at": row.scored_at.isoformat()}
+            for row in ranked.itertuples(index=False)
+        ]
+        top_risk_cache.put((version, limit), vessels)
+    return jsonify({"scored_at": version, "vessels": vessels})
+
+
+# Function to return the analyzed vessel network, or None before vessel_network.py has run
+def current_network():
+    with get_db_pool().connection() as conn:
+        version = vessel_network.network_version(conn)
+        if version is None:
+            return None
+        network = network_cache.get(version)
+        if network is None:
+            network = vessel_network.VesselNetwork.load(conn)
+            network_cache.put(version, network)
+    return network
+
+
+# Function to look up the neighbourhood named by the vessel and hops query parameters
+def requested_neighbourhood():
+    vessel = request.args.get("vessel", "")
+    try:
+        hops = int(request.args.get("hops", 2))
+    except ValueError:
+        abort(400, description="hops must be a whole number.")
+    if not 1 <= hops <= MAX_NETWORK_HOPS:
+        abort(400, description=f"hops must be between 1 and {MAX_NETWORK_HOPS}.")
+
+    network = current_network()
+    if network is None:
+        abort(503, description="The vessel network has not been built yet; run vessel_network.py.")
+    subgraph = network.neighbourhood(vessel, hops)
+    if subgraph is None:
+        abort(404, description=f"No vessel named '{vessel}' in the network.")
+    return subgraph
+
+
+@app.route("/network")
+def vessel_neighbourhood():
+    return jsonify(requested_neighbourhood())
+
+
+# Function to answer a diagram request: the image when it is ready, otherwise the job to poll
+def diagram_response(digest, png):
+    if png is not None:
+        response = Response(png, mimetype="image/png")
+        # Diagrams are addressed by their content, so they never change
+        response.headers["Cache-Control"] = "public, max-age=86400, immutable"
+        return response
+    return jsonify({
+        "job": digest,
+        "status": "pending",
+        "result": url_for("network_diagram_job", digest=digest),
+    }), 202
+
+
+@app.route("/network/diagram")
+def network_diagram():
+    subgraph = requested_neighbourhood()
+    graph = diagram_worker.diagram_graph(
+        [(node["node_id"], node["label"], node["kind"]) for node in subgraph["nodes"]],
+        [(a, b) for a, b, _ in subgraph["edges"]]
+    )
+    return diagram_response(*diagram_renderer.submit(graph))
+
+
+@app.route("/network/diagram/<digest>")
+def network_diagram_job(digest):
+    status, value = diagram_renderer.status(digest)
+    if status == "failed":
+        abort(500, description=f"Rendering failed: {value}")
+    if status == "unknown":
+        abort(404, description="No such diagram job.")
+    return diagram_response(digest, value)
+
+
+@app.route("/stats")
+def stats():
+    return jsonify({
+        "query_cache": query_cache.stats(),
+        "tile_caches": {layer: cache.stats() for layer, cache in tile_caches.items()},
+        "connection_pool": get_db_pool().stats()
+    })
+
+
 @app.route("/")
 def chatbot():
     return render_template("chat.html")
@@ -1,33 +1,15 @@
-import sqlite3
-
-# Query functions (same as in query_interface.py)
-def connect_to_database(db_name="maritime_data.db"):
-    return sqlite3.connect(db_name)
-
-def find_vessel_by_name(conn, vessel_name):
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT * FROM vessels WHERE vessel_name = ?
-    ''', (vessel_name,))
-    return cursor.fetchall()
-
-def get_vessels_by_flag(conn, flag):
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT * FROM vessels WHERE flag = ?
-    ''', (flag,))
-    return cursor.fetchall()
-
-def get_vessels_by_status(conn, status):
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT * FROM vessels WHERE status = ?
-    ''', (status,))
-    return cursor.fetchall()
+# Query functions and connection pool shared with query_interface.py
+from query_interface import (
+    find_vessel_by_name, get_db_pool, get_vessels_by_flag, get_vessels_by_status, search_vessels
+)
 
 # Chatbot logic
 def chatbot():
-    conn = connect_to_database()
+    with get_db_pool().connection() as conn:
+        chat_loop(conn)
+
+# Question loop, run on a connection checked out of the pool
+def chat_loop(conn):
     print("Welcome to the Maritime Chatbot! Type 'exit' to quit.")
     
     while True:
@@ -42,7 +24,12 @@ def chatbot():
         if "find vessel" in user_input:
             vessel_name = input("Enter the vessel name: ").strip()
             result = find_vessel_by_name(conn, vessel_name)
-            print("Vessel details:", result if result else "No vessel found.")
+            if result:
+                print("Vessel details:", result)
+            else:
+                # Partial or misspelled names: offer the closest matches instead
+                suggestions = [match["name"] for match in search_vessels(conn, vessel_name, limit=5)]
+                print("No vessel found." + (f" Did you mean: {', '.join(suggestions)}?" if suggestions else ""))
         
         elif "vessels by flag" in user_input:
             flag = input("Enter the flag: ").strip()
@@ -56,8 +43,6 @@ def chatbot():
         
         else:
             print("I didn't understand that. Try asking about vessels by name, flag, or status.")
-    
-    conn.close()
 
 # Run the chatbot
 if __name__ == "__main__":
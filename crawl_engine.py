@@ -0,0 +1,214 @@
+# install packages - pip install aiohttp
+
+import asyncio
+import os
+import random
+import time
+from urllib.parse import urlsplit
+
+import aiohttp
+
+# Status codes worth retrying; anything else is handed to the page handler as-is
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Async token bucket: allows `rate` requests per second with bursts up to `burst`.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class CrawlStats:
+    """
+    Page counters and per-request latencies for a crawl run.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.pages = 0
+        self.failures = 0
+        self.retries = 0
+        self.skipped = 0
+        self.cache_hits = 0
+        self.revalidated = 0
+        self.latencies = []
+
+    def percentile(self, fraction):
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def summary(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return {
+            "pages": self.pages,
+            "failures": self.failures,
+            "retries": self.retries,
+            "skipped": self.skipped,
+            "cache_hits": self.cache_hits,
+            "revalidated": self.revalidated,
+            "pages_per_sec": self.pages / elapsed,
+            "p50_ms": self.percentile(0.50) * 1000,
+            "p95_ms": self.percentile(0.95) * 1000,
+            "p99_ms": self.percentile(0.99) * 1000,
+        }
+
+
+class Checkpoint:
+    """
+    Append-only file of finished keys, so an interrupted crawl can resume where it stopped.
+    Once a run completes, clear() removes it so the next run starts over.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.done = {line.strip() for line in f if line.strip()}
+        self.file = open(path, "a") if path else None
+
+    def mark(self, key):
+        self.done.add(str(key))
+        if self.file:
+            self.file.write(f"{key}\n")
+            self.file.flush()
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def clear(self):
+        self.close()
+        self.done = set()
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+async def fetch_with_retries(session, url, bucket, stats, retries=3, backoff=0.5, cache=None,
+                             conditional=True):
+    """
+    GET a URL under the host's rate limit, retrying transient failures with exponential backoff.
+    With an http_cache.ResponseCache, fresh entries skip the network entirely and stale ones
+    are revalidated with a conditional request (unless `conditional` is False). The cache's
+    SQLite and disk I/O runs in worker threads, off the event loop.
+    Returns (status, body bytes) or raises once retries are exhausted.
+    """
+    entry = await asyncio.to_thread(cache.lookup, url) if cache is not None and conditional else None
+    if entry is not None and entry.fresh:
+        stats.cache_hits += 1
+        return 200, await asyncio.to_thread(entry.read)
+    headers = entry.conditional_headers() if entry is not None else {}
+
+    for attempt in range(retries + 1):
+        await bucket.acquire()
+        started = time.monotonic()
+        try:
+            async with session.get(url, headers=headers) as response:
+                body = await response.read()
+                stats.latencies.append(time.monotonic() - started)
+                if response.status == 304 and entry is not None:
+                    refreshed = await asyncio.to_thread(cache.revalidated, url, response.headers)
+                    if refreshed is None:
+                        # Evicted between the lookup and the 304: fetch the body again
+                        return await fetch_with_retries(session, url, bucket, stats, retries, backoff,
+                                                        cache, conditional=False)
+                    stats.revalidated += 1
+                    return 200, await asyncio.to_thread(refreshed.read)
+                if response.status not in RETRY_STATUSES:
+                    if response.status == 200 and cache is not None:
+                        await asyncio.to_thread(cache.store, url, body, response.headers)
+                    return response.status, body
+                if attempt == retries:
+                    raise RuntimeError(f"HTTP {response.status} after {retries} retries")
+                retry_after = response.headers.get("Retry-After", "")
+                delay = float(retry_after) if retry_after.isdigit() else backoff * 2 ** attempt
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            stats.latencies.append(time.monotonic() - started)
+            if attempt == retries:
+                raise
+            delay = backoff * 2 ** attempt
+        stats.retries += 1
+        await asyncio.sleep(delay + random.uniform(0, delay / 2))
+
+
+async def crawl(urls, handle_page, concurrency=16, rate_per_host=5.0, burst=5,
+                retries=3, backoff=0.5, timeout=30, checkpoint_path=None, cache=None):
+    """
+    Fetch every (key, url) pair through one shared session with `concurrency` workers.
+
+    handle_page(key, status, body) is called for each fetched page and returns a result
+    (or None); it may be a coroutine function, e.g. to hand parsing to an executor.
+    Keys are written to the checkpoint once handled, and keys already in the checkpoint
+    are skipped. Pass an http_cache.ResponseCache as `cache` to reuse and revalidate
+    earlier responses. Returns (results, stats summary).
+    """
+    checkpoint = Checkpoint(checkpoint_path)
+    stats = CrawlStats()
+    buckets = {}
+    results = []
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+
+    async def worker(session):
+        while True:
+            item = await queue.get()
+            if item is None:
+                queue.task_done()
+                return
+            key, url = item
+            host = urlsplit(url).netloc
+            bucket = buckets.setdefault(host, TokenBucket(rate_per_host, burst))
+            try:
+                status, body = await fetch_with_retries(session, url, bucket, stats, retries, backoff, cache)
+                stats.pages += 1
+                result = handle_page(key, status, body)
+                if asyncio.iscoroutine(result):
+                    result = await result
+                if result is not None:
+                    results.append(result)
+                checkpoint.mark(key)
+            except Exception as e:
+                stats.failures += 1
+                print(f"Failed to crawl {key}: {e}")
+            finally:
+                queue.task_done()
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    try:
+        async with aiohttp.ClientSession(connector=connector, timeout=client_timeout) as session:
+            workers = [asyncio.create_task(worker(session)) for _ in range(concurrency)]
+            for key, url in urls:
+                if str(key) in checkpoint.done:
+                    stats.skipped += 1
+                    continue
+                await queue.put((key, url))
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        # Every key was handled, so there is nothing left to resume
+        if stats.failures == 0:
+            checkpoint.clear()
+    finally:
+        checkpoint.close()
+    return results, stats.summary()
@@ -0,0 +1,341 @@
+import math
+import re
+
+import vessel_search
+from data_loader import lower_name
+from db_pool import get_pool
+
+# DataTable column -> vessels column. Only these names are ever interpolated into SQL.
+TABLE_COLUMNS = {
+    "MMSI": "mmsi",
+    "Vessel Name": "vessel_name",
+    "Type": "vessel_type",
+    "Flag": "flag",
+    "Owner": "owner",
+    "Status": "status",
+    "Latitude": "lat",
+    "Longitude": "lon",
+    "Speed": "speed_knots",
+}
+NUMERIC_COLUMNS = {"MMSI", "Latitude", "Longitude", "Speed"}
+
+PAGE_SIZE = 25
+# Matching rows are counted up to this many; beyond it the page count is left open
+MAX_COUNTED_ROWS = 10000
+
+# DataTable filter_query operators (see the DataTable filtering docs) -> SQL
+FILTER_OPERATORS = {
+    "eq": "=", "=": "=", "ne": "!=", "!=": "!=",
+    "gt": ">", ">": ">", "ge": ">=", ">=": ">=",
+    "lt": "<", "<": "<", "le": "<=", "<=": "<=",
+    "contains": "contains", "datestartswith": "startswith",
+}
+FILTER_PART_PATTERN = re.compile(
+    r"^\s*\{(?P<column>[^}]+)\}\s+(?:[si](?=[a-z]))?(?P<operator>eq|ne|gt|ge|lt|le|contains|datestartswith|[=!<>]=?)\s+"
+    r"(?P<value>\"(?:[^\"\\\\]|\\\\.)*\"|'(?:[^'\\\\]|\\\\.)*'|\S+)\s*$"
+)
+MMSI_PATTERN = re.compile(r"^\d{9}$")
+
+# Highest code point, used as the exclusive upper bound of a prefix range
+PREFIX_END = "\U0010ffff"
+
+DISTINCT_VALUES_QUERY = "SELECT DISTINCT {column} FROM vessels WHERE {column} IS NOT NULL ORDER BY {column}"
+
+# Map layer: up to MAX_MAP_POINTS visible vessels are sent as individual WebGL points;
+# beyond that the viewport is aggregated into a DENSITY_GRID of cells (columns, rows)
+MAX_MAP_POINTS = 5000
+DENSITY_GRID = (160, 90)
+WORLD_BOUNDS = (-85.0, -180.0, 85.0, 180.0)  # min_lat, min_lon, max_lat, max_lon
+
+# Points are found through the R*Tree; CROSS JOIN keeps it the driving table, since probing
+# it per row from a filter index is far slower
+MAP_POINTS_QUERY = """
+    SELECT vessels.vessel_name, vessels.vessel_type, vessels.speed_knots, vessels.lat, vessels.lon
+    FROM vessel_rtree CROSS JOIN vessels ON vessels.id = vessel_rtree.id
+    WHERE vessel_rtree.max_lat >= ? AND vessel_rtree.min_lat <= ?
+      AND vessel_rtree.max_lon >= ? AND vessel_rtree.min_lon <= ? {conditions}
+    LIMIT ?
+"""
+# A search or selection matches few vessels, so their index drives the lookup instead
+SELECTED_POINTS_QUERY = """
+    SELECT vessel_name, vessel_type, speed_knots, lat, lon
+    FROM vessels
+    WHERE lat BETWEEN ? AND ? AND lon BETWEEN ? AND ? {conditions}
+    LIMIT ?
+"""
+# Cell counts read only the R*Tree, or only the vessels matching the sidebar filters
+DENSITY_QUERY = """
+    SELECT CAST((min_lat - ?) / ? AS INTEGER) AS cell_row, CAST((min_lon - ?) / ? AS INTEGER) AS cell_col,
+           COUNT(*), ROUND(AVG(min_lat), 4), ROUND(AVG(min_lon), 4)
+    FROM vessel_rtree
+    WHERE max_lat >= ? AND min_lat <= ? AND max_lon >= ? AND min_lon <= ?
+    GROUP BY cell_row, cell_col
+"""
+FILTERED_DENSITY_QUERY = """
+    SELECT CAST((lat - ?) / ? AS INTEGER) AS cell_row, CAST((lon - ?) / ? AS INTEGER) AS cell_col,
+           COUNT(*), ROUND(AVG(lat), 4), ROUND(AVG(lon), 4)
+    FROM vessels
+    WHERE lat BETWEEN ? AND ? AND lon BETWEEN ? AND ? {conditions}
+    GROUP BY cell_row, cell_col
+"""
+
+def get_db_pool(db_name="maritime_data.db"):
+    return get_pool(db_name)
+
+
+def _escape_like(text):
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _filter_value(column, raw):
+    if raw[:1] in "\"'" and raw[-1:] == raw[:1]:
+        raw = re.sub(r"\\(.)", r"\1", raw[1:-1])
+    if column in NUMERIC_COLUMNS:
+        try:
+            return float(raw)
+        except ValueError:
+            return None
+    return raw
+
+
+def parse_filter_query(filter_query):
+    """
+    Translate a DataTable filter_query ("{Speed} > 10 && {Flag} contains pan") into SQL
+    conditions and parameters. Parts with unknown columns or operators are ignored.
+    """
+    conditions, params = [], []
+    for part in (filter_query or "").split(" && "):
+        match = FILTER_PART_PATTERN.match(part)
+        if not match or match.group("column") not in TABLE_COLUMNS:
+            continue
+        name = match.group("column")
+        column = TABLE_COLUMNS[name]
+        operator = FILTER_OPERATORS[match.group("operator")]
+        value = _filter_value(name, match.group("value"))
+        if value is None:
+            continue
+        if operator == "contains":
+            conditions.append(f"{column} LIKE ? ESCAPE '\\'")
+            params.append(f"%{_escape_like(str(value))}%")
+        elif operator == "startswith":
+            conditions.append(f"{column} LIKE ? ESCAPE '\\'")
+            params.append(f"{_escape_like(str(value))}%")
+        else:
+            conditions.append(f"{column} {operator} ?")
+            params.append(value)
+    return conditions, params
+
+
+def sidebar_conditions(search=None, types=None, flags=None):
+    """
+    SQL conditions for the sidebar filters. A nine-digit search is an MMSI lookup; other
+    searches of three or more characters match anywhere in the vessel name or MMSI through the
+    vessel_search trigram index, and shorter ones are a case-insensitive vessel name prefix,
+    served by the vessel_name_lower index.
+    """
+    conditions, params = [], []
+    search = (search or "").strip()
+    if MMSI_PATTERN.match(search):
+        conditions.append("mmsi = ?")
+        params.append(int(search))
+    elif len(search) >= vessel_search.MIN_INDEXED_LENGTH:
+        conditions.append(vessel_search.SUBSTRING_CONDITION)
+        params.append(vessel_search.column_phrase(search, ("vessel_name", "mmsi")))
+    elif search:
+        prefix = lower_name(search)
+        conditions.append("vessel_name_lower >= ? AND vessel_name_lower < ?")
+        params.extend([prefix, prefix + PREFIX_END])
+    for column, values in (("vessel_type", types), ("flag", flags)):
+        if values:
+            conditions.append(f"{column} IN ({','.join('?' * len(values))})")
+            params.extend(values)
+    return conditions, params
+
+
+def _sort_column(sort_by):
+    """(vessels column, table column name, descending) of the table's sort, or None for id order."""
+    for sort in sort_by or []:
+        column = TABLE_COLUMNS.get(sort.get("column_id"))
+        if column:
+            return column, sort["column_id"], sort.get("direction") == "desc"
+    return None
+
+
+def _order_by(sort_by):
+    sort = _sort_column(sort_by)
+    if sort is None:
+        return "ORDER BY id"
+    column, _, descending = sort
+    direction = "DESC" if descending else "ASC"
+    return f"ORDER BY {column} {direction}, id {direction}"
+
+
+def _select(conditions, order_by):
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    columns = ", ".join(f'{column} AS "{name}"' for name, column in TABLE_COLUMNS.items())
+    return f"SELECT {columns}, id FROM vessels {where} {order_by}"
+
+
+def page_query(conditions, sort_by=None):
+    """
+    The SELECT for one page of the table by position; takes the condition parameters plus
+    LIMIT and OFFSET. Its cost grows with the offset, so it only serves jumps to a page
+    whose predecessor has not been read (see keyset_segments).
+    """
+    return f"{_select(conditions, _order_by(sort_by))} LIMIT ? OFFSET ?"
+
+
+def keyset_segments(sort_by=None, after=None):
+    """
+    The rows following `after`, the (sort value, id) of the previous page's last row
+    (None for the first page), as (conditions, params, ORDER BY) ranges in table order.
+    Each range is a seek on a (column, id) index: SQLite only seeks on the first column
+    of a row-value comparison, so ties with the cursor's value and NULLs (first when
+    ascending, last when descending) get ranges of their own.
+    """
+    sort = _sort_column(sort_by)
+    if sort is None:
+        if after is None:
+            return [([], [], "ORDER BY id")]
+        return [(["id > ?"], [after[1]], "ORDER BY id")]
+
+    column, _, descending = sort
+    direction, compare = ("DESC", "<") if descending else ("ASC", ">")
+    by_value = f"ORDER BY {column} {direction}, id {direction}"
+    by_id = f"ORDER BY id {direction}"
+    null_range = ([f"{column} IS NULL"], [], by_id)
+    value_range = ([f"{column} IS NOT NULL"], [], by_value)
+    if after is None:
+        return [value_range, null_range] if descending else [null_range, value_range]
+    value, last_id = after
+    if value is None:
+        ranges = [([f"{column} IS NULL", f"id {compare} ?"], [last_id], by_id)]
+        return ranges if descending else ranges + [value_range]
+    ranges = [
+        ([f"{column} = ?", f"id {compare} ?"], [value, last_id], by_id),
+        ([f"{column} {compare} ?"], [value], by_value),
+    ]
+    return ranges + [null_range] if descending else ranges
+
+
+def keyset_query(conditions, order_by):
+    """
+    The SELECT for one keyset range: takes the condition parameters plus LIMIT.
+    """
+    return f"{_select(conditions, order_by)} LIMIT ?"
+
+
+def count_query(conditions):
+    """
+    Bounded COUNT: stops after MAX_COUNTED_ROWS matches, so it costs the same on any fleet size.
+    """
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return f"SELECT COUNT(*) FROM (SELECT 1 FROM vessels {where} LIMIT {MAX_COUNTED_ROWS + 1})"
+
+
+def fetch_page(conn, search=None, types=None, flags=None, filter_query=None, sort_by=None,
+               page_current=0, page_size=PAGE_SIZE, after=None):
+    """
+    One page of vessels as DataTable records, the page count (None when more than
+    MAX_COUNTED_ROWS rows match and the total is left open), and the page's last
+    (sort value, id), to pass as `after` for the next page.
+
+    The first page, and any page given the previous page's `after`, is read by keyset
+    from the sort index, at the same cost on every page; other pages fall back to OFFSET.
+    """
+    conditions, params = sidebar_conditions(search, types, flags)
+    table_conditions, table_params = parse_filter_query(filter_query)
+    conditions += table_conditions
+    params += table_params
+
+    page_current = page_current or 0
+    if page_current == 0 or after is not None:
+        rows, names = [], None
+        for range_conditions, range_params, order_by in keyset_segments(sort_by, after):
+            cursor = conn.execute(keyset_query(conditions + range_conditions, order_by),
+                                  params + range_params + [page_size - len(rows)])
+            names = [column[0] for column in cursor.description]
+            rows += cursor.fetchall()
+            if len(rows) == page_size:
+                break
+    else:
+        cursor = conn.execute(page_query(conditions, sort_by), params + [page_size, page_current * page_size])
+        names = [column[0] for column in cursor.description]
+        rows = cursor.fetchall()
+    records = [dict(zip(names[:-1], row[:-1])) for row in rows]
+
+    last = None
+    if rows:
+        sort = _sort_column(sort_by)
+        last = (records[-1][sort[1]] if sort else None, rows[-1][-1])
+    matched = conn.execute(count_query(conditions), params).fetchone()[0]
+    page_count = None if matched > MAX_COUNTED_ROWS else max(1, -(-matched // page_size))
+    return records, page_count, last
+
+
+def distinct_values(conn, table_column):
+    """
+    Distinct non-null values of a table column, for the sidebar dropdowns.
+    """
+    column = TABLE_COLUMNS[table_column]
+    return [row[0] for row in conn.execute(DISTINCT_VALUES_QUERY.format(column=column))]
+
+
+def density_cell_size(bbox, grid=DENSITY_GRID):
+    """
+    (lat, lon) size of a density cell for a viewport: the world split into a power-of-two
+    number of cells, one level per map zoom step, with at least `grid` cells visible.
+    """
+    min_lat, min_lon, max_lat, max_lon = bbox
+    world_min_lat, world_min_lon, world_max_lat, world_max_lon = WORLD_BOUNDS
+    cell_lon = (world_max_lon - world_min_lon) / grid[0]
+    cell_lat = (world_max_lat - world_min_lat) / grid[1]
+    while cell_lon * grid[0] / 2 >= max_lon - min_lon and cell_lat * grid[1] / 2 >= max_lat - min_lat:
+        cell_lon, cell_lat = cell_lon / 2, cell_lat / 2
+    return cell_lat, cell_lon
+
+
+def snap_viewport(bbox, grid=DENSITY_GRID):
+    """
+    Clamp a (min_lat, min_lon, max_lat, max_lon) viewport to the world and round it outward
+    to whole density cells, so nearby pans share cache entries and cells keep their place.
+    """
+    world_min_lat, world_min_lon, world_max_lat, world_max_lon = WORLD_BOUNDS
+    min_lat, min_lon, max_lat, max_lon = bbox
+    min_lat, max_lat = max(min_lat, world_min_lat), min(max_lat, world_max_lat)
+    min_lon, max_lon = max(min_lon, world_min_lon), min(max_lon, world_max_lon)
+    if min_lat >= max_lat or min_lon >= max_lon:
+        return WORLD_BOUNDS
+    cell_lat, cell_lon = density_cell_size((min_lat, min_lon, max_lat, max_lon), grid)
+    return (
+        world_min_lat + math.floor((min_lat - world_min_lat) / cell_lat) * cell_lat,
+        world_min_lon + math.floor((min_lon - world_min_lon) / cell_lon) * cell_lon,
+        min(world_min_lat + math.ceil((max_lat - world_min_lat) / cell_lat) * cell_lat, world_max_lat),
+        min(world_min_lon + math.ceil((max_lon - world_min_lon) / cell_lon) * cell_lon, world_max_lon),
+    )
+
+
+def map_layer(conn, bbox=WORLD_BOUNDS, search=None, types=None, flags=None, selected=()):
+    """
+    Vessels in a viewport for the map tab. Returns ("points", records) when at most
+    MAX_MAP_POINTS vessels are visible, otherwise ("density", cells) with one
+    {lat, lon, count} per occupied grid cell. Either way the payload is bounded by the
+    screen, not the fleet.
+    """
+    conditions, params = sidebar_conditions(search, types, flags)
+    if selected:
+        conditions.append(f"vessel_name IN ({','.join('?' * len(selected))})")
+        params.extend(selected)
+    extra = "".join(f" AND {condition}" for condition in conditions)
+    min_lat, min_lon, max_lat, max_lon = bbox
+    box = [min_lat, max_lat, min_lon, max_lon]
+
+    points_query = SELECTED_POINTS_QUERY if search or selected else MAP_POINTS_QUERY
+    rows = conn.execute(points_query.format(conditions=extra), box + params + [MAX_MAP_POINTS + 1]).fetchall()
+    if len(rows) <= MAX_MAP_POINTS:
+        return "points", [dict(zip(("name", "type", "speed", "lat", "lon"), row)) for row in rows]
+
+    cell_lat, cell_lon = density_cell_size(bbox)
+    query = FILTERED_DENSITY_QUERY.format(conditions=extra) if conditions else DENSITY_QUERY
+    cells = conn.execute(query, [WORLD_BOUNDS[0], cell_lat, WORLD_BOUNDS[1], cell_lon] + box + params).fetchall()
+    return "density", [{"lat": lat, "lon": lon, "count": count} for _, _, count, lat, lon in cells]
@@ -0,0 +1,128 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+DEFAULT_DB_NAME = "maritime_data.db"
+
+# Prepared statements kept per connection; long-lived connections reuse them across requests
+CACHED_STATEMENTS = 256
+
+
+class ConnectionPool:
+    """A bounded pool of long-lived SQLite connections shared between threads.
+
+    Each checkout hands one connection to one thread until it is returned, so the
+    connection's prepared-statement cache and page cache survive between requests.
+    Read-only pools open the file with mode=ro and PRAGMA query_only.
+    """
+
+    def __init__(self, db_name=DEFAULT_DB_NAME, max_connections=8, read_only=True, timeout=30.0):
+        self.db_name = db_name
+        self.max_connections = max_connections
+        self.read_only = read_only
+        self.timeout = timeout
+        self._idle = []
+        self._opened = 0
+        self._closed = False
+        self._available = threading.Condition()
+        self.hits = 0
+        self.waits = 0
+        self.opens = 0
+
+    def _open(self):
+        """Opens and configures a new connection."""
+        if self.read_only:
+            uri = f"{Path(self.db_name).resolve().as_uri()}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False,
+                                   cached_statements=CACHED_STATEMENTS)
+            conn.execute("PRAGMA query_only = ON")
+        else:
+            conn = sqlite3.connect(self.db_name, check_same_thread=False,
+                                   cached_statements=CACHED_STATEMENTS)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA cache_size = -65536")
+        conn.execute("PRAGMA mmap_size = 268435456")
+        return conn
+
+    def acquire(self):
+        """Checks out a connection, opening one if under the limit or waiting otherwise."""
+        with self._available:
+            if self._closed:
+                raise RuntimeError("connection pool is closed")
+            if self._idle:
+                self.hits += 1
+                return self._idle.pop()
+            if self._opened >= self.max_connections:
+                self.waits += 1
+                if not self._available.wait_for(lambda: self._idle or self._closed, self.timeout):
+                    raise TimeoutError(f"no connection to {self.db_name} became free within {self.timeout}s")
+                if self._closed:
+                    raise RuntimeError("connection pool is closed")
+                return self._idle.pop()
+            self._opened += 1
+            self.opens += 1
+        try:
+            return self._open()
+        except Exception:
+            with self._available:
+                self._opened -= 1
+                self._available.notify()
+            raise
+
+    def release(self, conn):
+        """Returns a connection to the pool, rolling back anything left uncommitted."""
+        if conn.in_transaction:
+            conn.rollback()
+        with self._available:
+            if self._closed:
+                self._opened -= 1
+                conn.close()
+                return
+            # Most recently used connection is handed out first, so its caches stay warm
+            self._idle.append(conn)
+            self._available.notify()
+
+    @contextmanager
+    def connection(self):
+        """Context manager that checks a connection out for the duration of the block."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def stats(self):
+        """Returns the pool counters."""
+        with self._available:
+            return {
+                "hits": self.hits,
+                "waits": self.waits,
+                "opens": self.opens,
+                "open_connections": self._opened,
+                "idle_connections": len(self._idle),
+            }
+
+    def close(self):
+        """Closes idle connections; checked-out connections are closed when released."""
+        with self._available:
+            self._closed = True
+            while self._idle:
+                self._idle.pop().close()
+                self._opened -= 1
+            self._available.notify_all()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+# Function to get the process-wide pool for a database, creating it on first use
+def get_pool(db_name=DEFAULT_DB_NAME, **options):
+    """Returns the shared ConnectionPool for db_name; options apply only when it is created."""
+    with _pools_lock:
+        pool = _pools.get(db_name)
+        if pool is None or pool._closed:
+            pool = _pools[db_name] = ConnectionPool(db_name, **options)
+        return pool
@@ -0,0 +1,161 @@
+# install required libraries - matplotlib networkx
+
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import networkx as nx
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from result_cache import ResultCache
+
+DEFAULT_DIAGRAM_CACHE_DIR = "diagram_cache"
+RENDER_PROCESSES = 2
+# Part of every digest: bump it when the drawing changes so older images are not served
+RENDER_VERSION = 1
+LAYOUT_SEED = 42
+# Larger graphs are drawn without labels, which would only overlap
+MAX_LABELLED_NODES = 100
+NODE_COLORS = {"vessel": "lightblue", "owner": "orange", "port": "lightgreen"}
+DIGEST_PATTERN_LENGTH = 64
+
+
+def diagram_graph(nodes, edges):
+    """
+    Canonical description of a diagram from (node id, label, kind) triples and (node id,
+    node id) pairs: the same graph always gives the same description, whatever the order.
+    """
+    nodes = sorted([str(node), label, kind] for node, label, kind in nodes)
+    edges = sorted({tuple(sorted((str(a), str(b)))) for a, b in edges})
+    return {"nodes": nodes, "edges": [list(edge) for edge in edges]}
+
+
+def graph_digest(graph):
+    payload = json.dumps([RENDER_VERSION, graph], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def render_png(graph, title="Social Network Diagram"):
+    """
+    Draws a diagram_graph as a PNG. Uses a standalone Agg Figure rather than pyplot, so no
+    global figure state is shared and the figure is released as soon as it is saved.
+    """
+    G = nx.Graph()
+    G.add_nodes_from((node, {"label": label, "kind": kind}) for node, label, kind in graph["nodes"])
+    G.add_edges_from(graph["edges"])
+    pos = nx.spring_layout(G, seed=LAYOUT_SEED)
+
+    fig = Figure(figsize=(10, 10))
+    FigureCanvasAgg(fig)
+    try:
+        ax = fig.add_subplot()
+        nx.draw(
+            G, pos, ax=ax,
+            labels=nx.get_node_attributes(G, "label"),
+            with_labels=len(G) <= MAX_LABELLED_NODES,
+            node_size=500 if len(G) <= MAX_LABELLED_NODES else 60,
+            node_color=[NODE_COLORS.get(kind, "lightgray") for _, kind in G.nodes(data="kind")],
+            font_size=10,
+        )
+        ax.set_title(title)
+        output = io.BytesIO()
+        fig.savefig(output, format="png")
+        return output.getvalue()
+    finally:
+        fig.clear()
+
+
+class DiagramRenderer:
+    """Renders diagrams in a pool of worker processes, off the request thread.
+
+    Finished PNGs are cached by graph digest in memory and as <directory>/<digest>.png.
+    Since the digest covers the graph's content, a cached image is never stale. submit()
+    returns at once with either the cached image or the digest to poll with status().
+    """
+
+    def __init__(self, directory=DEFAULT_DIAGRAM_CACHE_DIR, processes=RENDER_PROCESSES, maxsize=256):
+        self.directory = directory
+        self.processes = processes
+        self.memory = ResultCache(maxsize=maxsize, ttl=3600.0)
+        self.failures = ResultCache(maxsize=maxsize, ttl=300.0)
+        self._jobs = {}
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _path(self, digest):
+        return os.path.join(self.directory, f"{digest}.png")
+
+    def cached(self, digest):
+        """Returns the PNG for a digest from memory or disk, or None."""
+        png = self.memory.get(digest)
+        if png is None:
+            try:
+                with open(self._path(digest), "rb") as f:
+                    png = f.read()
+            except FileNotFoundError:
+                return None
+            self.memory.put(digest, png)
+        return png
+
+    def submit(self, graph):
+        """Returns (digest, PNG) when the graph is cached, otherwise queues it and returns (digest, None)."""
+        digest = graph_digest(graph)
+        png = self.cached(digest)
+        if png is not None:
+            return digest, png
+        with self._lock:
+            if digest not in self._jobs:
+                if self._pool is None:
+                    # Spawned workers do not inherit the web server's threads or open connections
+                    self._pool = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context("spawn"))
+                future = self._pool.submit(render_png, graph)
+                self._jobs[digest] = future
+                future.add_done_callback(partial(self._finish, digest))
+        return digest, None
+
+    def _finish(self, digest, future):
+        try:
+            png = future.result()
+            os.makedirs(self.directory, exist_ok=True)
+            partial_path = f"{self._path(digest)}.{os.getpid()}.tmp"
+            with open(partial_path, "wb") as f:
+                f.write(png)
+            os.replace(partial_path, self._path(digest))
+            self.memory.put(digest, png)
+        except Exception as e:
+            self.failures.put(digest, str(e))
+        finally:
+            # Stored before the job is dropped, so a poll never finds neither
+            with self._lock:
+                self._jobs.pop(digest, None)
+
+    def status(self, digest):
+        """One of ("pending", None), ("done", PNG), ("failed", message) or ("unknown", None)."""
+        if len(digest) != DIGEST_PATTERN_LENGTH or any(c not in "0123456789abcdef" for c in digest):
+            return "unknown", None
+        with self._lock:
+            if digest in self._jobs:
+                return "pending", None
+        png = self.cached(digest)
+        if png is not None:
+            return "done", png
+        message = self.failures.get(digest)
+        if message is not None:
+            return "failed", message
+        return "unknown", None
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
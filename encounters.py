@@ -0,0 +1,349 @@
+# install required libraries - numpy pandas sqlalchemy
+
+import itertools
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from position_store import get_engine, read_positions, timestamp_param
+from query_interface import EARTH_RADIUS_KM, haversine_km
+
+# Two vessels are in contact when within this distance ...
+ENCOUNTER_DISTANCE_KM = 0.5
+# ... for at least this long
+ENCOUNTER_MIN_MINUTES = 120
+# Tracks are sampled into fixed time buckets; each vessel keeps its last ping per bucket
+BUCKET_MINUTES = 10
+# Up to this many buckets without a shared sample do not end an encounter (AIS drop-outs)
+MAX_MISSING_BUCKETS = 2
+# Positions are processed in windows of this length
+WINDOW = pd.Timedelta(days=1)
+# Encounters still open at the end of a window are carried into the next for at most this long
+MAX_CARRY = pd.Timedelta(days=2)
+
+EDGE_COLUMNS = [
+    "vessel_a", "vessel_b", "vessel_a_name", "vessel_b_name", "start_time", "end_time",
+    "duration_minutes", "min_distance_km", "latitude", "longitude",
+]
+
+# Portable DDL (PostgreSQL and SQLite) for the edges read by the network views
+ENCOUNTER_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS vessel_encounters (
+        vessel_a TEXT NOT NULL,
+        vessel_b TEXT NOT NULL,
+        vessel_a_name TEXT,
+        vessel_b_name TEXT,
+        start_time TIMESTAMP NOT NULL,
+        end_time TIMESTAMP NOT NULL,
+        duration_minutes FLOAT NOT NULL,
+        min_distance_km FLOAT NOT NULL,
+        latitude FLOAT NOT NULL,
+        longitude FLOAT NOT NULL,
+        PRIMARY KEY (vessel_a, vessel_b, start_time)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_vessel_encounters_start ON vessel_encounters (start_time)",
+    "CREATE INDEX IF NOT EXISTS idx_vessel_encounters_vessel_b ON vessel_encounters (vessel_b)",
+    # processed_until: positions before it are done; resume_from: start of the earliest open encounter
+    """
+    CREATE TABLE IF NOT EXISTS encounter_watermarks (
+        source TEXT PRIMARY KEY,
+        processed_until TIMESTAMP NOT NULL,
+        resume_from TIMESTAMP NOT NULL
+    )
+    """,
+]
+
+UPSERT_ENCOUNTER_QUERY = """
+    INSERT INTO vessel_encounters (
+        vessel_a, vessel_b, vessel_a_name, vessel_b_name, start_time, end_time,
+        duration_minutes, min_distance_km, latitude, longitude
+    ) VALUES (
+        :vessel_a, :vessel_b, :vessel_a_name, :vessel_b_name, :start_time, :end_time,
+        :duration_minutes, :min_distance_km, :latitude, :longitude
+    )
+    ON CONFLICT (vessel_a, vessel_b, start_time) DO UPDATE SET
+        end_time = excluded.end_time,
+        duration_minutes = excluded.duration_minutes,
+        min_distance_km = excluded.min_distance_km,
+        latitude = excluded.latitude,
+        longitude = excluded.longitude
+"""
+UPSERT_WATERMARK_QUERY = """
+    INSERT INTO encounter_watermarks (source, processed_until, resume_from)
+    VALUES (:source, :processed_until, :resume_from)
+    ON CONFLICT (source) DO UPDATE SET
+        processed_until = excluded.processed_until,
+        resume_from = excluded.resume_from
+"""
+ENCOUNTERS_IN_WINDOW_QUERY = """
+    SELECT vessel_a, vessel_b, vessel_a_name, vessel_b_name, start_time, end_time,
+           duration_minutes, min_distance_km, latitude, longitude
+    FROM vessel_encounters
+    WHERE start_time >= :start AND start_time < :end
+"""
+
+
+def _sample_buckets(positions, bucket_ns):
+    """
+    One sample per (vessel, time bucket): the vessel's last ping in the bucket.
+    """
+    times = pd.to_datetime(positions["timestamp"]).to_numpy("datetime64[ns]").view("int64")
+    codes, vessels = pd.factorize(positions["vessel_id"], sort=True)
+    order = np.lexsort((times, codes))
+    codes, times = codes[order], times[order]
+    buckets = times // bucket_ns
+    last = np.ones(len(codes), dtype=bool)
+    last[:-1] = (codes[1:] != codes[:-1]) | (buckets[1:] != buckets[:-1])
+    names = positions["vessel_name"].to_numpy(object)[order] if "vessel_name" in positions else None
+    samples = pd.DataFrame({
+        "vessel": codes[last],
+        "bucket": buckets[last],
+        "lat": positions["latitude"].to_numpy(float)[order][last],
+        "lon": positions["longitude"].to_numpy(float)[order][last],
+    })
+    return samples, np.asarray(vessels), names[last] if names is not None else None
+
+
+def _sphere_cells(lat, lon, cell_size):
+    """
+    Integer cell of each point on a 3-D grid over the unit sphere. Chord and great-circle
+    distances agree at encounter scale, so points within the distance are in the same or
+    an adjacent cell, with no special cases at the poles or the antimeridian.
+    """
+    lat, lon = np.radians(lat), np.radians(lon)
+    xyz = np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+    return np.floor(xyz / cell_size).astype(np.int64)
+
+
+# Half of the 26 neighbouring cells, so each unordered pair of cells is joined once
+NEIGHBOUR_OFFSETS = [
+    offset for offset in itertools.product((-1, 0, 1), repeat=3) if offset > (0, 0, 0)
+]
+
+
+def candidate_pairs(samples, distance_km):
+    """
+    All (sample, sample) pairs of different vessels in the same time bucket and within
+    distance_km, found by joining each grid cell with itself and its neighbours.
+    """
+    cell_size = 2 * np.sin(distance_km / EARTH_RADIUS_KM / 2)
+    cells = _sphere_cells(samples["lat"].to_numpy(), samples["lon"].to_numpy(), cell_size)
+    keyed = pd.DataFrame({
+        "row": np.arange(len(samples)), "bucket": samples["bucket"].to_numpy(),
+        "cx": cells[:, 0], "cy": cells[:, 1], "cz": cells[:, 2],
+    })
+    keys = ["bucket", "cx", "cy", "cz"]
+    pairs = [keyed.merge(keyed, on=keys, suffixes=("_a", "_b"))[["row_a", "row_b"]]]
+    for dx, dy, dz in NEIGHBOUR_OFFSETS:
+        shifted = keyed.assign(cx=keyed["cx"] + dx, cy=keyed["cy"] + dy, cz=keyed["cz"] + dz)
+        pairs.append(keyed.merge(shifted, on=keys, suffixes=("_a", "_b"))[["row_a", "row_b"]])
+    pairs = pd.concat(pairs, ignore_index=True)
+    row_a, row_b = pairs["row_a"].to_numpy(), pairs["row_b"].to_numpy()
+
+    vessel = samples["vessel"].to_numpy()
+    different = vessel[row_a] != vessel[row_b]
+    row_a, row_b = row_a[different], row_b[different]
+    # Order each pair by vessel so every contact of two vessels lands on the same key
+    swap = vessel[row_a] > vessel[row_b]
+    row_a, row_b = np.where(swap, row_b, row_a), np.where(swap, row_a, row_b)
+
+    lat, lon = samples["lat"].to_numpy(), samples["lon"].to_numpy()
+    distance = haversine_km(lat[row_a], lon[row_a], lat[row_b], lon[row_b])
+    close = distance <= distance_km
+    return pd.DataFrame({
+        "vessel_a": vessel[row_a[close]],
+        "vessel_b": vessel[row_b[close]],
+        "bucket": samples["bucket"].to_numpy()[row_a[close]],
+        "distance": distance[close],
+        "lat": lat[row_a[close]],
+        "lon": lon[row_a[close]],
+    }).drop_duplicates(["vessel_a", "vessel_b", "bucket"])
+
+
+def _contact_runs(contacts, max_missing):
+    """
+    Collapse per-bucket contacts into runs of nearly consecutive buckets per vessel pair.
+    """
+    contacts = contacts.sort_values(["vessel_a", "vessel_b", "bucket"], ignore_index=True)
+    a, b, bucket = (contacts[column].to_numpy() for column in ("vessel_a", "vessel_b", "bucket"))
+    new_run = np.ones(len(contacts), dtype=bool)
+    new_run[1:] = (a[1:] != a[:-1]) | (b[1:] != b[:-1]) | (bucket[1:] - bucket[:-1] > max_missing + 1)
+    contacts["run"] = np.cumsum(new_run)
+    # Closest approach position per run
+    closest = contacts.loc[contacts.groupby("run")["distance"].idxmin(), ["run", "lat", "lon"]]
+    runs = contacts.groupby("run").agg(
+        vessel_a=("vessel_a", "first"), vessel_b=("vessel_b", "first"),
+        first_bucket=("bucket", "min"), last_bucket=("bucket", "max"),
+        min_distance_km=("distance", "min"),
+    )
+    return runs.join(closest.set_index("run"))
+
+
+def _last_bucket_before(moment, bucket_ns, default=None):
+    """
+    Index of the last time bucket starting before moment (default if moment is None).
+    """
+    if moment is None:
+        return default
+    return (pd.Timestamp(moment).value - 1) // bucket_ns
+
+
+def find_encounters(positions, distance_km=ENCOUNTER_DISTANCE_KM, min_minutes=ENCOUNTER_MIN_MINUTES,
+                    bucket_minutes=BUCKET_MINUTES, max_missing=MAX_MISSING_BUCKETS, since=None, until=None):
+    """
+    Encounters in a positions frame: vessel pairs within distance_km of each other for
+    at least min_minutes. Returns (encounters with EDGE_COLUMNS, runs still open at the
+    end of the frame, as the same columns).
+
+    until is the exclusive end of the window the frame was read for (default: just after
+    its last bucket); runs within max_missing buckets of it may still continue. Runs that
+    were already final for a window ending at since are left out, so a re-read overlap
+    does not record them, or a clipped copy of them, twice.
+    """
+    empty = pd.DataFrame(columns=EDGE_COLUMNS)
+    if positions.empty:
+        return empty, empty
+    bucket_ns = bucket_minutes * 60 * 10 ** 9
+    samples, vessels, names = _sample_buckets(positions, bucket_ns)
+    contacts = candidate_pairs(samples, distance_km)
+    if contacts.empty:
+        return empty, empty
+    runs = _contact_runs(contacts, max_missing)
+
+    names_by_code = {}
+    if names is not None:
+        names_by_code = dict(zip(samples["vessel"].to_numpy(), names))
+    duration = (runs["last_bucket"] - runs["first_bucket"] + 1) * bucket_minutes
+    edges = pd.DataFrame({
+        "vessel_a": vessels[runs["vessel_a"].to_numpy()],
+        "vessel_b": vessels[runs["vessel_b"].to_numpy()],
+        "vessel_a_name": runs["vessel_a"].map(names_by_code).to_numpy(),
+        "vessel_b_name": runs["vessel_b"].map(names_by_code).to_numpy(),
+        "start_time": pd.to_datetime(runs["first_bucket"].to_numpy() * bucket_ns),
+        "end_time": pd.to_datetime((runs["last_bucket"].to_numpy() + 1) * bucket_ns),
+        "duration_minutes": duration.to_numpy(float),
+        "min_distance_km": runs["min_distance_km"].to_numpy(),
+        "latitude": runs["lat"].to_numpy(),
+        "longitude": runs["lon"].to_numpy(),
+    })
+    # A run that may still continue past the window cannot be finalized yet
+    last_bucket = runs["last_bucket"].to_numpy()
+    open_runs = last_bucket >= _last_bucket_before(until, bucket_ns, samples["bucket"].max()) - max_missing
+    long_enough = edges["duration_minutes"].to_numpy() >= min_minutes
+    if since is not None:
+        long_enough &= last_bucket >= _last_bucket_before(since, bucket_ns) - max_missing
+    return edges[long_enough & ~open_runs].reset_index(drop=True), edges[open_runs].reset_index(drop=True)
+
+
+def ensure_encounter_schema(engine):
+    with engine.begin() as conn:
+        for statement in ENCOUNTER_SCHEMA:
+            conn.execute(text(statement))
+
+
+def get_watermark(engine, source):
+    with engine.connect() as conn:
+        row = conn.execute(
+            text("SELECT processed_until, resume_from FROM encounter_watermarks WHERE source = :source"),
+            {"source": source}
+        ).fetchone()
+    return (pd.Timestamp(row[0]), pd.Timestamp(row[1])) if row else (None, None)
+
+
+def write_encounters(engine, edges):
+    rows = [
+        {**row, "start_time": timestamp_param(engine, row["start_time"]),
+         "end_time": timestamp_param(engine, row["end_time"])}
+        for row in edges.astype(object).where(edges.notna(), None).to_dict("records")
+    ]
+    if rows:
+        with engine.begin() as conn:
+            conn.execute(text(UPSERT_ENCOUNTER_QUERY), rows)
+    return len(rows)
+
+
+def detect_encounters(db_url, start=None, end=None, window=WINDOW, table_name="vessel_positions",
+                      **options):
+    """
+    Incrementally detect encounters in vessel_positions and upsert them into vessel_encounters.
+
+    Positions are processed one window at a time from the watermark (or start) up to end.
+    Encounters still in progress at the end of a window are not written; the next window
+    re-reads positions from where the earliest of them began (at most MAX_CARRY back), so
+    an encounter crossing windows is recorded once, whole; encounters that ended inside
+    the re-read overlap were final in the previous window and are skipped. Re-running a
+    window rewrites the same rows. Returns the number of encounter rows written.
+    """
+    engine = get_engine(db_url)
+    ensure_encounter_schema(engine)
+    processed_until, resume_from = get_watermark(engine, table_name)
+    if processed_until is None:
+        if start is None:
+            raise ValueError("No encounter watermark yet; pass start for the first run")
+        processed_until = resume_from = pd.Timestamp(start)
+    end = pd.Timestamp(end) if end is not None else pd.Timestamp.now(tz="UTC").tz_localize(None)
+
+    written = 0
+    started = time.perf_counter()
+    while processed_until < end:
+        window_end = min(processed_until + window, end)
+        read_from = max(resume_from, window_end - MAX_CARRY)
+        positions = read_positions(engine, read_from, window_end, table_name=table_name)
+        edges, open_runs = find_encounters(positions, since=processed_until, until=window_end, **options)
+        written += write_encounters(engine, edges)
+        resume_from = open_runs["start_time"].min() if not open_runs.empty else window_end
+        processed_until = window_end
+        with engine.begin() as conn:
+            conn.execute(text(UPSERT_WATERMARK_QUERY), {
+                "source": table_name,
+                "processed_until": timestamp_param(engine, processed_until),
+                "resume_from": timestamp_param(engine, resume_from),
+            })
+        print(f"Encounters up to {window_end}: {len(positions)} positions, {len(edges)} encounters")
+    elapsed = time.perf_counter() - started
+    print(f"Wrote {written} encounters in {elapsed:.2f}s.")
+    return written
+
+
+def read_encounters(db_url, start, end, min_minutes=None):
+    """
+    Encounter edges starting in [start, end), optionally only those lasting min_minutes.
+    """
+    engine = get_engine(db_url)
+    ensure_encounter_schema(engine)
+    with engine.connect() as conn:
+        edges = pd.read_sql_query(
+            text(ENCOUNTERS_IN_WINDOW_QUERY), conn,
+            params={"start": timestamp_param(engine, start), "end": timestamp_param(engine, end)},
+            parse_dates=["start_time", "end_time"]
+        )
+    if min_minutes is not None:
+        edges = edges[edges["duration_minutes"] >= min_minutes]
+    return edges
+
+
+def encounter_adjacency(edges, label="name"):
+    """
+    Symmetric adjacency matrix (number of encounters per vessel pair) from encounter edges,
+    labelled by vessel name (falling back to id) or, with label="id", by vessel id.
+    """
+    if label == "name":
+        a = edges["vessel_a_name"].fillna(edges["vessel_a"])
+        b = edges["vessel_b_name"].fillna(edges["vessel_b"])
+    else:
+        a, b = edges["vessel_a"], edges["vessel_b"]
+    both = pd.concat([pd.DataFrame({"a": a, "b": b}), pd.DataFrame({"a": b, "b": a})], ignore_index=True)
+    return pd.crosstab(both["a"], both["b"]).rename_axis(index=None, columns=None)
+
+
+# Usage: python encounters.py <database url> [first run start date]
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python encounters.py <database url> [start date for the first run]")
+        sys.exit(1)
+    detect_encounters(sys.argv[1], start=sys.argv[2] if len(sys.argv) == 3 else None)
@@ -0,0 +1,298 @@
+# install packages - pip install requests
+
+import hashlib
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+
+DEFAULT_CACHE_DIR = ".http_cache"
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3  # 2 GB
+DEFAULT_TTL = 24 * 3600  # seconds a response is reused without revalidation
+# Seconds an unreferenced body is kept on disk, so readers holding its entry can still open it
+DEFAULT_DROP_GRACE = 3600
+
+MAX_AGE_PATTERN = re.compile(r"max-age=(\d+)")
+
+
+def cache_directives(headers):
+    """
+    Cache-Control directive names of a response, lowercased and without their arguments.
+    """
+    return {
+        directive.split("=", 1)[0].strip().lower()
+        for directive in headers.get("Cache-Control", "").split(",")
+    }
+
+
+class CacheEntry:
+    """
+    A cached response: where its body lives and the validators needed to revalidate it.
+    """
+
+    def __init__(self, url, digest, path, etag, last_modified, expires_at):
+        self.url = url
+        self.digest = digest
+        self.path = path
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires_at = expires_at
+
+    @property
+    def fresh(self):
+        return time.time() < self.expires_at
+
+    def conditional_headers(self):
+        """
+        Headers that turn a GET into a revalidation request.
+        """
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def read(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+
+class ResponseCache:
+    """
+    Content-addressed on-disk cache of HTTP response bodies.
+
+    Bodies are stored once per SHA-256 digest under objects/; a small SQLite index maps
+    each URL to its body and validators. Entries are reused without a request until their
+    TTL expires, then revalidated with ETag / Last-Modified; Cache-Control no-cache makes
+    an entry stale at once, and no-store bodies are handed back without being indexed. When
+    the stored bodies exceed max_bytes, the least recently used URLs are evicted.
+
+    Bodies no longer referenced are queued in `dropped` and only deleted drop_grace seconds
+    later, since a reader may have looked up an entry and not yet opened its file.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, default_ttl=DEFAULT_TTL,
+                 drop_grace=DEFAULT_DROP_GRACE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.drop_grace = drop_grace
+        os.makedirs(os.path.join(directory, "objects"), exist_ok=True)
+        self._lock = threading.Lock()
+        self._index = sqlite3.connect(os.path.join(directory, "index.db"), check_same_thread=False)
+        self._index.executescript('''
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS objects (
+                digest TEXT PRIMARY KEY,
+                size INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS entries (
+                url TEXT PRIMARY KEY,
+                digest TEXT NOT NULL REFERENCES objects(digest),
+                etag TEXT,
+                last_modified TEXT,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS dropped (
+                digest TEXT PRIMARY KEY REFERENCES objects(digest),
+                dropped_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries(last_access);
+            CREATE INDEX IF NOT EXISTS idx_entries_digest ON entries(digest);
+            CREATE INDEX IF NOT EXISTS idx_dropped_dropped_at ON dropped(dropped_at);
+        ''')
+
+    def _object_path(self, digest):
+        return os.path.join(self.directory, "objects", digest[:2], digest[2:])
+
+    def _expires_at(self, headers):
+        if cache_directives(headers) & {"no-cache", "no-store"}:
+            return time.time()
+        match = MAX_AGE_PATTERN.search(headers.get("Cache-Control", ""))
+        if match:
+            return time.time() + int(match.group(1))
+        expires = headers.get("Expires")
+        if expires:
+            try:
+                return parsedate_to_datetime(expires).timestamp()
+            except (TypeError, ValueError):
+                pass
+        return time.time() + self.default_ttl
+
+    def lookup(self, url):
+        """
+        Return the CacheEntry for url (fresh or stale), or None if it is not cached.
+        """
+        with self._lock:
+            row = self._index.execute(
+                "SELECT digest, etag, last_modified, expires_at FROM entries WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            digest, etag, last_modified, expires_at = row
+            path = self._object_path(digest)
+            if not os.path.exists(path):
+                self._index.execute("DELETE FROM entries WHERE url = ?", (url,))
+                self._index.commit()
+                return None
+            self._index.execute("UPDATE entries SET last_access = ? WHERE url = ?", (time.time(), url))
+            self._index.commit()
+        return CacheEntry(url, digest, path, etag, last_modified, expires_at)
+
+    def revalidated(self, url, headers):
+        """
+        Record a 304 Not Modified: keep the body, refresh validators and expiry.
+        """
+        with self._lock:
+            self._index.execute('''
+                UPDATE entries SET
+                    etag = COALESCE(?, etag),
+                    last_modified = COALESCE(?, last_modified),
+                    expires_at = ?, last_access = ?
+                WHERE url = ?
+            ''', (headers.get("ETag"), headers.get("Last-Modified"),
+                  self._expires_at(headers), time.time(), url))
+            self._index.commit()
+        return self.lookup(url)
+
+    def store_stream(self, url, chunks, headers):
+        """
+        Write a response body from an iterable of byte chunks, hashing it on the way to disk.
+        A no-store body is written the same way so the caller can read it, but it is not
+        indexed for url (which loses any earlier entry) and is deleted after drop_grace.
+        """
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            digest = digest.hexdigest()
+            path = self._object_path(digest)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        no_store = "no-store" in cache_directives(headers)
+        with self._lock:
+            previous = self._index.execute("SELECT digest FROM entries WHERE url = ?", (url,)).fetchone()
+            self._index.execute("INSERT OR IGNORE INTO objects (digest, size) VALUES (?, ?)", (digest, size))
+            self._index.execute("DELETE FROM dropped WHERE digest = ?", (digest,))
+            if no_store:
+                self._index.execute("DELETE FROM entries WHERE url = ?", (url,))
+                self._drop_unreferenced(digest)
+                if previous and previous[0] != digest:
+                    self._drop_unreferenced(previous[0])
+                self._purge_dropped()
+                self._index.commit()
+                return CacheEntry(url, digest, path, None, None, 0.0)
+            self._index.execute('''
+                INSERT INTO entries (url, digest, etag, last_modified, expires_at, last_access)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    digest = excluded.digest, etag = excluded.etag,
+                    last_modified = excluded.last_modified,
+                    expires_at = excluded.expires_at, last_access = excluded.last_access
+            ''', (url, digest, headers.get("ETag"), headers.get("Last-Modified"),
+                  self._expires_at(headers), time.time()))
+            if previous and previous[0] != digest:
+                self._drop_unreferenced(previous[0])
+            self._evict(keep_url=url)
+            self._purge_dropped()
+            self._index.commit()
+        return CacheEntry(url, digest, path, headers.get("ETag"), headers.get("Last-Modified"),
+                          self._expires_at(headers))
+
+    def store(self, url, body, headers):
+        return self.store_stream(url, [body], headers)
+
+    def _drop_unreferenced(self, digest):
+        if self._index.execute("SELECT 1 FROM entries WHERE digest = ? LIMIT 1", (digest,)).fetchone():
+            return
+        self._index.execute(
+            "INSERT OR IGNORE INTO dropped (digest, dropped_at) VALUES (?, ?)", (digest, time.time())
+        )
+
+    def _purge_dropped(self):
+        """
+        Delete the bodies dropped more than drop_grace seconds ago and still unreferenced.
+        """
+        expired = self._index.execute(
+            "SELECT digest FROM dropped WHERE dropped_at <= ?", (time.time() - self.drop_grace,)
+        ).fetchall()
+        for digest, in expired:
+            self._index.execute("DELETE FROM dropped WHERE digest = ?", (digest,))
+            if self._index.execute("SELECT 1 FROM entries WHERE digest = ? LIMIT 1", (digest,)).fetchone():
+                continue
+            self._index.execute("DELETE FROM objects WHERE digest = ?", (digest,))
+            path = self._object_path(digest)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _live_bytes(self):
+        return self._index.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM objects WHERE digest NOT IN (SELECT digest FROM dropped)"
+        ).fetchone()[0]
+
+    def _evict(self, keep_url=None):
+        total = self._live_bytes()
+        while total > self.max_bytes:
+            row = self._index.execute(
+                "SELECT url, digest FROM entries WHERE url IS NOT ? ORDER BY last_access LIMIT 1",
+                (keep_url,)
+            ).fetchone()
+            if row is None:
+                break
+            url, digest = row
+            self._index.execute("DELETE FROM entries WHERE url = ?", (url,))
+            self._drop_unreferenced(digest)
+            total = self._live_bytes()
+
+    def stats(self):
+        with self._lock:
+            entries, = self._index.execute("SELECT COUNT(*) FROM entries").fetchone()
+            objects, size = self._index.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM objects"
+            ).fetchone()
+        return {"entries": entries, "objects": objects, "bytes": size}
+
+    def close(self):
+        self._index.close()
+
+
+def cached_get(url, cache, session=None, timeout=60, chunk_size=1 << 20, conditional=True):
+    """
+    Synchronous GET through the cache. Fresh entries are served from disk, stale ones
+    are revalidated (unless `conditional` is False), and new bodies are streamed to disk.
+    Returns (status, CacheEntry); the entry is None for responses that are neither 200 nor 304.
+    """
+    entry = cache.lookup(url) if conditional else None
+    if entry is not None and entry.fresh:
+        return 200, entry
+
+    session = session or requests
+    headers = entry.conditional_headers() if entry is not None else {}
+    with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+        if response.status_code == 304 and entry is not None:
+            refreshed = cache.revalidated(url, response.headers)
+            if refreshed is not None:
+                return 200, refreshed
+        elif response.status_code != 200:
+            return response.status_code, None
+        else:
+            return 200, cache.store_stream(url, response.iter_content(chunk_size), response.headers)
+    # Evicted between the lookup and the 304: fetch the body again
+    return cached_get(url, cache, session, timeout, chunk_size, conditional=False)
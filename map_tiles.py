@@ -0,0 +1,262 @@
+# install required libraries - numpy matplotlib sqlalchemy
+
+import hashlib
+import io
+import math
+import os
+import shutil
+import sqlite3
+import threading
+
+import matplotlib
+import numpy as np
+from matplotlib.colors import LogNorm, Normalize
+from matplotlib.image import imsave
+from sqlalchemy import text
+
+from result_cache import ResultCache
+
+# Standard XYZ (Web Mercator) raster tiles, as used by Leaflet, MapLibre and plotly maps
+TILE_SIZE = 256
+MAX_ZOOM = 16
+MAX_MERCATOR_LAT = 85.0511287798
+# Vessels are binned into square cells of this many pixels, so single vessels stay visible
+CELL_PIXELS = 4
+TILE_CELLS = TILE_SIZE // CELL_PIXELS
+
+DEFAULT_TILE_CACHE_DIR = "tile_cache"
+LAYERS = ("density", "risk")
+
+# Colour scales: density is logarithmic up to this many vessels per cell, risk is the score in [0, 1]
+DENSITY_SATURATION = 100
+DENSITY_COLORMAP = matplotlib.colormaps["viridis"].with_extremes(bad=(0, 0, 0, 0))
+RISK_COLORMAP = matplotlib.colormaps["YlOrRd"].with_extremes(bad=(0, 0, 0, 0))
+
+# Density reads only the vessels R*Tree, counting vessels per tile cell in SQL: the Web
+# Mercator cell (see tile_cells) of each point is computed with SQLite's math functions
+# (3.35+, unless compiled out), so a tile costs one row per occupied cell, not per vessel
+TILE_CELLS_QUERY = """
+    SELECT CAST(floor(((1.0 - ln(tan(phi) + 1.0 / cos(phi)) / pi()) / 2.0 * ? - ?) * ?) AS INTEGER) AS cell_row,
+           CAST(floor(((lon + 180.0) / 360.0 * ? - ?) * ?) AS INTEGER) AS cell_col,
+           COUNT(*)
+    FROM (
+        SELECT radians(max(min(min_lat, ?), ?)) AS phi, min_lon AS lon FROM vessel_rtree
+        WHERE max_lat >= ? AND min_lat <= ? AND max_lon >= ? AND min_lon <= ?
+    )
+    GROUP BY cell_row, cell_col
+"""
+# Fallback for SQLite builds without math functions: the points, binned in Python
+TILE_POINTS_QUERY = """
+    SELECT min_lat, min_lon FROM vessel_rtree
+    WHERE max_lat >= ? AND min_lat <= ? AND max_lon >= ? AND min_lon <= ?
+"""
+# Risk places each scored vessel at the ping it was last scored on (a primary key lookup)
+RISK_POSITIONS_QUERY = """
+    SELECT s.risk_score, p.latitude, p.longitude
+    FROM vessel_risk_scores s
+    JOIN {table} p ON p.vessel_id = s.vessel_id AND p.timestamp = s.last_ping
+"""
+RISK_VERSION_QUERY = "SELECT MAX(scored_at) FROM scoring_watermarks"
+
+
+def valid_tile(z, x, y):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def _tile_edge_lat(row, n):
+    return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+
+def tile_bounds(z, x, y):
+    """
+    (min_lat, min_lon, max_lat, max_lon) covered by an XYZ tile.
+    """
+    n = 2 ** z
+    return _tile_edge_lat(y + 1, n), x / n * 360.0 - 180.0, _tile_edge_lat(y, n), (x + 1) / n * 360.0 - 180.0
+
+
+def tile_cells(lats, lons, z, x, y):
+    """
+    Flat cell index within the tile for each point, or -1 for points outside it.
+    """
+    n = 2 ** z
+    lats = np.clip(np.asarray(lats, float), -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT)
+    phi = np.radians(lats)
+    column = ((np.asarray(lons, float) + 180.0) / 360.0 * n - x) * TILE_CELLS
+    row = ((1.0 - np.log(np.tan(phi) + 1.0 / np.cos(phi)) / math.pi) / 2.0 * n - y) * TILE_CELLS
+    column, row = np.floor(column).astype(np.int64), np.floor(row).astype(np.int64)
+    inside = (column >= 0) & (column < TILE_CELLS) & (row >= 0) & (row < TILE_CELLS)
+    return np.where(inside, row * TILE_CELLS + column, -1)
+
+
+def render_png(grid, colormap, norm):
+    """
+    Colour a TILE_CELLS x TILE_CELLS grid (NaN = transparent) and encode it as a TILE_SIZE PNG.
+    """
+    rgba = colormap(norm(np.ma.masked_invalid(grid)), bytes=True)
+    rgba = rgba.repeat(CELL_PIXELS, axis=0).repeat(CELL_PIXELS, axis=1)
+    buffer = io.BytesIO()
+    imsave(buffer, rgba, format="png")
+    return buffer.getvalue()
+
+
+def density_counts(conn, z, x, y):
+    """
+    Vessel count per tile cell (flat, TILE_CELLS ** 2) from the vessels R*Tree of a SQLite connection.
+    """
+    min_lat, min_lon, max_lat, max_lon = tile_bounds(z, x, y)
+    box = (min_lat, max_lat, min_lon, max_lon)
+    n = 2 ** z
+    try:
+        rows = conn.execute(TILE_CELLS_QUERY, (
+            n, y, TILE_CELLS, n, x, TILE_CELLS, MAX_MERCATOR_LAT, -MAX_MERCATOR_LAT, *box
+        )).fetchall()
+    except sqlite3.OperationalError as error:
+        if "no such function" not in str(error):
+            raise
+        points = np.array(conn.execute(TILE_POINTS_QUERY, box).fetchall(), dtype=float).reshape(-1, 2)
+        cells = tile_cells(points[:, 0], points[:, 1], z, x, y)
+        return np.bincount(cells[cells >= 0], minlength=TILE_CELLS ** 2)
+    counts = np.zeros(TILE_CELLS ** 2, dtype=np.int64)
+    # The R*Tree rounds boxes outward, so a few points may fall just outside the tile
+    for row, column, count in rows:
+        if 0 <= row < TILE_CELLS and 0 <= column < TILE_CELLS:
+            counts[row * TILE_CELLS + column] += count
+    return counts
+
+
+def render_density_tile(conn, z, x, y):
+    """
+    PNG of vessel counts per cell, from the vessels R*Tree of a SQLite connection.
+    """
+    counts = density_counts(conn, z, x, y).astype(float)
+    counts[counts == 0] = np.nan
+    return render_png(counts.reshape(TILE_CELLS, TILE_CELLS), DENSITY_COLORMAP,
+                      LogNorm(vmin=1, vmax=DENSITY_SATURATION, clip=True))
+
+
+def load_risk_points(engine, table_name="vessel_positions"):
+    """
+    (scores, lats, lons) arrays for every scored vessel, from the positions database.
+    """
+    with engine.connect() as conn:
+        rows = conn.execute(text(RISK_POSITIONS_QUERY.format(table=table_name))).fetchall()
+    points = np.array(rows, dtype=float).reshape(-1, 3)
+    return points[:, 0], points[:, 1], points[:, 2]
+
+
+def risk_version(engine):
+    """
+    Token that changes whenever risk_scoring.py finishes a run.
+    """
+    with engine.connect() as conn:
+        return conn.execute(text(RISK_VERSION_QUERY)).scalar()
+
+
+def render_risk_tile(risk_points, z, x, y):
+    """
+    PNG of the highest risk score per cell, from load_risk_points arrays.
+    """
+    scores, lats, lons = risk_points
+    cells = tile_cells(lats, lons, z, x, y)
+    inside = cells >= 0
+    highest = np.full(TILE_CELLS ** 2, -1.0)
+    np.maximum.at(highest, cells[inside], scores[inside])
+    highest[highest < 0] = np.nan
+    return render_png(highest.reshape(TILE_CELLS, TILE_CELLS), RISK_COLORMAP, Normalize(0.0, 1.0, clip=True))
+
+
+class TileCache:
+    """Rendered tiles of one layer, in memory and on disk, for one data version at a time.
+
+    Memory entries sit in a ResultCache keyed by (version, z, x, y), so a render that finishes
+    after a newer version arrived is never served as current; files live under
+    <directory>/<version digest>/z/x/y.png, so every process serving the app shares them. A new
+    version clears the memory entries and starts a fresh directory. Versions are the layers' load/scoring timestamps, so they sort in
+    time order: each directory has a <digest>.version marker recording its version, and only the
+    directories of older versions are removed, never one that a process ahead of this one is
+    already filling.
+    """
+
+    def __init__(self, directory, maxsize=4096, ttl=3600.0):
+        self.directory = directory
+        self.memory = ResultCache(maxsize=maxsize, ttl=ttl)
+        self._version_dir = None
+        self._lock = threading.Lock()
+        self.renders = 0
+        self.disk_hits = 0
+
+    @staticmethod
+    def _version_key(version):
+        # No data yet (None) sorts before every real version
+        return "" if version is None else str(version)
+
+    def _use_version(self, version):
+        digest = hashlib.sha256(str(version).encode()).hexdigest()[:16]
+        version_dir = os.path.join(self.directory, digest)
+        with self._lock:
+            if version_dir == self._version_dir:
+                return version_dir
+            self._version_dir = version_dir
+        self.memory.invalidate_if_changed(version)
+        current = self._version_key(version)
+        os.makedirs(self.directory, exist_ok=True)
+        marker = os.path.join(self.directory, f"{digest}.version")
+        partial = f"{marker}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(partial, "w") as f:
+            f.write(current)
+        os.replace(partial, marker)
+        self._remove_older(current)
+        return version_dir
+
+    def _remove_older(self, current):
+        """Removes the directories of versions older than current, as recorded by their markers."""
+        for name in os.listdir(self.directory):
+            if not name.endswith(".version"):
+                continue
+            marker = os.path.join(self.directory, name)
+            try:
+                with open(marker) as f:
+                    recorded = f.read()
+            except FileNotFoundError:
+                continue
+            if recorded < current:
+                shutil.rmtree(os.path.join(self.directory, name[:-len(".version")]), ignore_errors=True)
+                try:
+                    os.remove(marker)
+                except FileNotFoundError:
+                    pass
+
+    def get(self, version, z, x, y, render):
+        """Returns the PNG for a tile, calling render() only when neither cache holds it."""
+        version_dir = self._use_version(version)
+        key = (version, z, x, y)
+        png = self.memory.get(key)
+        if png is not None:
+            return png
+
+        path = os.path.join(version_dir, str(z), str(x), f"{y}.png")
+        try:
+            with open(path, "rb") as f:
+                png = f.read()
+            self.disk_hits += 1
+        except FileNotFoundError:
+            png = render()
+            self.renders += 1
+            # A newer version removed this one meanwhile (its marker is gone, or goes while
+            # writing): serve the tile uncached rather than recreate the directory
+            if os.path.exists(f"{version_dir}.version"):
+                # Written under a unique name and renamed, so readers never see a partial file
+                partial = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                try:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    with open(partial, "wb") as f:
+                        f.write(png)
+                    os.replace(partial, path)
+                except FileNotFoundError:
+                    pass
+        self.memory.put(key, png)
+        return png
+
+    def stats(self):
+        return {**self.memory.stats(), "disk_hits": self.disk_hits, "renders": self.renders}
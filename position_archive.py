@@ -0,0 +1,187 @@
+# install required libraries - pandas pyarrow
+
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from pyarrow import fs
+
+DEFAULT_ARCHIVE_DIR = "position_archive"
+UNKNOWN_FLAG = "UNKNOWN"
+
+# Stored columns; repetitive strings are dictionary-encoded in memory and in the Parquet pages
+ARCHIVE_SCHEMA = pa.schema([
+    ("vessel_id", pa.dictionary(pa.int32(), pa.string())),
+    ("vessel_name", pa.dictionary(pa.int32(), pa.string())),
+    ("latitude", pa.float64()),
+    ("longitude", pa.float64()),
+    ("timestamp", pa.timestamp("us")),
+])
+
+# Directory layout: <root>/date=YYYY-MM-DD/flag=XXX/part-*.parquet
+PARTITIONING = ds.partitioning(
+    pa.schema([("date", pa.date32()), ("flag", pa.string())]), flavor="hive"
+)
+
+# Row groups carry min/max statistics, so time and bounding-box filters skip whole groups
+ROW_GROUP_SIZE = 128 * 1024
+# Rows held by an ArchiveWriter before it writes them out; each flush adds one file per
+# partition it touches, so larger buffers mean fewer, larger files
+BUFFER_ROWS = 1024 * 1024
+
+
+def _archive_table(df):
+    """
+    Convert one validated position chunk to an Arrow table with the partition columns added.
+    """
+    flags = df["flag"] if "flag" in df.columns else pd.Series(UNKNOWN_FLAG, index=df.index)
+    frame = pd.DataFrame({
+        "vessel_id": df["vessel_id"].astype(str),
+        "vessel_name": df["vessel_name"].astype("string"),
+        "latitude": df["latitude"].astype("float64"),
+        "longitude": df["longitude"].astype("float64"),
+        "timestamp": pd.to_datetime(df["timestamp"]).astype("datetime64[us]"),
+        "date": pd.to_datetime(df["timestamp"]).dt.date,
+        "flag": flags.fillna(UNKNOWN_FLAG).astype(str),
+    })
+    schema = ARCHIVE_SCHEMA.append(pa.field("date", pa.date32())).append(pa.field("flag", pa.string()))
+    return pa.Table.from_pandas(frame, schema=schema, preserve_index=False)
+
+
+def _write_table(table, root):
+    ds.write_dataset(
+        table, root, format="parquet", partitioning=PARTITIONING,
+        basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+        max_rows_per_group=ROW_GROUP_SIZE,
+        file_options=ds.ParquetFileFormat().make_write_options(compression="zstd", use_dictionary=True),
+    )
+
+
+class ArchiveWriter:
+    """
+    Buffers position chunks and appends them to the Parquet archive, partitioned by date
+    and flag, once buffer_rows have accumulated (and on flush/close). A streaming load
+    therefore writes one file per partition per buffer, not one per partition per chunk.
+    Every flush writes new files, so flushes never overwrite each other.
+    """
+
+    def __init__(self, root=DEFAULT_ARCHIVE_DIR, buffer_rows=BUFFER_ROWS):
+        self.root = root
+        self.buffer_rows = buffer_rows
+        self._tables = []
+        self._buffered = 0
+
+    def write(self, df):
+        """
+        Buffer one validated chunk; returns the number of rows accepted.
+        """
+        if df.empty:
+            return 0
+        table = _archive_table(df)
+        self._tables.append(table)
+        self._buffered += table.num_rows
+        if self._buffered >= self.buffer_rows:
+            self.flush()
+        return table.num_rows
+
+    def flush(self):
+        if not self._tables:
+            return
+        table = pa.concat_tables(self._tables).unify_dictionaries()
+        _write_table(table, self.root)
+        self._tables = []
+        self._buffered = 0
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Rows buffered before a failure are still archived; they were validated
+        self.close()
+
+
+def write_archive(df, root=DEFAULT_ARCHIVE_DIR):
+    """
+    Append one chunk of positions to the archive right away. For a stream of chunks use
+    an ArchiveWriter, which batches them into fewer files. Returns the number of rows written.
+    """
+    with ArchiveWriter(root) as writer:
+        return writer.write(df)
+
+
+def open_archive(root=DEFAULT_ARCHIVE_DIR):
+    """
+    Open the archive as a dataset over memory-mapped files.
+    """
+    return ds.dataset(
+        root, format="parquet", partitioning=PARTITIONING,
+        filesystem=fs.LocalFileSystem(use_mmap=True)
+    )
+
+
+def archive_filter(start=None, end=None, bbox=None, flags=None):
+    """
+    Build the pushdown expression for a [start, end) time range, a
+    (min_lat, min_lon, max_lat, max_lon) bounding box and a set of flags.
+    Date and flag bounds prune whole directories; the rest use row-group statistics.
+    """
+    conditions = []
+    if start is not None:
+        start = pd.Timestamp(start)
+        conditions.append(ds.field("date") >= pa.scalar(start.date(), pa.date32()))
+        conditions.append(ds.field("timestamp") >= pa.scalar(start.to_pydatetime(), pa.timestamp("us")))
+    if end is not None:
+        end = pd.Timestamp(end)
+        conditions.append(ds.field("date") <= pa.scalar(end.date(), pa.date32()))
+        conditions.append(ds.field("timestamp") < pa.scalar(end.to_pydatetime(), pa.timestamp("us")))
+    if bbox is not None:
+        min_lat, min_lon, max_lat, max_lon = bbox
+        conditions.append(ds.field("longitude") >= min_lon)
+        conditions.append(ds.field("longitude") <= max_lon)
+        conditions.append(ds.field("latitude") >= min_lat)
+        conditions.append(ds.field("latitude") <= max_lat)
+    if flags is not None:
+        conditions.append(ds.field("flag").isin(list(flags)))
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def read_archive(root=DEFAULT_ARCHIVE_DIR, columns=None, start=None, end=None, bbox=None, flags=None):
+    """
+    Scan the archive, reading only the requested columns and only the files and row
+    groups that can match the filters. Returns an Arrow table backed by the mapped files.
+    """
+    dataset = open_archive(root)
+    return dataset.to_table(columns=columns, filter=archive_filter(start, end, bbox, flags))
+
+
+def read_archive_frame(root=DEFAULT_ARCHIVE_DIR, columns=None, start=None, end=None, bbox=None, flags=None):
+    """
+    read_archive as a DataFrame. Numeric columns are handed over without copying where
+    Arrow allows it, and dictionary columns come back as pandas categoricals.
+    """
+    table = read_archive(root, columns, start, end, bbox, flags)
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def archive_summary(root=DEFAULT_ARCHIVE_DIR):
+    """
+    Row count, file count and time span of the archive.
+    """
+    dataset = open_archive(root)
+    table = dataset.to_table(columns=["timestamp"])
+    span = pc.min_max(table["timestamp"]) if table.num_rows else None
+    return {
+        "rows": table.num_rows,
+        "files": len(dataset.files),
+        "first": span["min"].as_py() if span else None,
+        "last": span["max"].as_py() if span else None,
+    }
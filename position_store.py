@@ -0,0 +1,372 @@
+# install required libraries - pandas sqlalchemy psycopg2
+
+import io
+import os
+import re
+import time
+from datetime import date, datetime, timezone
+
+import pandas as pd
+from sqlalchemy import bindparam, create_engine, inspect, text
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Database-Schema.sql")
+
+# Columns written to vessel_positions, in COPY order
+POSITION_COLUMNS = ["vessel_id", "vessel_name", "latitude", "longitude", "timestamp"]
+
+# Same table for SQLite, used as a local stand-in for PostgreSQL. loaded_at is the ingest
+# time, set on insert; PostgreSQL defaults it, SQLite gets it bound by _insert_sqlite.
+SQLITE_POSITIONS_DDL = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        vessel_id TEXT NOT NULL,
+        vessel_name TEXT,
+        latitude FLOAT NOT NULL,
+        longitude FLOAT NOT NULL,
+        timestamp TIMESTAMP NOT NULL,
+        loaded_at TIMESTAMP,
+        PRIMARY KEY (vessel_id, timestamp)
+    )
+"""
+SQLITE_LOADED_AT_INDEX = "CREATE INDEX IF NOT EXISTS idx_{table}_loaded_at ON {table} (loaded_at)"
+# Upgrade of tables created before loaded_at; their existing rows keep a NULL ingest time
+ADD_LOADED_AT_DDL = {
+    "postgresql": [
+        "ALTER TABLE {table} ADD COLUMN IF NOT EXISTS loaded_at TIMESTAMP",
+        "ALTER TABLE {table} ALTER COLUMN loaded_at SET DEFAULT (now() AT TIME ZONE 'UTC')",
+        "CREATE INDEX IF NOT EXISTS idx_{table}_loaded_at ON {table} (loaded_at)",
+    ],
+    "sqlite": [
+        "ALTER TABLE {table} ADD COLUMN loaded_at TIMESTAMP",
+        SQLITE_LOADED_AT_INDEX,
+    ],
+}
+
+# SQLite stores timestamps as text; one fixed format keeps range comparisons correct
+SQLITE_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+# Monthly partitions are named <table>_yYYYYmMM, e.g. vessel_positions_y2024m01
+PARTITION_NAME_PATTERN = re.compile(r"_y(\d{4})m(\d{2})$")
+
+# Time-window query written so the planner can prune partitions: the partition key is
+# compared directly (no functions or casts on timestamp) against a half-open range
+POSITIONS_IN_WINDOW_QUERY = """
+    SELECT vessel_id, vessel_name, latitude, longitude, timestamp
+    FROM {table}
+    WHERE timestamp >= :start AND timestamp < :end
+    ORDER BY vessel_id, timestamp
+"""
+VESSEL_POSITIONS_IN_WINDOW_QUERY = """
+    SELECT vessel_id, vessel_name, latitude, longitude, timestamp
+    FROM {table}
+    WHERE vessel_id = :vessel_id AND timestamp >= :start AND timestamp < :end
+    ORDER BY timestamp
+"""
+VESSELS_POSITIONS_IN_WINDOW_QUERY = """
+    SELECT vessel_id, vessel_name, latitude, longitude, timestamp
+    FROM {table}
+    WHERE vessel_id IN :vessel_ids AND timestamp >= :start AND timestamp < :end
+    ORDER BY vessel_id, timestamp
+"""
+# Vessels with pings after a watermark, and their latest ping; only recent partitions are read
+VESSELS_UPDATED_SINCE_QUERY = """
+    SELECT vessel_id, MAX(timestamp) AS last_ping
+    FROM {table}
+    WHERE timestamp > :since
+    GROUP BY vessel_id
+"""
+
+# Vessels with pings loaded in (since, until], whatever their ping times, and each vessel's
+# latest ping overall (late pings can be older than pings already loaded)
+VESSELS_LOADED_BETWEEN_QUERY = """
+    SELECT vessel_id, MAX(timestamp) AS last_ping
+    FROM {table}
+    WHERE vessel_id IN (
+        SELECT vessel_id FROM {table} WHERE loaded_at > :since AND loaded_at <= :until
+    )
+    GROUP BY vessel_id
+"""
+LATEST_LOAD_QUERY = "SELECT MAX(loaded_at) FROM {table}"
+
+# Maximum number of vessel ids bound into one IN (...) lookup
+VESSEL_BATCH_SIZE = 1000
+
+_engines = {}
+_known_partitions = {}
+
+
+def get_engine(db_url):
+    """
+    Return one pooled SQLAlchemy engine per database URL, reused across chunks and calls.
+    """
+    engine = _engines.get(db_url)
+    if engine is None:
+        engine = _engines[db_url] = create_engine(db_url, pool_pre_ping=True)
+    return engine
+
+
+def ensure_schema(engine, table_name="vessel_positions"):
+    """
+    Create the positions table if it does not exist yet.
+    PostgreSQL runs Database-Schema.sql; SQLite gets an equivalent stand-in table.
+    """
+    if inspect(engine).has_table(table_name):
+        _ensure_loaded_at(engine, table_name)
+        return
+    if engine.dialect.name == "postgresql":
+        with open(SCHEMA_FILE) as f:
+            ddl = f.read()
+        raw = engine.raw_connection()
+        try:
+            with raw.cursor() as cursor:
+                cursor.execute(ddl)
+            raw.commit()
+        finally:
+            raw.close()
+    else:
+        with engine.begin() as conn:
+            conn.execute(text(SQLITE_POSITIONS_DDL.format(table=table_name)))
+            conn.execute(text(SQLITE_LOADED_AT_INDEX.format(table=table_name)))
+
+
+def _ensure_loaded_at(engine, table_name):
+    """
+    Add the loaded_at ingest time (and its index) to a positions table created without it.
+    """
+    if "loaded_at" in {column["name"] for column in inspect(engine).get_columns(table_name)}:
+        return
+    dialect = "postgresql" if engine.dialect.name == "postgresql" else "sqlite"
+    with engine.begin() as conn:
+        for statement in ADD_LOADED_AT_DDL[dialect]:
+            conn.execute(text(statement.format(table=table_name)))
+
+
+def _month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def _next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def partition_name(table_name, month):
+    return f"{table_name}_y{month.year:04d}m{month.month:02d}"
+
+
+def ensure_partitions(engine, months, table_name="vessel_positions"):
+    """
+    Create the monthly partitions covering the given dates, if they do not exist yet.
+    Partitions already created by this process are remembered, so steady-state ingest
+    issues no DDL. SQLite has no partitioning, so this is a no-op there.
+    """
+    if engine.dialect.name != "postgresql":
+        return
+    known = _known_partitions.setdefault((engine.url, table_name), set())
+    missing = sorted({_month_start(month) for month in months} - known)
+    if not missing:
+        return
+    with engine.begin() as conn:
+        for month in missing:
+            conn.execute(text(f"""
+                CREATE TABLE IF NOT EXISTS {partition_name(table_name, month)}
+                PARTITION OF {table_name}
+                FOR VALUES FROM ('{month.isoformat()}') TO ('{_next_month(month).isoformat()}')
+            """))
+    known.update(missing)
+
+
+def list_partitions(engine, table_name="vessel_positions"):
+    """
+    Return {month: partition name} for the monthly partitions attached to table_name.
+    """
+    with engine.connect() as conn:
+        names = conn.execute(text("""
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = :table
+        """), {"table": table_name}).scalars().all()
+    partitions = {}
+    for name in names:
+        match = PARTITION_NAME_PATTERN.search(name)
+        if match:
+            partitions[date(int(match.group(1)), int(match.group(2)), 1)] = name
+    return partitions
+
+
+def drop_partitions_before(engine, cutoff, table_name="vessel_positions"):
+    """
+    Retention: drop every monthly partition that ends on or before cutoff. Dropping a
+    partition is a metadata operation, unlike a DELETE over the whole table. On SQLite
+    the stand-in table falls back to a DELETE. Returns the dropped partition names.
+    """
+    if engine.dialect.name != "postgresql":
+        with engine.begin() as conn:
+            conn.execute(text(f"DELETE FROM {table_name} WHERE timestamp < :cutoff"),
+                         {"cutoff": pd.Timestamp(cutoff).strftime(SQLITE_TIMESTAMP_FORMAT)})
+        return []
+    cutoff = pd.Timestamp(cutoff).date()
+    dropped = []
+    with engine.begin() as conn:
+        for month, name in sorted(list_partitions(engine, table_name).items()):
+            if _next_month(month) <= cutoff:
+                conn.execute(text(f"ALTER TABLE {table_name} DETACH PARTITION {name}"))
+                conn.execute(text(f"DROP TABLE {name}"))
+                dropped.append(name)
+    known = _known_partitions.get((engine.url, table_name))
+    if known:
+        known.difference_update(month for month in list(known) if _next_month(month) <= cutoff)
+    return dropped
+
+
+def timestamp_param(engine, value):
+    """
+    Bind value for a timestamp comparison: a datetime for PostgreSQL, fixed-format text for SQLite.
+    """
+    value = pd.Timestamp(value).to_pydatetime()
+    if engine.dialect.name != "postgresql":
+        return value.strftime(SQLITE_TIMESTAMP_FORMAT)
+    return value
+
+
+def read_positions(engine, start, end, vessel_id=None, table_name="vessel_positions"):
+    """
+    Read positions in [start, end), optionally for one vessel, with a partition-prunable query.
+    """
+    params = {"start": timestamp_param(engine, start), "end": timestamp_param(engine, end)}
+    query = POSITIONS_IN_WINDOW_QUERY
+    if vessel_id is not None:
+        query = VESSEL_POSITIONS_IN_WINDOW_QUERY
+        params["vessel_id"] = vessel_id
+    with engine.connect() as conn:
+        return pd.read_sql_query(text(query.format(table=table_name)), conn, params=params,
+                                 parse_dates=["timestamp"])
+
+
+def read_vessel_positions(engine, vessel_ids, start, end, table_name="vessel_positions"):
+    """
+    Read positions in [start, end) for many vessels, in batches of VESSEL_BATCH_SIZE ids.
+    """
+    query = text(VESSELS_POSITIONS_IN_WINDOW_QUERY.format(table=table_name)).bindparams(
+        bindparam("vessel_ids", expanding=True)
+    )
+    params = {"start": timestamp_param(engine, start), "end": timestamp_param(engine, end)}
+    vessel_ids = list(vessel_ids)
+    frames = []
+    with engine.connect() as conn:
+        for offset in range(0, len(vessel_ids), VESSEL_BATCH_SIZE):
+            batch = vessel_ids[offset:offset + VESSEL_BATCH_SIZE]
+            frames.append(pd.read_sql_query(query, conn, params={**params, "vessel_ids": batch},
+                                            parse_dates=["timestamp"]))
+    if not frames:
+        return pd.DataFrame(columns=POSITION_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
+def vessels_updated_since(engine, since=None, table_name="vessel_positions"):
+    """
+    Return (vessel_id, last_ping) for every vessel with a ping after since (all vessels if None).
+    """
+    since = timestamp_param(engine, since if since is not None else "1900-01-01")
+    with engine.connect() as conn:
+        return pd.read_sql_query(text(VESSELS_UPDATED_SINCE_QUERY.format(table=table_name)), conn,
+                                 params={"since": since}, parse_dates=["last_ping"])
+
+
+def vessels_loaded_between(engine, since, until, table_name="vessel_positions"):
+    """
+    Return (vessel_id, last_ping) for every vessel with pings loaded after since, up to until.
+    """
+    params = {"since": timestamp_param(engine, since), "until": timestamp_param(engine, until)}
+    with engine.connect() as conn:
+        return pd.read_sql_query(text(VESSELS_LOADED_BETWEEN_QUERY.format(table=table_name)), conn,
+                                 params=params, parse_dates=["last_ping"])
+
+
+def latest_load(engine, table_name="vessel_positions"):
+    """
+    The loaded_at of the most recently ingested positions, or None if none record one.
+    """
+    with engine.connect() as conn:
+        value = conn.execute(text(LATEST_LOAD_QUERY.format(table=table_name))).scalar()
+    return pd.Timestamp(value) if value is not None else None
+
+
+def _copy_merge_postgres(engine, df, table_name):
+    """
+    COPY the chunk into an unlogged session-local temp table, then merge it into the
+    target with ON CONFLICT DO NOTHING so duplicate (vessel_id, timestamp) keys are skipped.
+    """
+    buffer = io.StringIO()
+    df.to_csv(buffer, columns=POSITION_COLUMNS, index=False, header=False)
+    buffer.seek(0)
+    columns = ", ".join(POSITION_COLUMNS)
+
+    raw = engine.raw_connection()
+    try:
+        with raw.cursor() as cursor:
+            # Temp tables are never WAL-logged and vanish with the session
+            cursor.execute(f"""
+                CREATE TEMP TABLE IF NOT EXISTS staging_{table_name}
+                (LIKE {table_name} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS
+            """)
+            cursor.copy_expert(
+                f"COPY staging_{table_name} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer
+            )
+            cursor.execute(f"""
+                INSERT INTO {table_name} ({columns})
+                SELECT {columns} FROM staging_{table_name}
+                ON CONFLICT (vessel_id, timestamp) DO NOTHING
+            """)
+            inserted = cursor.rowcount
+        raw.commit()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+    return inserted
+
+
+def _insert_sqlite(engine, df, table_name):
+    """
+    SQLite stand-in: one executemany of INSERT ... ON CONFLICT DO NOTHING.
+    """
+    columns = ", ".join(POSITION_COLUMNS + ["loaded_at"])
+    placeholders = ", ".join("?" * (len(POSITION_COLUMNS) + 1))
+    frame = df[POSITION_COLUMNS].copy()
+    frame["timestamp"] = frame["timestamp"].dt.strftime(SQLITE_TIMESTAMP_FORMAT)
+    frame = frame.astype(object).where(frame.notna(), None)
+    frame["loaded_at"] = datetime.now(timezone.utc).strftime(SQLITE_TIMESTAMP_FORMAT)
+
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        before = raw.driver_connection.total_changes
+        cursor.executemany(
+            f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders}) ON CONFLICT DO NOTHING",
+            frame.itertuples(index=False, name=None)
+        )
+        inserted = raw.driver_connection.total_changes - before
+        raw.commit()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+    return inserted
+
+
+def write_positions(df, engine, table_name="vessel_positions"):
+    """
+    Bulk-write one chunk of positions, skipping rows whose key already exists.
+    Returns (rows inserted, rows per second).
+    """
+    started = time.perf_counter()
+    if engine.dialect.name == "postgresql":
+        ensure_partitions(engine, df["timestamp"].dt.to_period("M").dt.start_time, table_name)
+        inserted = _copy_merge_postgres(engine, df, table_name)
+    else:
+        inserted = _insert_sqlite(engine, df, table_name)
+    rows_per_sec = len(df) / max(time.perf_counter() - started, 1e-9)
+    return inserted, rows_per_sec
@@ -1,50 +1,150 @@
-import sqlite3
+import math
 
-# Connect to the SQLite database
-def connect_to_database(db_name="maritime_data.db"):
-    return sqlite3.connect(db_name)
+import numpy as np
+
+import vessel_search
+from db_pool import get_pool
+
+# SQL issued by the query functions below; query_plan_check.py verifies each one uses an index
+FIND_BY_NAME_QUERY = "SELECT * FROM vessels WHERE vessel_name = ?"
+BY_FLAG_QUERY = "SELECT * FROM vessels WHERE flag = ?"
+BY_STATUS_QUERY = "SELECT * FROM vessels WHERE status = ?"
+# Candidates come from the R*Tree (32-bit, rounded outward); the exact REAL columns refine them.
+# CROSS JOIN keeps the R*Tree the driving table now that lat and lon are indexed too
+BBOX_QUERY = """
+    SELECT vessels.* FROM vessel_rtree
+    CROSS JOIN vessels ON vessels.id = vessel_rtree.id
+    WHERE vessel_rtree.max_lat >= ? AND vessel_rtree.min_lat <= ?
+      AND vessel_rtree.max_lon >= ? AND vessel_rtree.min_lon <= ?
+      AND vessels.lat BETWEEN ? AND ? AND vessels.lon BETWEEN ? AND ?
+"""
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = math.pi * EARTH_RADIUS_KM / 180
+# Starting radius of the expanding k-nearest search
+NEAREST_INITIAL_RADIUS_KM = 50.0
+
+# Shared connection pool for the SQLite database
+def get_db_pool(db_name="maritime_data.db"):
+    return get_pool(db_name)
 
 # Query: Find vessel by name
 def find_vessel_by_name(conn, vessel_name):
     cursor = conn.cursor()
-    cursor.execute('''
-        SELECT * FROM vessels WHERE vessel_name = ?
-    ''', (vessel_name,))
+    cursor.execute(FIND_BY_NAME_QUERY, (vessel_name,))
     return cursor.fetchall()
 
+# Query: Ranked vessels whose name, owner or MMSI starts with, contains or nearly matches
+# free text (see vessel_search.py); used to suggest names when an exact lookup finds nothing
+def search_vessels(conn, text, limit=10):
+    return vessel_search.search_vessels(conn, text, limit)
+
 # Query: Get all vessels with a specific flag
 def get_vessels_by_flag(conn, flag):
     cursor = conn.cursor()
-    cursor.execute('''
-        SELECT * FROM vessels WHERE flag = ?
-    ''', (flag,))
+    cursor.execute(BY_FLAG_QUERY, (flag,))
     return cursor.fetchall()
 
 # Query: Get all vessels in a specific status
 def get_vessels_by_status(conn, status):
     cursor = conn.cursor()
-    cursor.execute('''
-        SELECT * FROM vessels WHERE status = ?
-    ''', (status,))
+    cursor.execute(BY_STATUS_QUERY, (status,))
+    return cursor.fetchall()
+
+# Great-circle distance in km from one point to arrays of points, vectorized with NumPy
+def haversine_km(lat, lon, lats, lons):
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(np.asarray(lats, dtype=float)), np.radians(np.asarray(lons, dtype=float))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+# Column positions of lat/lon in a vessels row (SELECT * order)
+def _lat_lon_columns(cursor):
+    names = [column[0] for column in cursor.description]
+    return names.index("lat"), names.index("lon")
+
+# Query: Get all vessels whose last known position is inside a bounding box.
+# A box with min_lon > max_lon crosses the antimeridian and is split in two.
+def get_vessels_in_bbox(conn, min_lat, min_lon, max_lat, max_lon):
+    if min_lon > max_lon:
+        return (get_vessels_in_bbox(conn, min_lat, min_lon, max_lat, 180.0)
+                + get_vessels_in_bbox(conn, min_lat, -180.0, max_lat, max_lon))
+    cursor = conn.cursor()
+    cursor.execute(BBOX_QUERY, (min_lat, max_lat, min_lon, max_lon,
+                                min_lat, max_lat, min_lon, max_lon))
     return cursor.fetchall()
 
+# Function to compute the boxes (one, or two across the antimeridian) enclosing a circle
+def _radius_boxes(lat, lon, radius_km):
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    min_lat, max_lat = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    # Near a pole (or for huge radii) the circle spans every longitude
+    coslat = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    if max_lat >= 90.0 or min_lat <= -90.0 or radius_km >= KM_PER_DEGREE_LAT * 180 * coslat:
+        return [(min_lat, -180.0, max_lat, 180.0)]
+    dlon = radius_km / (KM_PER_DEGREE_LAT * coslat)
+    min_lon, max_lon = lon - dlon, lon + dlon
+    if min_lon < -180.0:
+        return [(min_lat, min_lon + 360.0, max_lat, 180.0), (min_lat, -180.0, max_lat, max_lon)]
+    if max_lon > 180.0:
+        return [(min_lat, min_lon, max_lat, 180.0), (min_lat, -180.0, max_lat, max_lon - 360.0)]
+    return [(min_lat, min_lon, max_lat, max_lon)]
+
+# Function to fetch candidates inside a radius's boxes with their exact distances
+def _radius_candidates(conn, lat, lon, radius_km):
+    cursor = conn.cursor()
+    rows = []
+    for min_lat, min_lon, max_lat, max_lon in _radius_boxes(lat, lon, radius_km):
+        cursor.execute(BBOX_QUERY, (min_lat, max_lat, min_lon, max_lon,
+                                    min_lat, max_lat, min_lon, max_lon))
+        rows.extend(cursor.fetchall())
+    if not rows:
+        return [], np.empty(0)
+    lat_index, lon_index = _lat_lon_columns(cursor)
+    distances = haversine_km(lat, lon, [row[lat_index] for row in rows], [row[lon_index] for row in rows])
+    return rows, distances
+
+# Query: Get all vessels within radius_km of a point, nearest first, as (row, distance_km)
+def get_vessels_within_radius(conn, lat, lon, radius_km):
+    rows, distances = _radius_candidates(conn, lat, lon, radius_km)
+    order = np.argsort(distances, kind="stable")
+    return [(rows[i], float(distances[i])) for i in order if distances[i] <= radius_km]
+
+# Query: Get the k vessels nearest to a point as (row, distance_km), nearest first.
+# The search radius doubles until k vessels lie within it, so only nearby index pages are read.
+def find_nearest_vessels(conn, lat, lon, k=10):
+    if k <= 0:
+        return []
+    radius_km = NEAREST_INITIAL_RADIUS_KM
+    while True:
+        rows, distances = _radius_candidates(conn, lat, lon, radius_km)
+        # Every point on Earth is within half the circumference
+        if np.count_nonzero(distances <= radius_km) >= k or radius_km >= math.pi * EARTH_RADIUS_KM:
+            break
+        radius_km *= 2
+    order = np.argsort(distances, kind="stable")[:k]
+    return [(rows[i], float(distances[i])) for i in order]
+
 # Main script for testing queries
 if __name__ == "__main__":
-    conn = connect_to_database()
-    
-    # Example 1: Find a vessel by name
-    vessel_name = "Poseidon Explorer"
-    result = find_vessel_by_name(conn, vessel_name)
-    print(f"Details for vessel '{vessel_name}':", result)
-    
-    # Example 2: Get vessels with a specific flag
-    flag = "Panama"
-    result = get_vessels_by_flag(conn, flag)
-    print(f"Vessels with flag '{flag}':", result)
-    
-    # Example 3: Get vessels in a specific status
-    status = "In Transit"
-    result = get_vessels_by_status(conn, status)
-    print(f"Vessels with status '{status}':", result)
-    
-    conn.close()
+    with get_db_pool().connection() as conn:
+        # Example 1: Find a vessel by name
+        vessel_name = "Poseidon Explorer"
+        result = find_vessel_by_name(conn, vessel_name)
+        print(f"Details for vessel '{vessel_name}':", result)
+
+        # Example 2: Get vessels with a specific flag
+        flag = "Panama"
+        result = get_vessels_by_flag(conn, flag)
+        print(f"Vessels with flag '{flag}':", result)
+
+        # Example 3: Get vessels in a specific status
+        status = "In Transit"
+        result = get_vessels_by_status(conn, status)
+        print(f"Vessels with status '{status}':", result)
+
+        # Example 4: Get vessels inside a bounding box and the nearest vessels to a point
+        result = get_vessels_in_bbox(conn, 0.0, -30.0, 30.0, 0.0)
+        print("Vessels between 0-30N, 0-30W:", result)
+        result = find_nearest_vessels(conn, 25.7617, -80.1918, k=5)
+        print("Nearest vessels to Miami:", [(row[1], round(distance, 1)) for row, distance in result])
@@ -0,0 +1,108 @@
+import re
+import sys
+
+import app
+import dashboard_queries
+import data_loader
+import map_tiles
+import query_interface
+import vessel_search
+
+# Every SQL statement shipped against the vessels table, with representative parameters.
+# chatbot.py issues the same statements as query_interface.py.
+SHIPPED_QUERIES = [
+    ("query_interface.find_vessel_by_name", query_interface.FIND_BY_NAME_QUERY, ("Poseidon Explorer",)),
+    ("query_interface.get_vessels_by_flag", query_interface.BY_FLAG_QUERY, ("Panama",)),
+    ("query_interface.get_vessels_by_status", query_interface.BY_STATUS_QUERY, ("In Transit",)),
+    ("query_interface.get_vessels_in_bbox", query_interface.BBOX_QUERY, (0, 30, -30, 0) * 2),
+    ("app.process_query speed range", app.SPEED_RANGE_QUERY, (10.0, 15.0)),
+    ("app.process_query owner", app.OWNER_QUERY, ("oceanic lines",)),
+    ("app.process_query vessel name", app.VESSEL_NAME_QUERY, ("poseidon explorer",)),
+    ("app.process_query status", app.STATUS_QUERY, ("in transit",)),
+    ("app.process_query flag", app.FLAG_QUERY, ("panama",)),
+    ("app /tiles density", map_tiles.TILE_CELLS_QUERY, (4, 7, 64, 4, 1, 64, 85, -85, 0, 30, -30, 0)),
+    ("app /tiles density fallback", map_tiles.TILE_POINTS_QUERY, (0, 30, -30, 0)),
+    ("vessel_search name prefix", vessel_search.NAME_PREFIX_QUERY, ("sea", "sea\U0010ffff", 10)),
+    ("vessel_search MMSI prefix", vessel_search.MMSI_PREFIX_QUERY, ("211", "211\U0010ffff", 10)),
+    ("vessel_search substring", vessel_search.SUBSTRING_QUERY, ('"queen"', 100)),
+    ("vessel_search trigram count", vessel_search.TERM_VESSELS_QUERY, ('"que"', 5000)),
+    ("vessel_search shared trigrams",
+     vessel_search.SHARED_TRIGRAMS_QUERY.format(matches=" UNION ALL ".join([vessel_search.TRIGRAM_MATCH] * 2)),
+     ('"que"', '"uee"', 100)),
+] + [
+    (f"app /download {name}", app.download_query(name), ("x",) * count)
+    for name, (_, count) in app.DOWNLOAD_FILTERS.items()
+] + [
+    (f"Dash database-table {name}",
+     dashboard_queries.page_query(dashboard_queries.sidebar_conditions(**filters)[0], sort_by),
+     (*dashboard_queries.sidebar_conditions(**filters)[1], dashboard_queries.PAGE_SIZE, 0))
+    for name, filters, sort_by in [
+        ("MMSI search", {"search": "211331640"}, []),
+        ("name prefix search", {"search": "se"}, [{"column_id": "Vessel Name", "direction": "asc"}]),
+        ("name substring search", {"search": "queen"}, [{"column_id": "Vessel Name", "direction": "asc"}]),
+        ("type filter", {"types": ["Cargo", "Tanker"]}, []),
+        ("flag filter", {"flags": ["Panama"]}, [{"column_id": "Speed", "direction": "desc"}]),
+    ]
+] + [
+    (f"Dash database-table next page by {sort_by or 'id'} {direction} ({index + 1}/{len(ranges)})",
+     dashboard_queries.keyset_query(conditions, order_by), (*params, dashboard_queries.PAGE_SIZE))
+    for sort_by in [None, *dashboard_queries.TABLE_COLUMNS]
+    for direction in ("asc", "desc")
+    for ranges in [dashboard_queries.keyset_segments(
+        [{"column_id": sort_by, "direction": direction}] if sort_by else [], ("x", 1)
+    )]
+    for index, (conditions, params, order_by) in enumerate(ranges)
+] + [
+    (f"Dash vessel-map {name}", query.format(conditions="".join(
+        f" AND {condition}" for condition in dashboard_queries.sidebar_conditions(**filters)[0]
+    )), (*prefix, 0, 30, -30, 0, *dashboard_queries.sidebar_conditions(**filters)[1], *suffix))
+    for name, query, filters, prefix, suffix in [
+        ("points", dashboard_queries.MAP_POINTS_QUERY, {"types": ["Cargo"]}, (), (5001,)),
+        ("search points", dashboard_queries.SELECTED_POINTS_QUERY, {"search": "sea"}, (), (5001,)),
+        ("density", dashboard_queries.DENSITY_QUERY, {}, (-85, 1, -180, 1), ()),
+        ("filtered density", dashboard_queries.FILTERED_DENSITY_QUERY, {"flags": ["Panama"]}, (-85, 1, -180, 1), ()),
+    ]
+]
+
+
+# Virtual-table scans are index lookups when the module was handed constraints,
+# e.g. "SCAN vessel_rtree VIRTUAL TABLE INDEX 2:D1B0D3B2"; "INDEX 2:" alone reads everything
+CONSTRAINED_VIRTUAL_SCAN = re.compile(r"^SCAN \S+ VIRTUAL TABLE INDEX \d+:\S+")
+# Subqueries in FROM are computed by their own (checked) steps, then read back whole
+DERIVED_TABLE = re.compile(r"^(?:CO-ROUTINE|MATERIALIZE) (.+)$")
+
+
+# Function to list the full scans in a statement's query plan
+def full_scans(conn, query, params=()):
+    """Returns the EXPLAIN QUERY PLAN steps that scan a table or index end to end."""
+    plan = conn.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+    derived = {match.group(1) for match in (DERIVED_TABLE.match(detail) for *_, detail in plan) if match}
+    return [
+        detail for _, _, _, detail in plan
+        if detail.startswith("SCAN ") and not CONSTRAINED_VIRTUAL_SCAN.match(detail)
+        and detail[len("SCAN "):] not in derived
+    ]
+
+
+# Function to check every shipped query against the current schema
+def check_query_plans(conn, queries=SHIPPED_QUERIES):
+    """Returns (name, scan steps) for each query whose plan contains a full scan."""
+    failures = []
+    for name, query, params in queries:
+        scans = full_scans(conn, query, params)
+        if scans:
+            failures.append((name, scans))
+    return failures
+
+
+if __name__ == "__main__":
+    # Build the schema (with all migrations) in memory and inspect each plan
+    conn = data_loader.setup_database(":memory:")
+    failures = check_query_plans(conn)
+    conn.close()
+
+    for name, scans in failures:
+        print(f"FULL SCAN in {name}: {'; '.join(scans)}")
+    if failures:
+        sys.exit(1)
+    print(f"All {len(SHIPPED_QUERIES)} shipped queries use an index.")
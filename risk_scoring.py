@@ -0,0 +1,250 @@
+# install required libraries - numpy pandas sqlalchemy (scikit-learn/joblib for trained models)
+
+import hashlib
+import pickle
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import inspect, text
+
+from position_store import (
+    get_engine, latest_load, read_vessel_positions, timestamp_param, vessels_loaded_between,
+    vessels_updated_since,
+)
+from track_features import FEATURE_COLUMNS, compute_features_parallel
+
+# Features are computed over this much history before each vessel's latest ping
+LOOKBACK = pd.Timedelta(days=30)
+# Vessels whose positions are loaded, featurized and scored together
+SCORE_BATCH_SIZE = 5000
+
+# Portable DDL (PostgreSQL and SQLite) for the scores read by the Flask app and Dash
+SCORING_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS vessel_risk_scores (
+        vessel_id TEXT PRIMARY KEY,
+        risk_score FLOAT NOT NULL,
+        model_version TEXT NOT NULL,
+        last_ping TIMESTAMP NOT NULL,
+        scored_at TIMESTAMP NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_vessel_risk_scores_score ON vessel_risk_scores (risk_score)",
+    # One watermark per model version, so a new model rescores the whole fleet once.
+    # loaded_until is the ingest time (vessel_positions.loaded_at) scored up to.
+    """
+    CREATE TABLE IF NOT EXISTS scoring_watermarks (
+        model_version TEXT PRIMARY KEY,
+        last_ping TIMESTAMP NOT NULL,
+        scored_at TIMESTAMP NOT NULL,
+        loaded_until TIMESTAMP
+    )
+    """,
+]
+# Watermarks written before loaded_until existed read as None, so the fleet is rescored once
+ADD_LOADED_UNTIL_DDL = "ALTER TABLE scoring_watermarks ADD COLUMN loaded_until TIMESTAMP"
+# Watermark when no position records its ingest time yet: every later load is after it
+NO_LOADS = pd.Timestamp("1970-01-01")
+
+UPSERT_SCORE_QUERY = """
+    INSERT INTO vessel_risk_scores (vessel_id, risk_score, model_version, last_ping, scored_at)
+    VALUES (:vessel_id, :risk_score, :model_version, :last_ping, :scored_at)
+    ON CONFLICT (vessel_id) DO UPDATE SET
+        risk_score = excluded.risk_score,
+        model_version = excluded.model_version,
+        last_ping = excluded.last_ping,
+        scored_at = excluded.scored_at
+"""
+UPSERT_WATERMARK_QUERY = """
+    INSERT INTO scoring_watermarks (model_version, last_ping, scored_at, loaded_until)
+    VALUES (:model_version, :last_ping, :scored_at, :loaded_until)
+    ON CONFLICT (model_version) DO UPDATE SET
+        last_ping = excluded.last_ping,
+        scored_at = excluded.scored_at,
+        loaded_until = excluded.loaded_until
+"""
+TOP_RISK_QUERY = """
+    SELECT vessel_id, risk_score, model_version, last_ping, scored_at
+    FROM vessel_risk_scores
+    ORDER BY risk_score DESC
+    LIMIT :limit
+"""
+
+
+class BaselineRiskModel:
+    """
+    Transparent logistic baseline used until a trained model file is supplied. Rewards
+    the behaviours associated with IUU fishing: dark periods, loitering, fishing-speed
+    time, erratic courses and spoofed positions.
+    """
+
+    version = "baseline-1"
+    intercept = -3.0
+    weights = {
+        "gap_hours": 0.6,             # log1p-scaled
+        "max_gap_hours": 0.4,         # log1p-scaled
+        "loiter_hours": 0.3,          # log1p-scaled
+        "fishing_speed_fraction": 2.0,
+        "sharp_turn_rate": 1.5,
+        "position_jumps": 0.5,        # log1p-scaled
+    }
+    log_scaled = {"gap_hours", "max_gap_hours", "loiter_hours", "position_jumps"}
+
+    def predict_proba(self, features):
+        z = np.full(len(features), self.intercept)
+        for column, weight in self.weights.items():
+            values = features[column].to_numpy(float)
+            z += weight * (np.log1p(values) if column in self.log_scaled else values)
+        probability = 1.0 / (1.0 + np.exp(-z))
+        return np.column_stack([1.0 - probability, probability])
+
+
+_models = {}
+
+
+def load_model(path=None):
+    """
+    Return (model, version), loading each model file once per process. A model file is a
+    pickle of any object with predict_proba over FEATURE_COLUMNS (e.g. a scikit-learn
+    classifier); its version is the file's digest. Without a path the baseline is used.
+    """
+    if path not in _models:
+        if path is None:
+            model = BaselineRiskModel()
+            _models[path] = (model, model.version)
+        else:
+            with open(path, "rb") as f:
+                payload = f.read()
+            _models[path] = (pickle.loads(payload), hashlib.sha256(payload).hexdigest()[:16])
+    return _models[path]
+
+
+def ensure_scoring_schema(engine):
+    """
+    Create the score tables; score_vessels does this, readers such as app.py do it once at setup.
+    """
+    with engine.begin() as conn:
+        for statement in SCORING_SCHEMA:
+            conn.execute(text(statement))
+    columns = {column["name"] for column in inspect(engine).get_columns("scoring_watermarks")}
+    if "loaded_until" not in columns:
+        with engine.begin() as conn:
+            conn.execute(text(ADD_LOADED_UNTIL_DDL))
+
+
+def get_watermark(engine, model_version):
+    with engine.connect() as conn:
+        value = conn.execute(
+            text("SELECT loaded_until FROM scoring_watermarks WHERE model_version = :version"),
+            {"version": model_version}
+        ).scalar()
+    return pd.Timestamp(value) if value is not None else None
+
+
+def score_features(features, model):
+    """
+    Risk score in [0, 1] for each row of a track_features frame.
+    """
+    if features.empty:
+        return pd.Series(dtype=float, name="risk_score")
+    probabilities = model.predict_proba(features[FEATURE_COLUMNS])
+    return pd.Series(np.asarray(probabilities)[:, 1], index=features.index, name="risk_score")
+
+
+def _write_scores(engine, scores, last_pings, model_version, scored_at):
+    rows = [
+        {"vessel_id": vessel_id, "risk_score": float(score), "model_version": model_version,
+         "last_ping": timestamp_param(engine, last_pings[vessel_id]),
+         "scored_at": timestamp_param(engine, scored_at)}
+        for vessel_id, score in scores.items()
+    ]
+    if rows:
+        with engine.begin() as conn:
+            conn.execute(text(UPSERT_SCORE_QUERY), rows)
+
+
+def score_vessels(db_url, model_path=None, batch_size=SCORE_BATCH_SIZE, lookback=LOOKBACK,
+                  processes=None, table_name="vessel_positions"):
+    """
+    Incrementally (re)score vessels into vessel_risk_scores.
+
+    Only vessels with pings loaded since the model's watermark are rescored, each from the
+    positions in `lookback` before its latest ping. The watermark is an ingest time
+    (vessel_positions.loaded_at), not a ping time, so pings that arrive late, older than
+    ones already scored, still rescore their vessel. Vessels are handled in batches of
+    batch_size: positions are loaded, featurized across one pool of `processes` workers
+    shared by the whole run, scored in one predict_proba call and upserted. The watermark
+    moves forward only after every batch is written, so an interrupted run is simply
+    redone. Returns the number scored.
+    """
+    engine = get_engine(db_url)
+    ensure_scoring_schema(engine)
+    model, model_version = load_model(model_path)
+    watermark = get_watermark(engine, model_version)
+
+    started = time.perf_counter()
+    # Read first: pings loaded while this run works are left for the next one
+    loaded_until = latest_load(engine, table_name) or NO_LOADS
+    if watermark is None:
+        updated = vessels_updated_since(engine, None, table_name)
+    else:
+        updated = vessels_loaded_between(engine, watermark, loaded_until, table_name)
+    if updated.empty:
+        print("No vessels with new pings since the last scoring run.")
+        return 0
+
+    scored_at = datetime.now(timezone.utc).replace(tzinfo=None)
+    updated = updated.sort_values("last_ping")
+    last_pings = dict(zip(updated["vessel_id"], updated["last_ping"]))
+    vessel_ids = updated["vessel_id"].tolist()
+    scored = 0
+    with ProcessPoolExecutor(max_workers=processes) if processes != 1 else nullcontext() as pool:
+        for offset in range(0, len(vessel_ids), batch_size):
+            batch = vessel_ids[offset:offset + batch_size]
+            # Batches are ordered by latest ping, so one time window covers the batch tightly
+            start = min(last_pings[vessel_id] for vessel_id in batch) - lookback
+            end = max(last_pings[vessel_id] for vessel_id in batch) + pd.Timedelta(microseconds=1)
+            positions = read_vessel_positions(engine, batch, start, end, table_name)
+            # Trim to each vessel's own lookback window
+            window_start = positions["vessel_id"].map(last_pings) - lookback
+            positions = positions[positions["timestamp"] >= window_start]
+            features = compute_features_parallel(positions, processes=processes, pool=pool)
+            scores = score_features(features, model)
+            _write_scores(engine, scores, last_pings, model_version, scored_at)
+            scored += len(scores)
+
+    with engine.begin() as conn:
+        conn.execute(text(UPSERT_WATERMARK_QUERY), {
+            "model_version": model_version,
+            "last_ping": timestamp_param(engine, updated["last_ping"].max()),
+            "scored_at": timestamp_param(engine, scored_at),
+            "loaded_until": timestamp_param(engine, loaded_until),
+        })
+    elapsed = time.perf_counter() - started
+    print(f"Scored {scored} vessels with model {model_version} in {elapsed:.2f}s "
+          f"({scored / max(elapsed, 1e-9):,.0f} vessels/sec).")
+    return scored
+
+
+def top_risk_vessels(db_url, limit=100):
+    """
+    The highest-risk vessels, served by the Flask app's /risk endpoint.
+    Read-only: the tables come from ensure_scoring_schema.
+    """
+    engine = get_engine(db_url)
+    with engine.connect() as conn:
+        return pd.read_sql_query(text(TOP_RISK_QUERY), conn, params={"limit": limit},
+                                 parse_dates=["last_ping", "scored_at"])
+
+
+# Usage: python risk_scoring.py <database url> [model file]
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python risk_scoring.py <database url> [model file]")
+        sys.exit(1)
+    score_vessels(sys.argv[1], sys.argv[2] if len(sys.argv) == 3 else None)
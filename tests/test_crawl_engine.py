@@ -0,0 +1,127 @@
+import asyncio
+import time
+
+from aiohttp import web
+
+from crawl_engine import crawl
+
+
+def run_against_stub(handler, crawl_for_base_url):
+    """Serves handler on a local port for as long as crawl_for_base_url(base_url) runs."""
+    async def main():
+        app = web.Application()
+        app.router.add_get("/{key}", handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        try:
+            return await crawl_for_base_url(f"http://127.0.0.1:{port}")
+        finally:
+            await runner.cleanup()
+    return asyncio.run(main())
+
+
+def echo_key(key, status, body):
+    return (key, status, body.decode())
+
+
+def test_rate_limit_spaces_requests_per_host():
+    arrivals = []
+
+    async def handler(request):
+        arrivals.append(time.monotonic())
+        return web.Response(text=request.match_info["key"])
+
+    keys = [str(i) for i in range(6)]
+    results, stats = run_against_stub(handler, lambda base: crawl(
+        [(key, f"{base}/{key}") for key in keys], echo_key, concurrency=4, rate_per_host=20.0, burst=1
+    ))
+
+    assert sorted(results) == [(key, 200, key) for key in keys]
+    # One token per 50 ms and no burst: six requests span at least five intervals
+    assert arrivals[-1] - arrivals[0] >= 5 / 20.0 * 0.9
+    assert stats["pages"] == 6
+
+
+def test_transient_errors_are_retried():
+    attempts = {}
+
+    async def handler(request):
+        key = request.match_info["key"]
+        attempts[key] = attempts.get(key, 0) + 1
+        if attempts[key] == 1:
+            return web.Response(status=503, headers={"Retry-After": "0"})
+        return web.Response(text=key)
+
+    results, stats = run_against_stub(handler, lambda base: crawl(
+        [(key, f"{base}/{key}") for key in "abc"], echo_key, rate_per_host=1000.0, backoff=0.01
+    ))
+
+    assert sorted(results) == [("a", 200, "a"), ("b", 200, "b"), ("c", 200, "c")]
+    assert attempts == {"a": 2, "b": 2, "c": 2}
+    assert stats["retries"] == 3 and stats["failures"] == 0
+
+
+def test_interrupted_run_resumes_from_checkpoint_then_clears_it(tmp_path):
+    checkpoint = tmp_path / "crawl.checkpoint"
+    failing = {"b"}
+    fetched = []
+
+    async def handler(request):
+        key = request.match_info["key"]
+        fetched.append(key)
+        if key in failing:
+            return web.Response(status=500)
+        return web.Response(text=key)
+
+    def run():
+        return run_against_stub(handler, lambda base: crawl(
+            [(key, f"{base}/{key}") for key in "abc"], echo_key, rate_per_host=1000.0,
+            retries=1, backoff=0.01, checkpoint_path=str(checkpoint)
+        ))
+
+    results, stats = run()
+    assert sorted(key for key, _, _ in results) == ["a", "c"]
+    assert stats["failures"] == 1
+    # The failure keeps the checkpoint, holding only the finished keys
+    assert sorted(checkpoint.read_text().split()) == ["a", "c"]
+
+    failing.clear()
+    fetched.clear()
+    results, stats = run()
+    assert fetched == ["b"] and stats["skipped"] == 2
+    assert not checkpoint.exists()
+
+    # A completed run leaves nothing to skip next time
+    fetched.clear()
+    results, stats = run()
+    assert sorted(fetched) == ["a", "b", "c"] and stats["skipped"] == 0
+
+
+def test_entry_evicted_before_304_is_fetched_again(tmp_path, monkeypatch):
+    from http_cache import ResponseCache
+
+    conditional = []
+
+    async def handler(request):
+        conditional.append("If-None-Match" in request.headers)
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304, headers={"ETag": '"v1"'})
+        return web.Response(text="body", headers={"ETag": '"v1"', "Cache-Control": "max-age=0"})
+
+    cache = ResponseCache(str(tmp_path / "cache"))
+
+    async def crawl_twice(base):
+        await crawl([("a", f"{base}/a")], echo_key, cache=cache)
+        # The stale entry disappears between the lookup and the 304
+        monkeypatch.setattr(cache, "revalidated", lambda url, headers: None)
+        return await crawl([("a", f"{base}/a")], echo_key, cache=cache)
+
+    results, stats = run_against_stub(handler, crawl_twice)
+    cache.close()
+
+    assert results == [("a", 200, "body")]
+    assert conditional == [False, True, False]
+    assert stats["failures"] == 0
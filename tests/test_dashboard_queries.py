@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+import dashboard_queries
+import data_loader
+
+
+@pytest.fixture
+def conn():
+    conn = data_loader.setup_database(":memory:")
+    rng = random.Random(7)
+    # Few distinct values and some NULLs, so pages split runs of ties and the NULL block
+    rows = [
+        (rng.choice(["Sea Queen", "Atlas", None]), rng.choice(["Cargo", "Tanker", None]), "Owner",
+         rng.choice(["Panama", "Liberia", None]), rng.choice([8.5, 12.0, None]), "Active",
+         211000000 + i, rng.choice([10.0, -5.5, None]), rng.choice([20.0, None]))
+        for i in range(173)
+    ]
+    conn.executemany(
+        "INSERT INTO vessels (vessel_name, vessel_type, owner, flag, speed_knots, status, mmsi, lat, lon)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+    )
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize("column", [None, *dashboard_queries.TABLE_COLUMNS])
+@pytest.mark.parametrize("direction", ["asc", "desc"])
+def test_keyset_pages_match_offset_pages(conn, column, direction):
+    sort_by = [{"column_id": column, "direction": direction}] if column else []
+    page_size = 10
+    keyset, after = [], None
+    for page in range(20):
+        records, page_count, after = dashboard_queries.fetch_page(
+            conn, sort_by=sort_by, page_current=page, page_size=page_size, after=after
+        )
+        offset, _, _ = dashboard_queries.fetch_page(
+            conn, sort_by=sort_by, page_current=page, page_size=page_size
+        ) if page else (records, None, None)
+        assert records == offset
+        keyset += records
+    assert page_count == 18
+    assert len(keyset) == 173
+    assert len({record["MMSI"] for record in keyset}) == 173
+
+
+def test_keyset_pages_respect_filters(conn):
+    sort_by = [{"column_id": "Speed", "direction": "desc"}]
+    first, _, after = dashboard_queries.fetch_page(conn, flags=["Panama"], sort_by=sort_by, page_size=5)
+    second, _, _ = dashboard_queries.fetch_page(
+        conn, flags=["Panama"], sort_by=sort_by, page_current=1, page_size=5, after=after
+    )
+    assert {record["Flag"] for record in first + second} == {"Panama"}
+    assert second == dashboard_queries.fetch_page(
+        conn, flags=["Panama"], sort_by=sort_by, page_current=1, page_size=5
+    )[0]
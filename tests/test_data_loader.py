@@ -0,0 +1,42 @@
+import pandas as pd
+
+import data_loader
+
+
+def test_reloading_with_other_chunk_sizes_updates_nothing(tmp_path, monkeypatch):
+    # Alone in a chunk the speed reads as int64 and the name as an integer; beside the row
+    # without a speed (and the named vessel) they become float64 and text
+    path = tmp_path / "vessels.csv"
+    pd.DataFrame({
+        "Vessel_Name": ["007", "Sea Queen", "Atlas"],
+        "Vessel_Type": ["Cargo", "Tanker", "Cargo"],
+        "Owner": ["Blue Line", "Red Star", None],
+        "Flag": ["Panama", "Liberia", "Malta"],
+        "Speed_knots": [12, None, 9],
+        "Dimensions_m": ["100x20", "200x30", "150x25"],
+        "Visited_Ports": ["['Oslo']", "['Rotterdam', 'Hamburg']", "[]"],
+        "Last_Known_Position": ["(59.9, 10.7)", "(51.9, 4.5)", None],
+        "Status": ["Active", "Docked", "Active"],
+        "MMSI": [211000001, 211000002, 211000003],
+    }).to_csv(path, index=False)
+
+    written = []
+    write_chunk = data_loader.write_chunk
+
+    def counting_write_chunk(conn, chunk):
+        written.append(write_chunk(conn, chunk))
+        return written[-1]
+
+    monkeypatch.setattr(data_loader, "write_chunk", counting_write_chunk)
+
+    conn = data_loader.setup_database(":memory:")
+    data_loader.load_csv_streaming(conn, str(path), chunksize=1)
+    assert sum(written) == 3
+    stored = conn.execute("SELECT vessel_name, speed_knots FROM vessels ORDER BY mmsi").fetchall()
+    assert stored == [("007", 12.0), ("Sea Queen", None), ("Atlas", 9.0)]
+
+    for chunksize in (2, 3):
+        written.clear()
+        data_loader.load_csv_streaming(conn, str(path), chunksize=chunksize)
+        assert sum(written) == 0
+    conn.close()
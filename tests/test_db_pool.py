@@ -0,0 +1,55 @@
+import sqlite3
+import threading
+
+import pytest
+
+from db_pool import ConnectionPool
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "maritime.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE vessels (mmsi INTEGER PRIMARY KEY, vessel_name TEXT)")
+    conn.execute("INSERT INTO vessels VALUES (211331640, 'SEA QUEEN')")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_read_only_pool_rejects_writes(db_path):
+    pool = ConnectionPool(db_path)
+    with pool.connection() as conn:
+        assert conn.execute("SELECT vessel_name FROM vessels").fetchall() == [("SEA QUEEN",)]
+        # query_only refuses even temporary tables, which mode=ro alone would allow
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("CREATE TEMP TABLE scratch (x)")
+        # With query_only switched off the read-only file still refuses the write
+        conn.execute("PRAGMA query_only = OFF")
+        with pytest.raises(sqlite3.OperationalError, match="readonly"):
+            conn.execute("INSERT INTO vessels VALUES (636091308, 'ATLAS STAR')")
+    pool.close()
+
+    writer = ConnectionPool(db_path, read_only=False)
+    with writer.connection() as conn:
+        conn.execute("INSERT INTO vessels VALUES (636091308, 'ATLAS STAR')")
+        conn.commit()
+    writer.close()
+
+
+def test_connections_are_reused_most_recent_first(db_path):
+    pool = ConnectionPool(db_path, max_connections=2, timeout=0.5)
+    first, second = pool.acquire(), pool.acquire()
+    pool.release(first)
+    pool.release(second)
+    assert pool.acquire() is second
+    assert pool.acquire() is first
+    assert pool.stats() == {"hits": 2, "waits": 0, "opens": 2, "open_connections": 2, "idle_connections": 0}
+
+    # At the limit a checkout waits for a release, and times out if none comes
+    with pytest.raises(TimeoutError):
+        pool.acquire()
+    threading.Timer(0.02, pool.release, (first,)).start()
+    assert pool.acquire() is first
+    assert pool.stats()["waits"] == 2
+    pool.close()
@@ -0,0 +1,57 @@
+import pandas as pd
+from sqlalchemy import text
+
+import encounters
+from position_store import ensure_schema, get_engine, write_positions
+
+
+def track(vessel_id, start, end, latitude, longitude=0.0, every="10min"):
+    times = pd.date_range(start, end, freq=every)
+    return pd.DataFrame({
+        "vessel_id": vessel_id, "vessel_name": f"Vessel {vessel_id}",
+        "latitude": latitude, "longitude": longitude, "timestamp": times,
+    })
+
+
+def test_back_to_back_windows_record_each_encounter_once(tmp_path):
+    db_url = f"sqlite:///{tmp_path / 'positions.db'}"
+    engine = get_engine(db_url)
+    ensure_schema(engine)
+    write_positions(pd.concat([
+        # a and b meet from 08:00 to 12:00 on the first day; the encounter ends inside window one
+        track("a", "2024-01-01 06:00", "2024-01-01 14:00", 10.0),
+        track("b", "2024-01-01 08:00", "2024-01-01 12:00", 10.001),
+        track("b", "2024-01-01 12:10", "2024-01-01 14:00", 12.0),
+        # c and d meet from 10:00 until 02:00 the next day, straddling the window boundary
+        track("c", "2024-01-01 10:00", "2024-01-02 02:00", 20.0),
+        track("d", "2024-01-01 10:00", "2024-01-02 02:00", 20.001),
+        track("c", "2024-01-02 02:10", "2024-01-02 06:00", 25.0),
+        track("d", "2024-01-02 02:10", "2024-01-02 06:00", 30.0),
+    ], ignore_index=True), engine)
+
+    # Window two re-reads from 10:00 to pick up c-d, which also covers the end of a-b
+    encounters.detect_encounters(db_url, start="2024-01-01", end="2024-01-03")
+
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT vessel_a, vessel_b, start_time, end_time FROM vessel_encounters ORDER BY vessel_a"
+        )).fetchall()
+    assert [(a, b, pd.Timestamp(start), pd.Timestamp(end)) for a, b, start, end in rows] == [
+        ("a", "b", pd.Timestamp("2024-01-01 08:00"), pd.Timestamp("2024-01-01 12:10")),
+        ("c", "d", pd.Timestamp("2024-01-01 10:00"), pd.Timestamp("2024-01-02 02:10")),
+    ]
+
+
+def test_find_encounters_holds_back_runs_near_the_window_end():
+    positions = pd.concat([
+        track("a", "2024-01-01 00:00", "2024-01-01 03:00", 10.0),
+        track("b", "2024-01-01 00:00", "2024-01-01 03:00", 10.001),
+    ], ignore_index=True)
+
+    # The data stops at 03:00, but the window runs on to 06:00: the run is over
+    edges, open_runs = encounters.find_encounters(positions, until=pd.Timestamp("2024-01-01 06:00"))
+    assert len(edges) == 1 and open_runs.empty
+
+    # A window ending just after the data could still see the run continue
+    edges, open_runs = encounters.find_encounters(positions, until=pd.Timestamp("2024-01-01 03:10"))
+    assert edges.empty and len(open_runs) == 1
@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+from http_cache import ResponseCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache"))
+    yield cache
+    cache.close()
+
+
+def test_no_store_body_is_readable_but_not_indexed(cache):
+    cache.store("http://x/a", b"old", {"ETag": '"v1"'})
+    entry = cache.store("http://x/a", b"secret", {"Cache-Control": "private, no-store"})
+
+    assert entry.read() == b"secret"
+    assert not entry.fresh
+    # The response replaces, rather than refreshes, what was cached for the URL
+    assert cache.lookup("http://x/a") is None
+
+
+def test_no_cache_is_always_revalidated(cache):
+    entry = cache.store("http://x/a", b"body", {"Cache-Control": "no-cache, max-age=600", "ETag": '"v1"'})
+
+    assert not entry.fresh
+    assert cache.lookup("http://x/a").conditional_headers() == {"If-None-Match": '"v1"'}
+
+
+def test_replaced_body_stays_readable_until_the_grace_period_ends(cache):
+    cache.store("http://x/a", b"v1", {})
+    looked_up = cache.lookup("http://x/a")
+
+    cache.store("http://x/a", b"v2", {})
+    # A reader that looked up the old entry before the replacement can still open it
+    assert looked_up.read() == b"v1"
+    assert cache.lookup("http://x/a").read() == b"v2"
+
+    cache.drop_grace = 0
+    cache.store("http://x/b", b"other", {})
+    assert not os.path.exists(looked_up.path)
+    assert cache.stats() == {"entries": 2, "objects": 2, "bytes": len(b"v2") + len(b"other")}
+
+
+def test_dropped_bodies_do_not_count_towards_max_bytes(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache"), max_bytes=10)
+    cache.store("http://x/a", b"12345", {})
+    cache.store("http://x/a", b"67890", {})
+    cache.store("http://x/b", b"abcde", {})
+
+    # The replaced body of a is still on disk, but a and b together fit in max_bytes
+    assert cache.lookup("http://x/a").read() == b"67890"
+    assert cache.lookup("http://x/b").read() == b"abcde"
+    cache.close()
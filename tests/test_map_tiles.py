@@ -0,0 +1,80 @@
+import os
+import random
+
+import numpy as np
+
+import data_loader
+import map_tiles
+from map_tiles import TileCache
+
+
+def render(png):
+    return lambda: png
+
+
+def version_dirs(directory):
+    return sorted(name for name in os.listdir(directory) if not name.endswith(".version"))
+
+
+def test_new_version_removes_only_older_versions(tmp_path):
+    directory = str(tmp_path / "tiles")
+    current = TileCache(directory)
+    stale = TileCache(directory)
+
+    current.get("2024-01-02 00:00:00", 0, 0, 0, render(b"new"))
+    # A process still on the previous version must not remove the newer tiles
+    stale.get("2024-01-01 00:00:00", 0, 0, 0, render(b"old"))
+    assert len(version_dirs(directory)) == 2
+    assert current.get("2024-01-02 00:00:00", 0, 0, 0, render(b"rendered again")) == b"new"
+
+    # Moving past both versions removes them
+    stale.get("2024-01-03 00:00:00", 0, 0, 0, render(b"newest"))
+    assert len(version_dirs(directory)) == 1
+    fresh = TileCache(directory)
+    assert fresh.get("2024-01-03 00:00:00", 0, 0, 0, render(b"rendered again")) == b"newest"
+
+
+def test_empty_database_version_is_the_oldest(tmp_path):
+    directory = str(tmp_path / "tiles")
+    TileCache(directory).get(None, 0, 0, 0, render(b"empty"))
+    TileCache(directory).get("2024-01-01 00:00:00", 0, 0, 0, render(b"loaded"))
+    assert len(version_dirs(directory)) == 1
+
+
+def test_sql_cell_counts_match_python_binning():
+    conn = data_loader.setup_database(":memory:")
+    rng = random.Random(3)
+    conn.executemany(
+        "INSERT INTO vessels (vessel_name, mmsi, lat, lon) VALUES (?, ?, ?, ?)",
+        [(f"v{i}", 211000000 + i, rng.uniform(-89, 89), rng.uniform(-180, 180)) for i in range(3000)]
+        + [(f"c{i}", 311000000 + i, 51.5 + rng.random() * 0.01, -0.1 + rng.random() * 0.01) for i in range(200)]
+    )
+    for z, x, y in [(0, 0, 0), (2, 1, 1), (5, 15, 10), (10, 511, 340), (14, 8187, 5448)]:
+        min_lat, min_lon, max_lat, max_lon = map_tiles.tile_bounds(z, x, y)
+        rows = conn.execute(map_tiles.TILE_POINTS_QUERY, (min_lat, max_lat, min_lon, max_lon)).fetchall()
+        lats, lons = np.array(rows, dtype=float).reshape(-1, 2).T
+        cells = map_tiles.tile_cells(lats, lons, z, x, y)
+        expected = np.bincount(cells[cells >= 0], minlength=map_tiles.TILE_CELLS ** 2)
+        assert expected.sum() > 0
+        assert (map_tiles.density_counts(conn, z, x, y) == expected).all()
+    conn.close()
+
+
+def test_tile_rendered_for_an_older_version_is_not_served_as_current(tmp_path):
+    cache = TileCache(str(tmp_path / "tiles"))
+
+    def slow_old_render():
+        # The data version moves on while this tile is still rendering
+        cache.get("2024-01-02 00:00:00", 0, 0, 0, render(b"new"))
+        return b"old"
+
+    assert cache.get("2024-01-01 00:00:00", 0, 0, 0, slow_old_render) == b"old"
+    assert cache.get("2024-01-02 00:00:00", 0, 0, 0, render(b"rendered again")) == b"new"
+    # ...nor written back into the removed directory of its version
+    assert len(version_dirs(str(tmp_path / "tiles"))) == 1
+
+
+def test_tiles_from_before_any_data_are_not_served_after_a_load(tmp_path):
+    cache = TileCache(str(tmp_path / "tiles"))
+    cache.get(None, 0, 0, 0, render(b"empty"))
+    assert cache.get("2024-01-01 00:00:00", 0, 0, 0, render(b"loaded")) == b"loaded"
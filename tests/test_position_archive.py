@@ -0,0 +1,51 @@
+import pandas as pd
+
+from position_archive import ArchiveWriter, archive_summary, read_archive_frame, write_archive
+
+
+def chunk(rows):
+    return pd.DataFrame(
+        [(vessel_id, f"Vessel {vessel_id}", lat, lon, pd.Timestamp(ts), flag)
+         for vessel_id, lat, lon, ts, flag in rows],
+        columns=["vessel_id", "vessel_name", "latitude", "longitude", "timestamp", "flag"],
+    )
+
+
+def test_writer_buffers_chunks_into_one_file_per_partition(tmp_path):
+    root = str(tmp_path / "archive")
+    with ArchiveWriter(root, buffer_rows=1000) as writer:
+        for hour in range(10):
+            writer.write(chunk([
+                ("a", 10.0, 20.0, f"2024-01-01 {hour:02d}:00", "PAN"),
+                ("b", 11.0, 21.0, f"2024-01-02 {hour:02d}:00", "PAN"),
+            ]))
+
+    summary = archive_summary(root)
+    assert summary["rows"] == 20
+    assert summary["files"] == 2
+
+
+def test_writer_flushes_when_the_buffer_fills(tmp_path):
+    root = str(tmp_path / "archive")
+    writer = ArchiveWriter(root, buffer_rows=4)
+    for hour in range(6):
+        writer.write(chunk([("a", 10.0, 20.0, f"2024-01-01 {hour:02d}:00", "PAN")]))
+    # Four rows were written; two are still buffered
+    assert archive_summary(root)["rows"] == 4
+    writer.close()
+    assert archive_summary(root) == {
+        "rows": 6, "files": 2,
+        "first": pd.Timestamp("2024-01-01 00:00"), "last": pd.Timestamp("2024-01-01 05:00"),
+    }
+
+
+def test_bbox_is_lat_lon_ordered(tmp_path):
+    root = str(tmp_path / "archive")
+    write_archive(chunk([
+        ("north", 50.0, 5.0, "2024-01-01", "GBR"),
+        ("east", 5.0, 50.0, "2024-01-01", "SYC"),
+    ]), root)
+
+    # (min_lat, min_lon, max_lat, max_lon)
+    found = read_archive_frame(root, columns=["vessel_id"], bbox=(40.0, 0.0, 60.0, 10.0))
+    assert list(found["vessel_id"]) == ["north"]
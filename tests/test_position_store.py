@@ -0,0 +1,142 @@
+import os
+from datetime import date
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, text
+
+import position_store
+from position_store import (
+    PARTITION_NAME_PATTERN, drop_partitions_before, ensure_partitions, ensure_schema, partition_name,
+    latest_load, read_positions, read_vessel_positions, vessels_loaded_between, vessels_updated_since,
+    write_positions,
+)
+
+# A scratch PostgreSQL database the partitioning test may create and drop vessel_positions in
+POSTGRES_URL = os.environ.get("POSITION_STORE_TEST_DB_URL")
+
+
+def positions(*rows):
+    return pd.DataFrame(
+        [(vessel_id, f"Vessel {vessel_id}", 10.0, 20.0, pd.Timestamp(ts)) for vessel_id, ts in rows],
+        columns=position_store.POSITION_COLUMNS,
+    )
+
+
+@pytest.fixture
+def sqlite_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'positions.db'}")
+    ensure_schema(engine)
+    yield engine
+    engine.dispose()
+
+
+def test_partition_names_and_month_ranges():
+    assert partition_name("vessel_positions", date(2024, 1, 1)) == "vessel_positions_y2024m01"
+    match = PARTITION_NAME_PATTERN.search("vessel_positions_y2024m11")
+    assert (match.group(1), match.group(2)) == ("2024", "11")
+    assert PARTITION_NAME_PATTERN.search("vessel_positions_default") is None
+
+    assert position_store._month_start(pd.Timestamp("2024-02-29 23:59")) == date(2024, 2, 1)
+    assert position_store._next_month(date(2024, 11, 1)) == date(2024, 12, 1)
+    assert position_store._next_month(date(2024, 12, 1)) == date(2025, 1, 1)
+
+
+def test_sqlite_write_skips_duplicate_keys(sqlite_engine):
+    chunk = positions(("a", "2024-01-01 00:00"), ("a", "2024-01-01 00:10"), ("b", "2024-01-01 00:00"))
+
+    assert write_positions(chunk, sqlite_engine)[0] == 3
+    assert write_positions(chunk, sqlite_engine)[0] == 0
+    assert write_positions(positions(("a", "2024-01-01 00:20")), sqlite_engine)[0] == 1
+
+
+def test_sqlite_reads_use_half_open_windows(sqlite_engine):
+    write_positions(positions(
+        ("a", "2024-01-31 23:59:59.5"), ("a", "2024-02-01 00:00"), ("b", "2024-02-15 12:00"),
+        ("c", "2024-03-01 00:00"),
+    ), sqlite_engine)
+
+    february = read_positions(sqlite_engine, "2024-02-01", "2024-03-01")
+    assert list(zip(february["vessel_id"], february["timestamp"])) == [
+        ("a", pd.Timestamp("2024-02-01 00:00")), ("b", pd.Timestamp("2024-02-15 12:00")),
+    ]
+    assert list(read_positions(sqlite_engine, "2024-01-01", "2024-04-01", vessel_id="a")["timestamp"]) == [
+        pd.Timestamp("2024-01-31 23:59:59.5"), pd.Timestamp("2024-02-01 00:00"),
+    ]
+
+
+def test_sqlite_vessel_batches_and_updates(sqlite_engine, monkeypatch):
+    monkeypatch.setattr(position_store, "VESSEL_BATCH_SIZE", 2)
+    write_positions(positions(
+        ("a", "2024-01-01"), ("b", "2024-01-02"), ("c", "2024-01-03"), ("c", "2024-01-04"),
+    ), sqlite_engine)
+
+    found = read_vessel_positions(sqlite_engine, ["a", "b", "c", "missing"], "2024-01-01", "2024-02-01")
+    assert sorted(found["vessel_id"]) == ["a", "b", "c", "c"]
+    assert read_vessel_positions(sqlite_engine, [], "2024-01-01", "2024-02-01").empty
+
+    updated = vessels_updated_since(sqlite_engine, "2024-01-02")
+    assert dict(zip(updated["vessel_id"], updated["last_ping"])) == {"c": pd.Timestamp("2024-01-04")}
+
+
+def test_sqlite_retention_deletes_and_partitions_are_a_no_op(sqlite_engine):
+    write_positions(positions(("a", "2024-01-15"), ("a", "2024-02-15")), sqlite_engine)
+
+    ensure_partitions(sqlite_engine, [pd.Timestamp("2024-03-01")])
+    assert drop_partitions_before(sqlite_engine, "2024-02-01") == []
+    assert list(read_positions(sqlite_engine, "2024-01-01", "2025-01-01")["timestamp"]) == [
+        pd.Timestamp("2024-02-15")
+    ]
+
+
+def test_sqlite_tables_without_loaded_at_are_upgraded(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'positions.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(position_store.SQLITE_POSITIONS_DDL.replace("loaded_at TIMESTAMP,", "").format(
+            table="vessel_positions"
+        )))
+        conn.execute(text(
+            "INSERT INTO vessel_positions VALUES ('a', 'Vessel a', 10, 20, '2024-01-02 00:00:00.000000')"
+        ))
+
+    ensure_schema(engine)
+    assert latest_load(engine) is None
+    write_positions(positions(("b", "2024-01-01")), engine)
+    loaded = latest_load(engine)
+    # Late pings count by when they were loaded, and report the vessel's latest ping
+    write_positions(positions(("a", "2024-01-01")), engine)
+    updated = vessels_loaded_between(engine, loaded, latest_load(engine))
+    assert dict(zip(updated["vessel_id"], updated["last_ping"])) == {"a": pd.Timestamp("2024-01-02")}
+    engine.dispose()
+
+
+@pytest.mark.skipif(not POSTGRES_URL, reason="set POSITION_STORE_TEST_DB_URL to a scratch PostgreSQL database")
+def test_postgres_monthly_partitions():
+    pytest.importorskip("psycopg2")
+    engine = create_engine(POSTGRES_URL)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS vessel_positions CASCADE"))
+    position_store._known_partitions.clear()
+    try:
+        ensure_schema(engine)
+        write_positions(positions(("a", "2024-01-15"), ("a", "2024-02-15"), ("b", "2024-12-31 23:00")), engine)
+        assert sorted(position_store.list_partitions(engine).values()) == [
+            "vessel_positions_y2024m01", "vessel_positions_y2024m02", "vessel_positions_y2024m12",
+        ]
+        # Rows land in the partition covering their month
+        with engine.connect() as conn:
+            december = conn.execute(text("SELECT COUNT(*) FROM vessel_positions_y2024m12")).scalar()
+        assert december == 1
+
+        assert drop_partitions_before(engine, "2024-03-01") == [
+            "vessel_positions_y2024m01", "vessel_positions_y2024m02",
+        ]
+        assert list(read_positions(engine, "2024-01-01", "2025-01-01")["vessel_id"]) == ["b"]
+        # Dropped months are forgotten, so writing into them again recreates the partition
+        write_positions(positions(("a", "2024-01-20")), engine)
+        assert "vessel_positions_y2024m01" in position_store.list_partitions(engine).values()
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text("DROP TABLE IF EXISTS vessel_positions CASCADE"))
+        position_store._known_partitions.clear()
+        engine.dispose()
@@ -0,0 +1,22 @@
+import pytest
+
+import data_loader
+from query_plan_check import SHIPPED_QUERIES, full_scans
+
+
+@pytest.fixture(scope="module")
+def conn():
+    # The schema with all migrations applied, as query_plan_check.py builds it
+    conn = data_loader.setup_database(":memory:")
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize("query, params", [(query, params) for _, query, params in SHIPPED_QUERIES],
+                         ids=[name for name, _, _ in SHIPPED_QUERIES])
+def test_shipped_query_uses_an_index(conn, query, params):
+    assert full_scans(conn, query, params) == []
+
+
+def test_full_scans_are_detected(conn):
+    assert full_scans(conn, "SELECT * FROM vessels WHERE dimensions = ?", ("10x2",)) == ["SCAN vessels"]
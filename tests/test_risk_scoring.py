@@ -0,0 +1,60 @@
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+import risk_scoring
+from position_store import ensure_schema, get_engine, write_positions
+
+
+def pings(vessel_id, start, end, latitude, every="30min"):
+    times = pd.date_range(start, end, freq=every)
+    return pd.DataFrame({
+        "vessel_id": vessel_id, "vessel_name": f"Vessel {vessel_id}",
+        "latitude": [latitude + 0.01 * i for i in range(len(times))], "longitude": 0.0, "timestamp": times,
+    })
+
+
+def scores(engine):
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT vessel_id, risk_score, scored_at FROM vessel_risk_scores"))
+        return {vessel_id: (score, scored_at) for vessel_id, score, scored_at in rows}
+
+
+def test_rescoring_picks_up_late_and_new_pings_only(tmp_path):
+    db_url = f"sqlite:///{tmp_path / 'positions.db'}"
+    engine = get_engine(db_url)
+    ensure_schema(engine)
+    write_positions(pd.concat([
+        pings("a", "2024-01-01 00:00", "2024-01-01 12:00", 10.0),
+        pings("b", "2024-01-01 00:00", "2024-01-01 12:00", 20.0),
+        pings("c", "2024-01-01 00:00", "2024-01-01 12:00", 30.0),
+    ], ignore_index=True), engine)
+
+    assert risk_scoring.score_vessels(db_url, processes=2) == 3
+    assert risk_scoring.score_vessels(db_url, processes=2) == 0
+    first = scores(engine)
+
+    write_positions(pd.concat([
+        # A late ping for a, far off its track and older than pings already scored
+        pd.DataFrame({"vessel_id": ["a"], "vessel_name": ["Vessel a"], "latitude": [40.0],
+                      "longitude": [40.0], "timestamp": [pd.Timestamp("2024-01-01 06:10")]}),
+        pings("b", "2024-01-01 12:30", "2024-01-01 14:00", 20.3),
+    ], ignore_index=True), engine)
+    assert risk_scoring.score_vessels(db_url, processes=2) == 2
+    second = scores(engine)
+
+    assert second["c"] == first["c"]
+    assert second["a"][1] != first["a"][1] and second["a"][0] != first["a"][0]
+    assert second["b"][1] != first["b"][1]
+
+    # The shared worker pool scores exactly as a single process does
+    serial_url = f"sqlite:///{tmp_path / 'serial.db'}"
+    serial = get_engine(serial_url)
+    ensure_schema(serial)
+    with engine.connect() as conn:
+        positions = pd.read_sql_query(text("SELECT * FROM vessel_positions"), conn, parse_dates=["timestamp"])
+    write_positions(positions, serial)
+    assert risk_scoring.score_vessels(serial_url, processes=1) == 3
+    assert {vessel_id: score for vessel_id, (score, _) in scores(serial).items()} == pytest.approx(
+        {vessel_id: score for vessel_id, (score, _) in second.items()}
+    )
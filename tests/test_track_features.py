@@ -0,0 +1,49 @@
+import pandas as pd
+import pytest
+
+from query_interface import haversine_km
+from track_features import (
+    KM_PER_NAUTICAL_MILE, compute_features, compute_features_parallel, synthetic_positions,
+)
+
+
+def track(vessel_id, *pings):
+    return pd.DataFrame([
+        (vessel_id, latitude, longitude, pd.Timestamp("2024-01-01") + pd.Timedelta(hours=hours))
+        for hours, latitude, longitude in pings
+    ], columns=["vessel_id", "latitude", "longitude", "timestamp"])
+
+
+def test_gap_jump_and_turn_on_a_hand_built_track():
+    positions = pd.concat([
+        # East for an hour, a right-angle turn north, then eight hours dark
+        track("a", (0, 0.0, 0.0), (1, 0.0, 0.1), (2, 0.1, 0.1), (10, 0.15, 0.1)),
+        # Loitering for half an hour, then a spoofed position far away and back
+        track("b", (0, 10.0, 10.0), (0.5, 10.001, 10.0), (1, 20.0, 10.0), (1.5, 10.002, 10.0)),
+    ], ignore_index=True).sample(frac=1.0, random_state=1)
+
+    features = compute_features(positions)
+    a, b = features.loc["a"], features.loc["b"]
+    leg_km = haversine_km(0.0, 0.0, 0.0, 0.1)
+
+    assert a["pings"] == 4 and a["track_hours"] == pytest.approx(10.0)
+    assert a["gap_count"] == 1
+    assert (a["gap_hours"], a["max_gap_hours"]) == (pytest.approx(8.0), pytest.approx(8.0))
+    assert a["mean_speed_knots"] == pytest.approx(leg_km / KM_PER_NAUTICAL_MILE)
+    assert (a["mean_course_change"], a["sharp_turn_rate"]) == (pytest.approx(90.0, abs=0.1), 1.0)
+    assert a["position_jumps"] == 0
+
+    assert b["position_jumps"] == 2 and b["gap_count"] == 0
+    assert b["loiter_hours"] == pytest.approx(0.5)
+    # Jumps count towards neither distance nor speed
+    assert b["distance_km"] == pytest.approx(haversine_km(10.0, 10.0, 10.001, 10.0))
+    assert b["max_speed_knots"] < 1.0
+
+
+def test_parallel_features_match_serial():
+    positions = synthetic_positions(5000, 50)
+    expected = compute_features(positions)
+    pd.testing.assert_frame_equal(
+        compute_features_parallel(positions, processes=2, vessels_per_chunk=10), expected
+    )
+    assert compute_features_parallel(positions.iloc[:0], processes=2).empty
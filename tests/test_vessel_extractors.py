@@ -0,0 +1,33 @@
+import os
+
+import pytest
+
+import vessel_extractors
+
+FIXTURE_PAGES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "vessel_pages")
+PAGES = vessel_extractors.load_fixture_pages(FIXTURE_PAGES)
+
+EXPECTED = {
+    "211331640": {"Name": "SEA QUEEN", "Flag": "Panama", "Type": "Cargo", "Position": "(51.5, -0.09)"},
+    # Padded labels and values, and a multi-class name heading
+    "636091308": {"Name": "ATLAS STAR", "Flag": "Liberia", "Type": "Oil / Chemical Tanker",
+                  "Position": "(1.26, 103.82)"},
+    # Labels and values split across child elements
+    "257000001": {"Name": "MV NORDIC WIND", "Flag": "Norway", "Type": "Fishing vessel",
+                  "Position": "(59.9, 10.7)"},
+    # No position on the page
+    "219000002": None,
+}
+
+
+@pytest.mark.parametrize("mmsi, html", PAGES, ids=[mmsi for mmsi, _ in PAGES])
+def test_extractors_agree_on_saved_pages(mmsi, html):
+    pytest.importorskip("lxml")
+    expected = EXPECTED[mmsi] and {"MMSI": mmsi, **EXPECTED[mmsi]}
+    assert vessel_extractors.SoupExtractor().extract(mmsi, html) == expected
+    assert vessel_extractors.LxmlExtractor().extract(mmsi, html) == expected
+
+
+def test_pool_extraction_matches_single_process():
+    assert vessel_extractors.extract_pages(PAGES, extractor="soup", processes=2) == \
+        vessel_extractors.extract_pages(PAGES, extractor="soup", processes=1)
@@ -0,0 +1,47 @@
+import data_loader
+import vessel_network
+from vessel_network import VesselNetwork, analyze_network, ensure_network_schema, update_network
+
+
+def add_vessel(conn, name, owner, mmsi):
+    conn.execute(
+        "INSERT INTO vessels (vessel_name, owner, mmsi, content_hash) VALUES (?, ?, ?, ?)",
+        (name, owner, mmsi, mmsi)
+    )
+
+
+def test_new_nodes_never_take_the_ids_of_removed_ones():
+    conn = data_loader.setup_database(":memory:")
+    add_vessel(conn, "Atlas", "Blue Line", 211000001)
+    add_vessel(conn, "Sea Queen", "Red Star", 211000002)
+    update_network(conn)
+    analyze_network(conn)
+
+    # Sea Queen and its owner hold the highest node ids in the snapshot
+    conn.execute("DELETE FROM vessels WHERE vessel_name = 'Sea Queen'")
+    update_network(conn)
+    add_vessel(conn, "Nordic", "Green Bay", 211000003)
+    update_network(conn)
+
+    network = VesselNetwork.load(conn)
+    # Nodes added since the analysis are left out rather than inheriting Sea Queen's edges
+    assert network.neighbourhood("Nordic") is None
+    assert network.neighbourhood("Sea Queen") is None
+    assert {node["label"] for node in network.neighbourhood("Atlas")["nodes"]} == {"Atlas", "Blue Line"}
+
+    network = analyze_network(conn)
+    assert {node["label"] for node in network.neighbourhood("Nordic")["nodes"]} == {"Nordic", "Green Bay"}
+    conn.close()
+
+
+def test_tables_without_autoincrement_ids_are_rebuilt():
+    conn = data_loader.setup_database(":memory:")
+    add_vessel(conn, "Atlas", "Blue Line", 211000001)
+    conn.executescript(vessel_network.NETWORK_SCHEMA.replace(" AUTOINCREMENT", ""))
+    conn.execute("INSERT INTO network_nodes (kind, ref, label) VALUES ('owner', 'stale', 'Stale')")
+
+    ensure_network_schema(conn)
+    assert conn.execute("SELECT COUNT(*) FROM network_nodes").fetchone()[0] == 0
+    assert update_network(conn) == 1
+    assert "AUTOINCREMENT" in conn.execute(vessel_network.NODES_TABLE_SQL_QUERY).fetchone()[0]
+    conn.close()
@@ -0,0 +1,48 @@
+import pandas as pd
+import pytest
+
+import data_loader
+from vessel_search import search_vessels
+
+
+def vessel(name, mmsi, owner="Nordic Lines"):
+    return {
+        "Vessel_Name": name, "Vessel_Type": "Cargo", "Owner": owner, "Flag": "Norway",
+        "Speed_knots": 12.0, "Dimensions_m": "100x20", "Visited_Ports": "['Oslo']",
+        "Last_Known_Position": "(59.9, 10.7)", "Status": "Active", "MMSI": mmsi,
+    }
+
+
+@pytest.fixture
+def conn():
+    conn = data_loader.setup_database(":memory:")
+    data_loader.insert_data(conn, pd.DataFrame([
+        vessel("ÅLESUND STAR", 257000001),
+        vessel("Ørsted Wind", 219000002),
+        vessel("Sea Queen", 211000005),
+        vessel("Harbour Tug", 21100001),
+    ]))
+    yield conn
+    conn.close()
+
+
+def test_non_ascii_names_match_their_prefixes_in_any_case(conn):
+    assert [(r["name"], r["match"]) for r in search_vessels(conn, "ålesund")] == [("ÅLESUND STAR", "prefix")]
+    assert [(r["name"], r["match"]) for r in search_vessels(conn, "ØR")] == [("Ørsted Wind", "prefix")]
+
+
+def test_mmsi_prefixes_match_as_text(conn):
+    # Too short for the trigram index, so only the prefix lookup can find these
+    assert {r["mmsi"] for r in search_vessels(conn, "21")} == {211000005, 219000002, 21100001}
+    # A capped lookup keeps the first MMSIs in text order
+    assert {r["mmsi"] for r in search_vessels(conn, "21", limit=2)} == {211000005, 21100001}
+    assert [r["match"] for r in search_vessels(conn, "21100001")] == ["exact"]
+
+
+def test_migration_backfills_lowered_names(conn):
+    conn.execute("UPDATE vessels SET vessel_name_lower = NULL")
+    conn.execute("PRAGMA user_version = 7")
+    data_loader.migrate_schema(conn)
+    assert dict(conn.execute("SELECT vessel_name, vessel_name_lower FROM vessels WHERE mmsi = 257000001")) == {
+        "ÅLESUND STAR": "ålesund star"
+    }
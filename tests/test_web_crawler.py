@@ -0,0 +1,78 @@
+import asyncio
+import csv
+import importlib.util
+import os
+import threading
+
+import pytest
+from aiohttp import web
+
+PAGE = """<html><body>
+<h1 class="vessel-name">Vessel {mmsi}</h1><span class="flag">Panama</span>
+<div>Type:</div><div>Cargo</div>
+<div>Current Position:</div><div>(10.0, 20.0)</div>
+</body></html>"""
+
+
+def load_crawler():
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Web-Crawler.py")
+    spec = importlib.util.spec_from_file_location("web_crawler", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def stub_url():
+    """Base URL of a stub vessel site served from a background thread."""
+    failing = set()
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    state = {}
+
+    async def handler(request):
+        mmsi = request.query["name"]
+        if mmsi in failing:
+            return web.Response(status=500)
+        return web.Response(text=PAGE.format(mmsi=mmsi), content_type="text/html")
+
+    async def start():
+        app = web.Application()
+        app.router.add_get("/vessels", handler)
+        state["runner"] = web.AppRunner(app)
+        await state["runner"].setup()
+        site = web.TCPSite(state["runner"], "127.0.0.1", 0)
+        await site.start()
+        state["port"] = site._server.sockets[0].getsockname()[1]
+        started.set()
+
+    thread = threading.Thread(target=lambda: (loop.run_until_complete(start()), loop.run_forever()), daemon=True)
+    thread.start()
+    started.wait(10)
+    yield f"http://127.0.0.1:{state['port']}/vessels?name={{mmsi}}", failing
+    asyncio.run_coroutine_threadsafe(state["runner"].cleanup(), loop).result(10)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(10)
+
+
+def test_rerunning_a_complete_crawl_rewrites_the_output(tmp_path, stub_url, monkeypatch):
+    url, failing = stub_url
+    crawler = load_crawler()
+    monkeypatch.setattr(crawler, "SEARCH_URL", url)
+    output = tmp_path / "vessels.csv"
+    checkpoint = tmp_path / "vessels.checkpoint"
+
+    def run():
+        crawler.crawl_vessels(["1", "2", "3"], output_file=str(output), checkpoint_file=str(checkpoint),
+                              rate_per_host=1000.0, retries=0, cache_dir=None, parse_processes=1)
+        with open(output, newline="") as f:
+            return sorted(row["MMSI"] for row in csv.DictReader(f))
+
+    # An interrupted run is resumed, appending the missing vessel
+    failing.add("2")
+    assert run() == ["1", "3"]
+    assert checkpoint.exists()
+    failing.clear()
+    assert run() == ["1", "2", "3"]
+    # Once complete, running again starts over instead of appending duplicates
+    assert run() == ["1", "2", "3"]
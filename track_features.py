@@ -0,0 +1,192 @@
+# install required libraries - numpy pandas
+
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from query_interface import haversine_km
+
+KM_PER_NAUTICAL_MILE = 1.852
+
+# Reporting gaps at least this long count as possible dark periods (AIS switched off)
+AIS_GAP_HOURS = 6.0
+# Below this speed a vessel is loitering
+LOITER_SPEED_KNOTS = 1.0
+# Typical trawling / longlining speeds
+FISHING_SPEED_KNOTS = (2.0, 5.0)
+# Course changes sharper than this (degrees) between consecutive segments count as turns
+SHARP_TURN_DEGREES = 45.0
+# Faster than any fishing vessel; such segments are position jumps and are ignored
+MAX_PLAUSIBLE_SPEED_KNOTS = 50.0
+
+# Output columns, one row per vessel
+FEATURE_COLUMNS = [
+    "pings", "track_hours", "distance_km", "mean_speed_knots", "max_speed_knots",
+    "gap_count", "gap_hours", "max_gap_hours", "loiter_hours", "fishing_speed_fraction",
+    "mean_course_change", "sharp_turn_rate", "position_jumps",
+]
+
+# Vessels per task when the job is split across worker processes
+VESSELS_PER_CHUNK = 2000
+
+
+def _bearing_degrees(lat1, lon1, lat2, lon2):
+    """
+    Initial great-circle bearing of each segment, in degrees [0, 360).
+    """
+    lat1, lat2 = np.radians(lat1), np.radians(lat2)
+    dlon = np.radians(lon2 - lon1)
+    x = np.sin(dlon) * np.cos(lat2)
+    y = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(dlon)
+    return np.degrees(np.arctan2(x, y)) % 360.0
+
+
+def _sum_by(codes, values, count):
+    return np.bincount(codes, weights=values, minlength=count)
+
+
+def compute_features(positions, gap_hours=AIS_GAP_HOURS):
+    """
+    Per-vessel track features from a frame of (vessel_id, latitude, longitude, timestamp) pings.
+
+    Pings are sorted by vessel then time, and every consecutive pair of the same vessel forms
+    a segment. Segment metrics are computed as whole-array operations and folded into
+    per-vessel totals with bincount, so the cost is a handful of vectorized passes regardless
+    of how many vessels the frame holds. Returns a DataFrame indexed by vessel_id.
+    """
+    if positions.empty:
+        return pd.DataFrame(columns=FEATURE_COLUMNS, index=pd.Index([], name="vessel_id"))
+
+    codes, vessels = pd.factorize(positions["vessel_id"], sort=True)
+    times = pd.to_datetime(positions["timestamp"]).to_numpy("datetime64[ns]").view("int64")
+    order = np.lexsort((times, codes))
+    codes, times = codes[order], times[order]
+    lat = positions["latitude"].to_numpy(float)[order]
+    lon = positions["longitude"].to_numpy(float)[order]
+    count = len(vessels)
+
+    # Segments: consecutive pings of the same vessel
+    same = codes[1:] == codes[:-1]
+    seg_codes = codes[1:][same]
+    hours = (np.diff(times) / 3.6e12)[same]
+    distance = haversine_km(lat[:-1], lon[:-1], lat[1:], lon[1:])[same]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        speed = np.where(hours > 0, distance / KM_PER_NAUTICAL_MILE / hours, np.nan)
+
+    jump = speed > MAX_PLAUSIBLE_SPEED_KNOTS
+    gap = hours >= gap_hours
+    # Time between regular reports, i.e. excluding dark periods and position jumps
+    tracked = ~gap & ~jump & np.isfinite(speed)
+    tracked_hours = np.where(tracked, hours, 0.0)
+    loiter = tracked & (speed < LOITER_SPEED_KNOTS)
+    fishing = tracked & (speed >= FISHING_SPEED_KNOTS[0]) & (speed <= FISHING_SPEED_KNOTS[1])
+
+    # Course change between consecutive segments of the same vessel, folded to [0, 180]
+    bearing = _bearing_degrees(lat[:-1], lon[:-1], lat[1:], lon[1:])[same]
+    moving = tracked & (distance > 0)
+    turn_pair = (seg_codes[1:] == seg_codes[:-1]) & moving[1:] & moving[:-1]
+    turn = np.abs((np.diff(bearing) + 180.0) % 360.0 - 180.0)[turn_pair]
+    turn_codes = seg_codes[1:][turn_pair]
+
+    pings = np.bincount(codes, minlength=count)
+    track_hours = _sum_by(seg_codes, hours, count)
+    valid_distance = _sum_by(seg_codes, np.where(jump, 0.0, distance), count)
+    tracked_total = _sum_by(seg_codes, tracked_hours, count)
+    max_speed = np.zeros(count)
+    np.maximum.at(max_speed, seg_codes[tracked], speed[tracked])
+    max_gap = np.zeros(count)
+    np.maximum.at(max_gap, seg_codes, np.where(gap, hours, 0.0))
+    turns = np.bincount(turn_codes, minlength=count)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        features = pd.DataFrame({
+            "pings": pings,
+            "track_hours": track_hours,
+            "distance_km": valid_distance,
+            "mean_speed_knots": _sum_by(seg_codes, np.where(tracked, distance, 0.0), count)
+                                / KM_PER_NAUTICAL_MILE / tracked_total,
+            "max_speed_knots": max_speed,
+            "gap_count": np.bincount(seg_codes[gap], minlength=count),
+            "gap_hours": _sum_by(seg_codes, np.where(gap, hours, 0.0), count),
+            "max_gap_hours": max_gap,
+            "loiter_hours": _sum_by(seg_codes, np.where(loiter, hours, 0.0), count),
+            "fishing_speed_fraction": _sum_by(seg_codes, np.where(fishing, hours, 0.0), count) / tracked_total,
+            "mean_course_change": _sum_by(turn_codes, turn, count) / turns,
+            "sharp_turn_rate": np.bincount(turn_codes[turn > SHARP_TURN_DEGREES], minlength=count) / turns,
+            "position_jumps": np.bincount(seg_codes[jump], minlength=count),
+        }, index=pd.Index(vessels, name="vessel_id"))
+    return features.fillna(0.0)
+
+
+def split_by_vessel(positions, vessels_per_chunk=VESSELS_PER_CHUNK):
+    """
+    Split a positions frame into chunks that each hold every ping of a set of vessels.
+    """
+    codes, _ = pd.factorize(positions["vessel_id"])
+    groups = codes // vessels_per_chunk
+    for _, chunk in positions.groupby(groups, sort=False):
+        yield chunk
+
+
+def compute_features_parallel(positions, processes=None, vessels_per_chunk=VESSELS_PER_CHUNK,
+                              gap_hours=AIS_GAP_HOURS, pool=None):
+    """
+    compute_features across a pool of worker processes, one vessel chunk per task.
+    Pass an executor as `pool` to reuse its workers across calls; otherwise one is started
+    (and shut down) for this call.
+    """
+    chunks = list(split_by_vessel(positions, vessels_per_chunk))
+    if len(chunks) <= 1 or (pool is None and processes == 1):
+        results = [compute_features(chunk, gap_hours) for chunk in chunks]
+    elif pool is not None:
+        results = list(pool.map(compute_features, chunks, [gap_hours] * len(chunks)))
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            results = list(pool.map(compute_features, chunks, [gap_hours] * len(chunks)))
+    if not results:
+        return compute_features(positions, gap_hours)
+    return pd.concat(results).sort_index()
+
+
+def synthetic_positions(pings, vessels, seed=0):
+    """
+    Random-walk tracks for benchmarking: `pings` rows spread over `vessels` vessels.
+    """
+    rng = np.random.default_rng(seed)
+    vessel = np.sort(rng.integers(0, vessels, pings))
+    step = rng.exponential(600, pings).astype("int64") * 10 ** 9
+    return pd.DataFrame({
+        "vessel_id": vessel.astype(str),
+        "latitude": np.clip(rng.uniform(-60, 60, vessels)[vessel] + np.cumsum(rng.normal(0, 0.01, pings)), -90, 90),
+        "longitude": (rng.uniform(-180, 180, vessels)[vessel] + np.cumsum(rng.normal(0, 0.01, pings)) + 180) % 360 - 180,
+        "timestamp": pd.to_datetime(np.cumsum(step) + 1_700_000_000 * 10 ** 9),
+    })
+
+
+def benchmark(pings=10_000_000, vessels=20_000, processes=None):
+    """
+    Time feature extraction on synthetic tracks, single-process and in a process pool.
+    """
+    positions = synthetic_positions(pings, vessels)
+    results = []
+    for workers in (1, processes):
+        started = time.perf_counter()
+        compute_features_parallel(positions, processes=workers)
+        elapsed = time.perf_counter() - started
+        results.append({
+            "processes": workers or os.cpu_count(),
+            "pings": pings,
+            "pings_per_min": pings / max(elapsed, 1e-9) * 60,
+        })
+    return results
+
+
+# Benchmark usage: python track_features.py [pings] [vessels]
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:3]]
+    for row in benchmark(*args):
+        print(f"x{row['processes']:<3} {row['pings']:,} pings, {row['pings_per_min']:,.0f} pings/min")
@@ -0,0 +1,179 @@
+# install packages - pip install beautifulsoup4 lxml
+
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bs4 import BeautifulSoup
+
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:  # lxml is optional; the BeautifulSoup extractor is always available
+    lxml = None
+
+
+# Both extractors read the same things from a page, so they return the same records:
+#  - field text is an element's whole text content with whitespace runs collapsed (as XPath's
+#    normalize-space), whatever child elements it is split across;
+#  - a label is the innermost div whose text, so normalized, is the label; its value is the
+#    first div after it in document order.
+
+
+def normalize_text(text):
+    """Whitespace runs collapsed to one space and the ends trimmed, like XPath normalize-space()."""
+    return " ".join(text.split())
+
+
+class SoupExtractor:
+    """
+    Reference extractor: BeautifulSoup's pure-Python html.parser with tree searches.
+    """
+
+    name = "soup"
+
+    @staticmethod
+    def _label(label):
+        def matches(tag):
+            return tag.name == 'div' and not tag.find('div') and normalize_text(tag.get_text()) == label
+        return matches
+
+    def extract(self, mmsi, html):
+        soup = BeautifulSoup(html, 'html.parser')
+        try:
+            return {
+                "MMSI": mmsi,
+                "Name": normalize_text(soup.find('h1', class_='vessel-name').get_text()),
+                "Flag": normalize_text(soup.find('span', class_='flag').get_text()),
+                "Type": normalize_text(soup.find(self._label('Type:')).find_next('div').get_text()),
+                "Position": normalize_text(
+                    soup.find(self._label('Current Position:')).find_next('div').get_text()
+                ),
+            }
+        except Exception as e:
+            print(f"Error parsing data for MMSI {mmsi}: {e}")
+            return None
+
+
+def _has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+def _div_after_label(label):
+    return f"(//div[normalize-space(.)='{label}' and not(.//div)])[1]/following::div[1]"
+
+
+class LxmlExtractor:
+    """
+    Fast extractor: libxml2's C HTML parser with XPath expressions compiled once per process.
+    """
+
+    name = "lxml"
+
+    def __init__(self):
+        self.fields = {
+            "Name": etree.XPath(f"(//h1[{_has_class('vessel-name')}])[1]"),
+            "Flag": etree.XPath(f"(//span[{_has_class('flag')}])[1]"),
+            "Type": etree.XPath(_div_after_label("Type:")),
+            "Position": etree.XPath(_div_after_label("Current Position:")),
+        }
+
+    def extract(self, mmsi, html):
+        try:
+            document = lxml.html.fromstring(html)
+        except (etree.ParserError, ValueError) as e:
+            print(f"Error parsing data for MMSI {mmsi}: {e}")
+            return None
+        record = {"MMSI": mmsi}
+        for field, xpath in self.fields.items():
+            matches = xpath(document)
+            if not matches:
+                print(f"Error parsing data for MMSI {mmsi}: no {field} found")
+                return None
+            record[field] = normalize_text(matches[0].text_content())
+        return record
+
+
+EXTRACTORS = {"soup": SoupExtractor}
+if lxml is not None:
+    EXTRACTORS["lxml"] = LxmlExtractor
+
+_extractors = {}
+
+
+def get_extractor(name="auto"):
+    """
+    Return a (per-process, reused) extractor. "auto" picks lxml when it is installed.
+    """
+    if name == "auto":
+        name = "lxml" if "lxml" in EXTRACTORS else "soup"
+    if name not in _extractors:
+        _extractors[name] = EXTRACTORS[name]()
+    return _extractors[name]
+
+
+def extract_page(mmsi, html, extractor="auto"):
+    """
+    Extract one page; a module-level function so it can run in a process pool.
+    """
+    return get_extractor(extractor).extract(mmsi, html)
+
+
+def _extract_pair(args):
+    return extract_page(*args)
+
+
+def extract_pages(pages, extractor="auto", processes=None, chunksize=64):
+    """
+    Extract (mmsi, html) pairs across a pool of worker processes. Returns results in order.
+    """
+    jobs = ((mmsi, html, extractor) for mmsi, html in pages)
+    if processes == 1:
+        return [_extract_pair(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        return list(pool.map(_extract_pair, jobs, chunksize=chunksize))
+
+
+def load_fixture_pages(directory):
+    """
+    Read saved pages from a directory; each file's name (without extension) is its MMSI.
+    """
+    pages = []
+    for filename in sorted(os.listdir(directory)):
+        path = os.path.join(directory, filename)
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                pages.append((os.path.splitext(filename)[0], f.read()))
+    return pages
+
+
+def benchmark(pages, processes=None):
+    """
+    Time every available extractor on the same pages, single-process and in a process pool.
+    """
+    results = []
+    for name in EXTRACTORS:
+        for workers in (1, processes):
+            started = time.perf_counter()
+            extracted = extract_pages(pages, extractor=name, processes=workers)
+            elapsed = time.perf_counter() - started
+            results.append({
+                "extractor": name,
+                "processes": workers or os.cpu_count(),
+                "pages": len(pages),
+                "parsed": sum(1 for record in extracted if record),
+                "pages_per_sec": len(pages) / max(elapsed, 1e-9),
+            })
+    return results
+
+
+# Benchmark usage: python vessel_extractors.py <directory of saved pages>
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python vessel_extractors.py <fixture page directory>")
+        sys.exit(1)
+    fixture_pages = load_fixture_pages(sys.argv[1])
+    for row in benchmark(fixture_pages):
+        print(f"{row['extractor']:>5} x{row['processes']:<3} {row['parsed']}/{row['pages']} parsed, "
+              f"{row['pages_per_sec']:,.0f} pages/sec")
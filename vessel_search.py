@@ -0,0 +1,185 @@
+import difflib
+
+from data_loader import lower_name
+
+# Ranked vessel search over names, owners and MMSIs. Prefixes come from the vessel_name_lower
+# and MMSI text indexes (data_loader migration 8), substrings from the vessel_search FTS5
+# trigram index (data_loader migration 6), and misspellings from the vessels sharing most of
+# the query's rarest trigrams.
+
+# Match kinds, best first
+MATCH_KINDS = ("exact", "prefix", "substring", "fuzzy")
+MMSI_DIGITS = 9
+# Trigram queries need at least one whole trigram
+MIN_INDEXED_LENGTH = 3
+# Index hits fetched per stage before ranking
+CANDIDATES = 100
+# Fuzzy candidates are the vessels sharing most of the query's FUZZY_TERMS rarest trigrams.
+# Up to PROBED_TERMS trigrams are counted, each up to COMMON_TERM_VESSELS; trigrams that common
+# say little about a name and would make the lookup cost grow with the fleet, so are left out.
+FUZZY_TERMS = 6
+PROBED_TERMS = 12
+COMMON_TERM_VESSELS = 5000
+# difflib ratio below which a fuzzy candidate is dropped
+MIN_SIMILARITY = 0.7
+
+# Highest code point, used as the exclusive upper bound of a prefix range
+PREFIX_END = "\U0010ffff"
+
+# Both prefix lookups read their index in order, so a capped lookup keeps the first matches
+NAME_PREFIX_QUERY = """
+    SELECT id, vessel_name, owner, mmsi FROM vessels
+    WHERE vessel_name_lower >= ? AND vessel_name_lower < ?
+    ORDER BY vessel_name_lower
+    LIMIT ?
+"""
+# On the MMSI's text, so MMSIs with fewer than MMSI_DIGITS digits match their own prefixes
+MMSI_PREFIX_QUERY = """
+    SELECT id, vessel_name, owner, mmsi FROM vessels
+    WHERE CAST(mmsi AS TEXT) >= ? AND CAST(mmsi AS TEXT) < ?
+    ORDER BY CAST(mmsi AS TEXT)
+    LIMIT ?
+"""
+# Unranked: bm25 would score every match, and the candidates are ranked in Python anyway
+SUBSTRING_QUERY = """
+    SELECT rowid, vessel_name, owner, mmsi FROM vessel_search
+    WHERE vessel_search MATCH ?
+    LIMIT ?
+"""
+# Bounded, since counting a trigram's vessels costs as much as reading them all
+TERM_VESSELS_QUERY = """
+    SELECT COUNT(*) FROM (SELECT 1 FROM vessel_search WHERE vessel_search MATCH ? LIMIT ?)
+"""
+# One MATCH per trigram; the vessels hit by the most of them come first
+SHARED_TRIGRAMS_QUERY = """
+    SELECT vessels.id, vessels.vessel_name, vessels.owner, vessels.mmsi
+    FROM (
+        SELECT rowid AS id, COUNT(*) AS shared FROM ({matches})
+        GROUP BY rowid ORDER BY shared DESC LIMIT ?
+    ) AS hits
+    JOIN vessels ON vessels.id = hits.id
+"""
+TRIGRAM_MATCH = "SELECT rowid FROM vessel_search WHERE vessel_search MATCH ?"
+# Filter on vessels for a phrase() of three or more characters
+SUBSTRING_CONDITION = "id IN (SELECT rowid FROM vessel_search WHERE vessel_search MATCH ?)"
+
+
+def phrase(text):
+    """FTS5 string literal; with the trigram tokenizer it matches text as a substring, any case."""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def column_phrase(text, columns):
+    """phrase() restricted to some of the vessel_search columns."""
+    return "{" + " ".join(columns) + "} : " + phrase(text)
+
+
+def trigrams(text):
+    """Distinct trigrams of text, in order of first occurrence."""
+    return list(dict.fromkeys(text[i:i + 3] for i in range(len(text) - 2)))
+
+
+def similarity(matcher, value):
+    """
+    difflib ratio of a matcher's query (its second sequence) against a field, the field's
+    leading characters, or, for a one-word query, each of its words, whichever is closest;
+    so a misspelled prefix or word still scores well.
+    """
+    query = matcher.b
+    value = value.lower()
+    choices = {value, value[:len(query)]}
+    if " " not in query:
+        choices.update(value.split())
+    best = 0.0
+    for choice in choices:
+        matcher.set_seq1(choice)
+        # quick_ratio is an upper bound on ratio, and far cheaper
+        if matcher.quick_ratio() > max(best, MIN_SIMILARITY):
+            best = max(best, matcher.ratio())
+    return best
+
+
+def classify(matcher, row):
+    """
+    (match kind, score) of a (id, name, owner, mmsi) row for a matcher's lowercased query.
+    Index matches score the share of the field the query covers; fuzzy matches their similarity.
+    """
+    query = matcher.b
+    fields = [str(value).lower() for value in row[1:] if value is not None]
+    tests = (("exact", str.__eq__), ("prefix", str.startswith), ("substring", str.__contains__))
+    for kind, test in tests:
+        matched = [field for field in fields if test(field, query)]
+        if matched:
+            return kind, len(query) / min(len(field) for field in matched)
+    return "fuzzy", max((similarity(matcher, value) for value in row[1:3] if value), default=0.0)
+
+
+def _rarest_trigrams(conn, query, count=FUZZY_TERMS):
+    """Up to count of the query's trigrams that are in the index but not common, rarest first."""
+    terms = trigrams(query)
+    # Evenly spaced along the query, so one misspelling cannot spoil most of the probed trigrams
+    step = max(1, len(terms) / PROBED_TERMS)
+    probed = {terms[int(i * step)] for i in range(min(len(terms), PROBED_TERMS))}
+    counts = [
+        (conn.execute(TERM_VESSELS_QUERY, (phrase(term), COMMON_TERM_VESSELS)).fetchone()[0], term)
+        for term in sorted(probed)
+    ]
+    return [term for vessels, term in sorted(counts) if 0 < vessels < COMMON_TERM_VESSELS][:count]
+
+
+def _candidates(conn, query, limit):
+    rows = {}
+
+    def add(found):
+        for row in found:
+            rows.setdefault(row[0], row)
+
+    if query.isdigit() and len(query) <= MMSI_DIGITS:
+        add(conn.execute(MMSI_PREFIX_QUERY, (query, query + PREFIX_END, limit)))
+    add(conn.execute(NAME_PREFIX_QUERY, (query, query + PREFIX_END, limit)))
+    if len(query) < MIN_INDEXED_LENGTH:
+        return rows
+
+    add(conn.execute(SUBSTRING_QUERY, (phrase(query), CANDIDATES)))
+    if len(rows) < limit and not query.isdigit():
+        terms = _rarest_trigrams(conn, query)
+        if terms:
+            matches = " UNION ALL ".join([TRIGRAM_MATCH] * len(terms))
+            params = [column_phrase(term, ("vessel_name", "owner")) for term in terms]
+            add(conn.execute(SHARED_TRIGRAMS_QUERY.format(matches=matches), (*params, CANDIDATES)))
+    return rows
+
+
+def search_vessels(conn, text, limit=10):
+    """
+    Vessels best matching free text, as records of id, name, owner, mmsi, match and score.
+    Exact matches rank first, then prefixes, then substrings, then misspellings; within each
+    kind by score (0-1): the share of the field covered, or the similarity of a misspelling.
+    """
+    # Lowercased like vessels.vessel_name_lower (data_loader.lower_name)
+    query = lower_name(" ".join((text or "").split()))
+    if not query:
+        return []
+    matcher = difflib.SequenceMatcher(None, b=query, autojunk=False)
+    results = []
+    for row in _candidates(conn, query, limit).values():
+        match, score = classify(matcher, row)
+        if match == "fuzzy" and score < MIN_SIMILARITY:
+            continue
+        results.append({
+            "id": row[0], "name": row[1], "owner": row[2], "mmsi": row[3],
+            "match": match, "score": round(score, 3),
+        })
+    results.sort(key=lambda r: (MATCH_KINDS.index(r["match"]), -r["score"], r["name"] or ""))
+    return results[:limit]
+
+
+if __name__ == "__main__":
+    import sys
+
+    from db_pool import get_pool
+
+    with get_pool().connection() as conn:
+        for result in search_vessels(conn, " ".join(sys.argv[1:])):
+            print(f"{result['match']:>9} {result['score']:.3f}  {result['name']}  "
+                  f"({result['owner']}, {result['mmsi']})")